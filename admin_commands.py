@@ -0,0 +1,247 @@
+"""
+Административные команды бота: /stats, /memsnap и /profile
+"""
+
+import linecache
+import logging
+import math
+import os
+import time
+import tracemalloc
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes, TypeHandler, filters
+
+import data_tables
+import metrics
+import profiler
+from admission import monitor as lag_monitor, overloaded, queue_depth
+
+# Идентификаторы администраторов (через запятую); разбираются при регистрации команд
+ADMIN_ID = os.getenv('BOT_ADMIN_ID', '')
+
+# Число строк в ответе /memsnap по умолчанию
+MEMSNAP_TOP = 10
+# Длительность /profile по умолчанию, секунд
+PROFILE_SECONDS = 10
+
+# Снимок для сравнения при следующем вызове /memsnap и точка отсчёта для /stats
+_last_snapshot = None
+_last_stats = (time.time(), 0)
+
+
+def get_rss_mb():
+    """Текущий RSS процесса в МБ (Linux), иначе None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def format_ms(value):
+    """Форматирование секунд в миллисекунды"""
+    return "-" if value is None else f"{value * 1000:.2f}"
+
+
+async def count_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Считает все входящие обновления для /stats"""
+    metrics.count_update()
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /stats"""
+    global _last_stats
+    now = time.time()
+    uptime = now - metrics.START_TIME
+    last_time, last_count = _last_stats
+    recent_rate = (metrics.updates_seen - last_count) / max(now - last_time, 1e-9)
+    _last_stats = (now, metrics.updates_seen)
+
+    lines = [
+        "📊 *Bot stats*",
+        f"Uptime: `{uptime / 3600:.2f} h`",
+        f"Updates: `{metrics.updates_seen}` "
+        f"(`{metrics.updates_seen / max(uptime, 1e-9):.2f}`/s avg, `{recent_rate:.2f}`/s since last /stats)",
+        f"Sessions: `{await context.bot_data['sessions'].size()}`",
+        f"Update queue: `{queue_depth(context.application)}`",
+        f"Loop lag: `{lag_monitor.lag * 1000:.1f} ms`",
+    ]
+    reason = overloaded(context.application)
+    if reason is not None:
+        lines.append(f"Shedding expensive requests: `{reason}`")
+    name = context.bot_data.get('name')
+    if name is not None:
+        # Несколько ботов в процессе (BOT_TOKENS): обновления и память - на весь процесс
+        lines.insert(1, f"Bot: `{name}`")
+    rss = get_rss_mb()
+    if rss is not None:
+        lines.append(f"RSS: `{rss:.1f} MB`")
+    dedup = context.bot_data.get('dedup')
+    if dedup is not None:
+        checked = dedup.hits + dedup.misses
+        rate = dedup.hits / checked * 100 if checked else 0.0
+        lines.append(f"Duplicates dropped: `{dedup.hits}` ({rate:.2f}%)")
+    limiter = context.bot_data.get('rate_limiter')
+    if limiter is not None:
+        lines.append(f"Throttled: `{limiter.throttled}` of `{limiter.allowed + limiter.throttled}` "
+                     f"({len(limiter.buckets)} buckets)")
+    tables = data_tables.current()
+    loaded = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(tables.loaded_at))
+    lines.append(f"Data tables: `v{tables.version}` (`{os.path.basename(tables.source)}`, {loaded})")
+
+    if metrics.METRICS_ENABLED:
+        lines.append("\n*Handlers, ms (p50 / p95 / p99, count):*")
+        for name, histogram in sorted(metrics.HANDLER_LATENCY.children.items()):
+            lines.append(
+                f"`{name}`: {format_ms(histogram.quantile(0.5))} / {format_ms(histogram.quantile(0.95))} / "
+                f"{format_ms(histogram.quantile(0.99))} ({histogram.count})"
+            )
+    else:
+        lines.append("\nHandler latency: metrics disabled (`BOT_METRICS_ENABLED`)")
+
+    router = context.bot_data.get('router')
+    if router is not None:
+        routes = sorted(router.routes().items())
+        lines.append("\n*Routes (calls):*")
+        lines.append(", ".join(f"`{name}` {route.calls}" for name, route in routes))
+
+    cache_stats = metrics.cache_stats()
+    if cache_stats:
+        lines.append("\n*Caches (hit rate, size):*")
+        for name, (hits, misses, size, maxsize) in sorted(cache_stats.items()):
+            total = hits + misses
+            rate = hits / total * 100 if total else 0.0
+            lines.append(f"`{name}`: {rate:.1f}% ({size}/{maxsize})")
+
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+
+
+async def memsnap_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /memsnap [N|stop] - топ мест выделения памяти"""
+    global _last_snapshot
+    args = context.args or []
+
+    if args and args[0] == 'stop':
+        tracemalloc.stop()
+        _last_snapshot = None
+        await update.message.reply_text("🧠 tracemalloc stopped")
+        return
+
+    if not tracemalloc.is_tracing():
+        # Трассировка включается по требованию: учитываются только новые выделения
+        tracemalloc.start()
+        await update.message.reply_text(
+            "🧠 tracemalloc started. Run /memsnap again later to see allocation sites.")
+        return
+
+    top = int(args[0]) if args and args[0].isdigit() else MEMSNAP_TOP
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+
+    lines = [f"🧠 *Traced:* `{current / 1024 / 1024:.1f} MB` (peak `{peak / 1024 / 1024:.1f} MB`)"]
+    rss = get_rss_mb()
+    if rss is not None:
+        lines.append(f"*RSS:* `{rss:.1f} MB`")
+
+    lines.append("\n*Top allocation sites:*")
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        source = linecache.getline(frame.filename, frame.lineno).strip()
+        lines.append(f"`{os.path.basename(frame.filename)}:{frame.lineno}` "
+                     f"{stat.size / 1024:.1f} KiB ×{stat.count}\n  `{source[:60]}`")
+
+    if _last_snapshot is not None:
+        lines.append("\n*Growth since previous snapshot:*")
+        for stat in snapshot.compare_to(_last_snapshot, 'lineno')[:top]:
+            frame = stat.traceback[0]
+            lines.append(f"`{os.path.basename(frame.filename)}:{frame.lineno}` "
+                         f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+d})")
+    _last_snapshot = snapshot
+
+    # Укладываемся в лимит длины сообщения Telegram, не разрывая строки с разметкой
+    while len("\n".join(lines)) > 4000:
+        lines.pop()
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /profile [секунды] [stacks|cprofile] - профиль работающего процесса"""
+    seconds = PROFILE_SECONDS
+    mode = profiler.MODES[0]
+    for arg in context.args or []:
+        if arg in profiler.MODES:
+            mode = arg
+        else:
+            try:
+                seconds = float(arg)
+                # nan и inf обходят ограничение длительности (min/max с nan дают nan)
+                if not math.isfinite(seconds) or seconds <= 0:
+                    raise ValueError(arg)
+            except ValueError:
+                await update.message.reply_text(
+                    f"Usage: /profile [seconds] [{'|'.join(profiler.MODES)}]")
+                return
+
+    active = profiler.running()
+    if active is not None:
+        await update.message.reply_text(f"🔬 Profiling is already running: {active}")
+        return
+    # В ответе - та длительность, которую использует run_profile
+    seconds = min(max(seconds, profiler.PROFILE_MIN_SECONDS), profiler.PROFILE_MAX_SECONDS)
+    await update.message.reply_text(f"🔬 Profiling ({mode}) for {seconds:g} s...")
+    # Процесс-обработчик (BOT_WORKERS) не может переслать файл через ingress - только путь к нему
+    upload = 'worker' not in context.bot_data
+    # Обновления обрабатываются по одному: профиль снимается в фоне, пока бот работает
+    context.application.create_task(send_profile(update.message, seconds, mode, upload), update=update)
+
+
+async def send_profile(message, seconds, mode, upload=True):
+    """Снимает профиль и отправляет сводку и файл профиля (upload=False - только путь к файлу)"""
+    try:
+        profile = await profiler.run_profile(seconds, mode)
+    except RuntimeError as e:
+        await message.reply_text(f"🔬 {e}")
+        return
+    text = "\n".join(profile.summary)[:3900]
+    await message.reply_text(f"```\n{text}\n```\nSaved to `{profile.path}`", parse_mode='Markdown')
+    if not upload:
+        return
+    with open(profile.path, 'rb') as f:
+        await message.reply_document(f, filename=os.path.basename(profile.path))
+
+
+def parse_admin_ids(value):
+    """Идентификаторы из строки "id,id"; некорректные пропускаются с предупреждением"""
+    admin_ids = []
+    for item in value.replace(' ', '').split(','):
+        if not item:
+            continue
+        try:
+            admin_ids.append(int(item))
+        except ValueError:
+            logging.warning(f"⚠️ Ignoring invalid BOT_ADMIN_ID entry: {item!r}")
+    return admin_ids
+
+
+def register_admin_handlers(application, admin_id=ADMIN_ID):
+    """Регистрирует счётчик обновлений и административные команды, если задан BOT_ADMIN_ID"""
+    # Подсчёт обновлений до остальных обработчиков (метрика bot_updates_total) - и без администратора
+    application.add_handler(TypeHandler(Update, count_update), group=-1)
+
+    admin_ids = parse_admin_ids(admin_id)
+    if not admin_ids:
+        return False
+
+    admin_filter = filters.User(user_id=admin_ids)
+    application.add_handler(CommandHandler("stats", stats_command, filters=admin_filter))
+    application.add_handler(CommandHandler("memsnap", memsnap_command, filters=admin_filter))
+    application.add_handler(CommandHandler("profile", profile_command, filters=admin_filter))
+    return True
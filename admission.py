@@ -0,0 +1,103 @@
+"""
+Контроль нагрузки: задержка цикла событий, глубина очереди и отказ в дорогих запросах.
+
+Задача-зонд раз в BOT_LAG_INTERVAL секунд засыпает на этот интервал и измеряет, насколько
+позже она проснулась: столько цикл событий был занят другой работой. Пока задержка выше
+BOT_SHED_LAG секунд или в очереди больше BOT_SHED_QUEUE необработанных обновлений,
+дорогие запросы (/fit, пакеты HTTP API) получают ответ "бот занят, повторите позже" без
+расчёта, а дешёвые (цвета, SMD коды, номиналы, меню) обрабатываются как обычно.
+Административные команды не ограничиваются: диагностика нужна именно под нагрузкой.
+Значение 0 отключает соответствующий порог.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+import metrics
+
+LAG_INTERVAL = float(os.getenv('BOT_LAG_INTERVAL', '0.1'))
+SHED_LAG = float(os.getenv('BOT_SHED_LAG', '0.25'))
+SHED_QUEUE = int(os.getenv('BOT_SHED_QUEUE', '200'))
+
+BUSY_TEXT = {
+    'ru': "⏳ Бот сейчас перегружен, этот запрос временно недоступен. Повторите чуть позже.",
+    'en': "⏳ The bot is busy right now and this request is temporarily unavailable. Please retry shortly.",
+}
+
+
+class LoopLagMonitor:
+    """Задержка цикла событий: сразу растёт при всплеске, спадает плавно"""
+
+    def __init__(self, interval=LAG_INTERVAL, decay=0.3):
+        self.interval = interval
+        self.decay = decay
+        self.process = 'main'
+        self.lag = 0.0
+        self.task = None
+
+    def observe(self, lag):
+        # Быстрый рост и медленный спад: короткая пауза между всплесками не открывает
+        # дорогие запросы снова
+        self.lag = lag if lag > self.lag else self.lag + (lag - self.lag) * self.decay
+        metrics.observe_loop_lag(self.process, lag)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.observe(max(loop.time() - start - self.interval, 0.0))
+
+    def start(self, process='main'):
+        """Запускает зонд в текущем цикле событий (повторный вызов ничего не делает)"""
+        if self.task is None and self.interval > 0:
+            self.process = process
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+monitor = LoopLagMonitor()
+
+
+def queue_depth(application):
+    """Необработанные обновления приложения (у процесса-обработчика - его межпроцессная очередь)"""
+    depth = application.bot_data.get('queue_depth')
+    return depth() if depth is not None else application.update_queue.qsize()
+
+
+def overloaded(application=None):
+    """Причина перегрузки ('lag' или 'queue'); None, если дорогие запросы можно выполнять"""
+    if SHED_LAG > 0 and monitor.lag > SHED_LAG:
+        return 'lag'
+    if application is not None and SHED_QUEUE > 0 and queue_depth(application) > SHED_QUEUE:
+        return 'queue'
+    return None
+
+
+def expensive(kind):
+    """Декоратор обработчика дорогого запроса: при перегрузке - вежливый отказ вместо расчёта"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            reason = overloaded(context.application)
+            if reason is None:
+                return await func(update, context)
+            metrics.count_shed(kind)
+            logging.info(f"🚦 Shed {kind} from {update.effective_user.id}: {reason} "
+                         f"(lag {monitor.lag * 1000:.0f} ms, queue {queue_depth(context.application)})")
+            language = 'ru'
+            sessions = context.bot_data.get('sessions')
+            if sessions is not None:
+                language = (await sessions.get(update.effective_user.id))['language']
+            await update.effective_message.reply_text(BUSY_TEXT.get(language, BUSY_TEXT['en']))
+        return wrapper
+    return decorator
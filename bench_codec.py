@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарки функций преобразования (цвета, SMD коды, номиналы).
+
+    python bench_codec.py                      # таблица + сравнение с bench_baseline.json, если он есть
+    python bench_codec.py --save-baseline      # сохранить текущие результаты как базовые
+    python bench_codec.py --json results.json  # машиночитаемые результаты
+
+Код возврата 1, если какая-либо функция медленнее базовой больше чем на --threshold.
+"""
+
+import argparse
+import inspect
+import json
+import os
+import platform
+import sys
+import timeit
+
+# Бенчмарк измеряет чистые вычисления: без метрик и без обращения к Telegram
+os.environ['BOT_METRICS_ENABLED'] = '0'
+# Пустое значение, а не удаление: load_dotenv() не перезаписывает заданные переменные
+os.environ['BOT_METRICS_PORT'] = ''
+
+import color_matcher
+import tolerance_index
+import resistor_code_bot as bot
+import smd_decoder
+from resistor_data import COLOR_CODES, MULTIPLIERS
+
+DEFAULT_BASELINE = 'bench_baseline.json'
+
+# Обратные словари, как их строит resistance_to_colors
+REVERSE_COLORS = {v: k for k, v in COLOR_CODES.items() if v >= 0}
+REVERSE_MULTIPLIERS = {v: k for k, v in MULTIPLIERS.items()}
+
+# Входные данные: типичные запросы и худшие случаи
+COLOR_WORDS = ['красный', 'Жёлтый', 'зеленый', 'black', 'Violet', 'grey', 'серебристый',
+               'purple', 'золотой', 'фиолетовый', 'unknown', 'коричневый']
+COLOR_SEQUENCES = [
+    ['red', 'red', 'red', 'gold'],
+    ['коричневый', 'чёрный', 'оранжевый', 'золотой'],
+    ['yellow', 'violet', 'black', 'brown', 'brown'],
+    ['жёлтый', 'фиолетовый', 'красный', 'серебряный'],
+    ['brown', 'black', 'black', 'red', 'brown'],
+    ['red', 'bogus', 'red', 'gold'],  # ошибка: неизвестный цвет
+]
+# Последовательности с опечатками, сокращениями и оттенками; последняя - номинал (быстрый отказ)
+FUZZY_COLOR_TEXTS = ['voilet orng кор gold', 'lt blue red red gold', 'коричнвый черный bk зол',
+                     'yelow pruple blck silv', 'red red red gold', '470 Ohm']
+VALUE_STRINGS = ['1k', '4.7k', '470 Ohm', '2.2M', '10к', '330', '1.5k', '68k', '0.47', '100M']
+# Значения между соседними элементами E96 (нет совпадения в пределах 1%) - полный перебор
+WORST_CASE_VALUES = ['9.88k', '98.8', '1.012M', '4.81k', '988']
+# Измеренные значения: внутри допусков нескольких рядов, между номиналами, вне диапазона
+MEASURED_VALUES = [4620.0, 9.9, 1013.0, 47500.0, 0.05, 2.2e8]
+NUMERIC_VALUES = [0.47, 4.7, 47, 470, 4700, 47000, 470000, 4700000, 0.05, 988, 9880]
+SMD_CODES = ['103', '4R7', '01C', 'R047', '472', '68X', '220', '47R', 'XYZ', '1', '96F', '0R5', '1002', '10R0', '_472']
+
+
+def cases():
+    """Набор (имя, функция, список аргументов)"""
+    raw = inspect.unwrap  # обходим LRU кэши и обёртки метрик
+    return [
+        ('normalize_color_input', raw(bot.normalize_color_input), [(w,) for w in COLOR_WORDS]),
+        ('match_colors', raw(color_matcher.match_colors), [(t,) for t in FUZZY_COLOR_TEXTS]),
+        ('colors_to_resistance', raw(bot.colors_to_resistance), [(s,) for s in COLOR_SEQUENCES]),
+        ('resistance_to_colors', raw(bot.resistance_to_colors), [(v,) for v in VALUE_STRINGS]),
+        ('calculate_4_band_colors', raw(bot.calculate_4_band_colors),
+         [(v, REVERSE_COLORS, REVERSE_MULTIPLIERS) for v in NUMERIC_VALUES]),
+        ('calculate_5_band_colors', raw(bot.calculate_5_band_colors),
+         [(v, REVERSE_COLORS, REVERSE_MULTIPLIERS) for v in NUMERIC_VALUES]),
+        ('validate_smd_code', raw(smd_decoder.validate_smd_code), [(c,) for c in SMD_CODES]),
+        ('smd_to_resistance', raw(smd_decoder.smd_to_resistance), [(c,) for c in SMD_CODES]),
+        ('resistance_to_smd', raw(smd_decoder.resistance_to_smd), [(v,) for v in VALUE_STRINGS]),
+        ('resistance_to_smd[worst]', raw(smd_decoder.resistance_to_smd),
+         [(v,) for v in WORST_CASE_VALUES]),
+        ('fitting_values', tolerance_index.fitting_values, [(v,) for v in MEASURED_VALUES]),
+        ('format_resistance', raw(smd_decoder.format_resistance), [(v,) for v in NUMERIC_VALUES]),
+    ]
+
+
+def run_case(func, inputs, min_time, repeat):
+    """Время одного вызова (нс): минимум из repeat замеров по всем входам"""
+    def loop():
+        for args in inputs:
+            func(*args)
+
+    timer = timeit.Timer(loop)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / (number * len(inputs)) * 1e9
+
+
+def run_all(min_time, repeat, only=None):
+    results = {}
+    for name, func, inputs in cases():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        results[name] = {'ns_per_call': run_case(func, inputs, min_time, repeat),
+                         'inputs': len(inputs)}
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Печать таблицы; возвращает список регрессий"""
+    regressions = []
+    base_results = baseline['results'] if baseline else {}
+    print(f"{'function':<28}{'ns/call':>12}{'baseline':>12}{'change':>10}")
+    for name, data in current['results'].items():
+        ns = data['ns_per_call']
+        base = base_results.get(name, {}).get('ns_per_call')
+        if base:
+            change = (ns - base) / base
+            flag = " ⚠️" if change > threshold else ""
+            print(f"{name:<28}{ns:>12.0f}{base:>12.0f}{change * 100:>9.1f}%{flag}")
+            if change > threshold:
+                regressions.append(name)
+        else:
+            print(f"{name:<28}{ns:>12.0f}{'-':>12}{'-':>10}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Codec micro-benchmarks")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="store results as the new baseline")
+    parser.add_argument('--json', help="write results to this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.15, help="allowed slowdown (0.15 = 15%%)")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds per measurement")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='*', help="run only cases containing these substrings")
+    args = parser.parse_args()
+
+    current = run_all(args.min_time, args.repeat, args.only)
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+        print(f"💾 Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"❌ Regressions over {args.threshold * 100:.0f}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
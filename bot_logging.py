@@ -0,0 +1,265 @@
+"""
+Логирование без блокировки цикла событий и структурированные записи об обновлениях.
+
+Обработчики бота только кладут запись в очередь (QueueHandler); форматирование и запись
+в stderr или файл выполняет фоновый поток (QueueListener), поэтому медленный диск или
+переполненный stdout не останавливают обработку обновлений. Если очередь заполнена
+(BOT_LOG_QUEUE_SIZE), новые записи отбрасываются и считаются.
+
+Записи об обновлениях (логгер bot.updates): update_id, корзина пользователя (вместо id),
+тип запроса, время расчёта и отправки ответа, попадание в кэш, общее время. Пишется доля
+BOT_LOG_UPDATES_SAMPLE обновлений и все обновления дольше BOT_LOG_UPDATES_SLOW_MS.
+BOT_LOG_FORMAT=json выводит весь лог строками JSON.
+"""
+
+import atexit
+import contextlib
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import zlib
+
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler
+
+import metrics
+
+LOG_LEVEL = os.getenv('BOT_LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('BOT_LOG_FORMAT', 'text')
+LOG_FILE = os.getenv('BOT_LOG_FILE')
+LOG_QUEUE_SIZE = int(os.getenv('BOT_LOG_QUEUE_SIZE', '10000'))
+# Доля записей уровня DEBUG, которые попадают в лог (трассировка в продакшене)
+LOG_DEBUG_SAMPLE = float(os.getenv('BOT_LOG_DEBUG_SAMPLE', '1'))
+# Доля обновлений со структурированной записью и порог медленного обновления (0 - отключить)
+LOG_UPDATES_SAMPLE = float(os.getenv('BOT_LOG_UPDATES_SAMPLE', '0'))
+LOG_UPDATES_SLOW_MS = float(os.getenv('BOT_LOG_UPDATES_SLOW_MS', '0'))
+# Число корзин, по которым распределяются пользователи в записях
+LOG_USER_BUCKETS = int(os.getenv('BOT_LOG_USER_BUCKETS', '1024'))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Группы обработчиков начала и конца записи об обновлении: до и после всех остальных
+UPDATE_LOG_GROUPS = (-4, 1000)
+
+update_logger = logging.getLogger('bot.updates')
+
+_listener = None
+
+
+class TextFormatter(logging.Formatter):
+    """Обычный текстовый формат; поля структурированной записи - JSON после сообщения"""
+
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields is not None:
+            text = f"{text} {json.dumps(fields, ensure_ascii=False)}"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись"""
+
+    def format(self, record):
+        data = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields is not None:
+            data.update(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class DebugSampler(logging.Filter):
+    """Пропускает долю записей уровня DEBUG, остальные уровни - все"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не форматирует запись в вызывающем потоке и не ждёт места в очереди"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Стандартный prepare форматирует сообщение целиком; здесь только подставляются
+        # аргументы и текст исключения (traceback нельзя передавать в другой поток),
+        # остальное делает форматтер в потоке QueueListener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, log_file=LOG_FILE):
+    """Настраивает корневой логгер на запись через очередь (повторный вызов ничего не делает)"""
+    global _listener
+    if _listener is not None:
+        return
+    if log_file:
+        target = logging.FileHandler(log_file, encoding='utf-8')
+    else:
+        target = logging.StreamHandler()
+    target.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter(TEXT_FORMAT))
+
+    handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    if LOG_DEBUG_SAMPLE < 1:
+        handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, target)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Записывает оставшиеся в очереди записи и останавливает поток записи"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in logging.getLogger().handlers:
+        dropped = getattr(handler, 'dropped', 0)
+        if dropped:
+            listener.handlers[0].handle(logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"⚠️ {dropped} log records dropped: log queue was full"}))
+
+
+def cache_hits():
+    """Сумма попаданий всех кэшей функций расчёта"""
+    return sum(func.cache_info().hits for func in metrics.CACHES.values())
+
+
+class UpdateRecord:
+    """Структурированная запись об обработке одного обновления"""
+
+    def __init__(self, update, sampled):
+        self.sampled = sampled
+        self.start = time.perf_counter()
+        self.fields = {'update_id': update.update_id}
+        user = update.effective_user
+        if user is not None:
+            self.fields['user_bucket'] = zlib.crc32(str(user.id).encode()) % LOG_USER_BUCKETS
+        if update.callback_query is not None:
+            self.fields['type'] = 'callback'
+        elif update.message is not None and (update.message.text or '').startswith('/'):
+            self.fields['type'] = 'command'
+        else:
+            self.fields['type'] = 'other'
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    @contextlib.contextmanager
+    def codec(self):
+        """Замер расчёта ответа и попадания в кэш"""
+        hits = cache_hits()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fields['codec_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            self.fields['cache_hit'] = cache_hits() > hits
+
+    @contextlib.contextmanager
+    def send(self):
+        """Замер отправки ответа"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fields['send_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+    def finish(self):
+        total = (time.perf_counter() - self.start) * 1000
+        if self.sampled or (LOG_UPDATES_SLOW_MS > 0 and total >= LOG_UPDATES_SLOW_MS):
+            self.fields['total_ms'] = round(total, 3)
+            update_logger.info("update", extra={'fields': self.fields})
+
+
+class NullRecord:
+    """Запись необрабатываемого обновления: ничего не измеряет"""
+
+    def set(self, **fields):
+        pass
+
+    def codec(self):
+        return contextlib.nullcontext()
+
+    def send(self):
+        return contextlib.nullcontext()
+
+    def finish(self):
+        pass
+
+
+NULL_RECORD = NullRecord()
+
+# Запись обрабатываемого обновления: обработчики одного обновления выполняются в одной задаче
+_current = contextvars.ContextVar('update_record', default=NULL_RECORD)
+
+
+def current():
+    """Запись текущего обновления (NULL_RECORD, если обновление не записывается)"""
+    return _current.get()
+
+
+async def begin_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Начало записи: решение о выборке принимается до обработки"""
+    sampled = random.random() < LOG_UPDATES_SAMPLE
+    if sampled or LOG_UPDATES_SLOW_MS > 0:
+        record = UpdateRecord(update, sampled)
+        name = context.bot_data.get('name')
+        if name is not None:
+            record.set(bot=name)
+        _current.set(record)
+    else:
+        _current.set(NULL_RECORD)
+
+
+async def finish_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    _current.get().finish()
+    _current.set(NULL_RECORD)
+
+
+def register_update_log(application):
+    """Подключает записи об обновлениях, если задана доля выборки или порог медленных"""
+    if LOG_UPDATES_SAMPLE <= 0 and LOG_UPDATES_SLOW_MS <= 0:
+        return False
+    first, last = UPDATE_LOG_GROUPS
+    application.add_handler(TypeHandler(Update, begin_update), group=first)
+    application.add_handler(TypeHandler(Update, finish_update), group=last)
+    return True
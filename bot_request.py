@@ -0,0 +1,90 @@
+"""
+Настройки HTTP клиента Telegram Bot API из окружения.
+
+Ответы пользователям (sender) и долгий опрос getUpdates (updater) идут через разные
+клиенты со своими пулами соединений, чтобы медленный getUpdates не занимал соединения
+отправки. Для каждого задаются размер пула, версия HTTP и таймауты:
+
+    BOT_SEND_POOL_SIZE, BOT_SEND_HTTP_VERSION, BOT_SEND_CONNECT_TIMEOUT,
+    BOT_SEND_READ_TIMEOUT, BOT_SEND_WRITE_TIMEOUT, BOT_SEND_POOL_TIMEOUT
+    BOT_UPDATES_POOL_SIZE, BOT_UPDATES_HTTP_VERSION, ... (те же для getUpdates)
+
+Таймаут "none" отключает ограничение. HTTP/2 требует python-telegram-bot[http2].
+"""
+
+import logging
+import os
+from collections import namedtuple
+
+import metrics
+
+RequestSettings = namedtuple(
+    'RequestSettings', 'pool_size http_version connect_timeout read_timeout write_timeout pool_timeout')
+
+# Клиент -> (префикс переменных окружения, настройки по умолчанию)
+CLIENTS = {
+    'sender': ('BOT_SEND_', RequestSettings(256, '1.1', 5.0, 5.0, 5.0, 1.0)),
+    # Таймаут чтения getUpdates увеличивается библиотекой на время долгого опроса
+    'updater': ('BOT_UPDATES_', RequestSettings(1, '1.1', 5.0, 5.0, 5.0, 1.0)),
+}
+
+
+def parse_timeout(value):
+    """Секунды из строки; None для "none" (без ограничения)"""
+    if value.strip().lower() == 'none':
+        return None
+    return float(value)
+
+
+def read_settings(client, environ=os.environ):
+    """Настройки клиента из окружения поверх значений по умолчанию"""
+    prefix, defaults = CLIENTS[client]
+
+    def get(name, parse, default):
+        value = environ.get(prefix + name)
+        return default if value in (None, '') else parse(value)
+
+    http_version = get('HTTP_VERSION', str.strip, defaults.http_version)
+    if http_version not in ('1.1', '2', '2.0'):
+        raise ValueError(f"{prefix}HTTP_VERSION must be 1.1 or 2, got {http_version!r}")
+    return RequestSettings(
+        pool_size=get('POOL_SIZE', int, defaults.pool_size),
+        http_version=http_version,
+        connect_timeout=get('CONNECT_TIMEOUT', parse_timeout, defaults.connect_timeout),
+        read_timeout=get('READ_TIMEOUT', parse_timeout, defaults.read_timeout),
+        write_timeout=get('WRITE_TIMEOUT', parse_timeout, defaults.write_timeout),
+        pool_timeout=get('POOL_TIMEOUT', parse_timeout, defaults.pool_timeout),
+    )
+
+
+def create_request(client):
+    """HTTPXRequest клиента с настройками из окружения (с метриками, если они включены)"""
+    settings = read_settings(client)
+    kwargs = dict(
+        connection_pool_size=settings.pool_size,
+        http_version=settings.http_version,
+        connect_timeout=settings.connect_timeout,
+        read_timeout=settings.read_timeout,
+        write_timeout=settings.write_timeout,
+        pool_timeout=settings.pool_timeout,
+    )
+    if metrics.METRICS_ENABLED:
+        return metrics.instrumented_request(client, **kwargs)
+    from telegram.request import HTTPXRequest
+    return HTTPXRequest(**kwargs)
+
+
+def describe(client, settings):
+    """Строка настроек для лога запуска"""
+    def seconds(value):
+        return 'none' if value is None else f'{value:g}s'
+
+    return (f"{client}: pool {settings.pool_size}, HTTP/{settings.http_version}, "
+            f"timeouts connect {seconds(settings.connect_timeout)} read {seconds(settings.read_timeout)} "
+            f"write {seconds(settings.write_timeout)} pool {seconds(settings.pool_timeout)}")
+
+
+def log_settings():
+    """Записывает в лог действующие настройки всех клиентов"""
+    for client in CLIENTS:
+        logging.info(f"🔌 Bot API client {describe(client, read_settings(client))}")
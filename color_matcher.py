@@ -0,0 +1,223 @@
+"""
+Распознавание названий цветов полос с опечатками и сокращениями.
+
+Словарь строится по действующим таблицам данных (data_tables) из всех названий цветов
+(русских и английских) и сокращений color_abbreviations и перестраивается при их
+замене. Слово ищется по точному совпадению, затем по однозначному префиксу (префиксное
+дерево), затем с опечатками: кандидаты берутся из заранее построенного индекса удалений
+букв и проверяются расстоянием редактирования.
+Вся последовательность полос разбирается за один проход с общей оценкой уверенности.
+"""
+
+import re
+from collections import namedtuple
+
+import data_tables
+import metrics
+
+# Минимальная длина слова для поиска по префиксу
+MIN_PREFIX_LENGTH = 3
+# Минимальная уверенность, с которой текст считается последовательностью цветов
+MIN_CONFIDENCE = 0.5
+
+# Результат разбора: распознанные цвета (ключи color_codes), уверенность 0..1,
+# исправления (слово, цвет) и первое нераспознанное слово
+ColorMatch = namedtuple('ColorMatch', 'colors confidence corrections unknown')
+
+TOKEN_SEPARATORS = re.compile(r'[\s,;]+')
+DIGITS = re.compile(r'\d')
+
+
+def fold(word):
+    """Нижний регистр и ё -> е, как у ключей словаря"""
+    return word.lower().replace('ё', 'е')
+
+
+def canonical_color(name, normalization):
+    """Ключ color_codes для названия цвета (как у normalize_color_input)"""
+    name = fold(name)
+    return fold(normalization.get(name, name))
+
+
+def max_distance(word):
+    """Допустимое число правок для слова данной длины"""
+    if len(word) <= 2:
+        return 0
+    if len(word) <= 4:
+        return 1
+    return 2
+
+
+def edit_distance(a, b):
+    """Расстояние Дамерау-Левенштейна (с перестановкой соседних букв)"""
+    if a == b:
+        return 0
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def deletions(word, limit):
+    """Все варианты слова без не более чем limit букв (включая само слово)"""
+    variants = {word}
+    frontier = {word}
+    for _ in range(limit):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+class DeletionIndex:
+    """Поиск слов в пределах расстояния редактирования по общим вариантам с удалёнными буквами.
+
+    Два слова на расстоянии не больше k обязательно имеют общий вариант, полученный
+    удалением не более k букв из каждого, поэтому проверять расстояние нужно только
+    у нескольких кандидатов, а не у всего словаря.
+    """
+
+    def __init__(self, words=(), limit=2):
+        self.limit = limit
+        self.variants = {}
+        for word in words:
+            for variant in deletions(word, limit):
+                self.variants.setdefault(variant, set()).add(word)
+
+    def search(self, word, limit):
+        """Список (расстояние, слово) для слов не дальше limit"""
+        candidates = set()
+        for variant in deletions(word, min(limit, self.limit)):
+            candidates |= self.variants.get(variant, set())
+        found = []
+        for candidate in candidates:
+            distance = edit_distance(word, candidate)
+            if distance <= limit:
+                found.append((distance, candidate))
+        return found
+
+
+class PrefixTrie:
+    """Префиксное дерево: в каждом узле - множество цветов всех слов с этим префиксом"""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, word, color):
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {})
+            node.setdefault(None, set()).add(color)
+
+    def colors(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return set()
+        return node.get(None, set())
+
+
+class ColorMatcher:
+    """Сопоставление слов с цветами: точное, по префиксу, с опечатками"""
+
+    def __init__(self, aliases, modifiers=frozenset()):
+        # aliases: написание -> ключ color_codes; modifiers - слова-оттенки
+        self.aliases = dict(aliases)
+        self.modifiers = modifiers
+        self.trie = PrefixTrie()
+        for alias, color in self.aliases.items():
+            self.trie.add(alias, color)
+        # Короткие сокращения в поиске с опечатками дают случайные совпадения
+        self.index = DeletionIndex(alias for alias in self.aliases if len(alias) >= 3)
+
+    def match_word(self, word):
+        """(цвет, уверенность) для одного слова; (None, 0.0), если не распознано"""
+        word = fold(word)
+        color = self.aliases.get(word)
+        if color is not None:
+            return color, 1.0
+
+        if len(word) >= MIN_PREFIX_LENGTH:
+            colors = self.trie.colors(word)
+            if len(colors) == 1:
+                color = next(iter(colors))
+                return color, 0.7 + 0.3 * min(1.0, len(word) / 6)
+
+        limit = max_distance(word)
+        if limit:
+            found = self.index.search(word, limit)
+            if found:
+                best = min(distance for distance, _ in found)
+                colors = {self.aliases[alias] for distance, alias in found if distance == best}
+                if len(colors) == 1:
+                    return colors.pop(), max(0.0, 1.0 - best / max(len(word), 3))
+        return None, 0.0
+
+    def tokens(self, text):
+        """Слова полос без оттенков: "lt blue", "светло-синий", "red-red-red-gold" """
+        for token in TOKEN_SEPARATORS.split(fold(text)):
+            for part in token.split('-'):
+                if part and part not in self.modifiers:
+                    yield part
+
+    def match_sequence(self, text):
+        """Разбор последовательности полос за один проход"""
+        colors = []
+        corrections = []
+        unknown = []
+        confidence = 1.0
+        for word in self.tokens(text):
+            # Номиналы и коды (с цифрами) отсекаются без поиска; после первого
+            # нераспознанного слова последовательность уже не цвета
+            color, score = (None, 0.0) if DIGITS.search(word) else self.match_word(word)
+            if color is None:
+                unknown.append(word)
+                confidence = 0.0
+                break
+            colors.append(color)
+            confidence *= score
+            if score < 1.0:
+                corrections.append((word, color))
+        if not colors:
+            confidence = 0.0
+        return ColorMatch(tuple(colors), confidence, tuple(corrections), tuple(unknown))
+
+
+def build_aliases(tables):
+    """Все написания цветов из таблиц данных -> ключ color_codes"""
+    aliases = {}
+    normalization = tables.input_normalization
+    for name in list(tables.color_codes) + list(normalization):
+        aliases[fold(name)] = canonical_color(name, normalization)
+    for abbreviation, name in tables.color_abbreviations.items():
+        aliases[fold(abbreviation)] = canonical_color(name, normalization)
+    return aliases
+
+
+@data_tables.derived('color_matcher')
+def build_color_matcher(tables):
+    """Словарь цветов для снимка таблиц"""
+    return ColorMatcher(build_aliases(tables), tables.color_modifiers)
+
+
+@metrics.timed()
+@metrics.cached()
+def match_colors(text):
+    """Разбор текста как последовательности цветов полос (ColorMatch)"""
+    return data_tables.current().index('color_matcher').match_sequence(text)
+
+
+def is_color_sequence(match):
+    """Текст - цвета полос: все слова точно известны, либо 4-5 полос с уверенными исправлениями"""
+    if not match.colors or match.unknown:
+        return False
+    if not match.corrections:
+        return True
+    return len(match.colors) in (4, 5) and match.confidence >= MIN_CONFIDENCE
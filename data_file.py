@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Файл данных для BOT_DATA_FILE: выгрузка встроенных таблиц и проверка файла.
+
+    python data_file.py --export data.json   # встроенные таблицы как файл данных (version 1)
+    python data_file.py --check data.json    # проверить файл и построить все индексы
+"""
+
+import argparse
+import json
+import sys
+
+import data_tables
+# Производные индексы регистрируют модули, которые их используют
+import resistor_code_bot  # noqa: F401
+
+
+def export_tables(path):
+    """Записывает встроенные таблицы как файл данных версии 1"""
+    data = {'version': 1}
+    for name, value in data_tables.builtin_tables().items():
+        data[name] = sorted(value) if data_tables.TABLE_TYPES[name] is set else value
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    print(f"Exported {len(data_tables.TABLE_TYPES)} tables to {path}")
+    return 0
+
+
+def check_tables(path):
+    """Читает файл и строит по нему все индексы; код возврата 1, если файл некорректен"""
+    try:
+        tables = data_tables.load_tables(path)
+    except Exception as e:
+        print(f"❌ {path}: {e}")
+        return 1
+    print(f"✅ {path}: version {tables.version}, indexes: {', '.join(tables.indexes)}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or check the resistor data file")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--export', metavar='FILE', help="write built-in tables as a data file")
+    group.add_argument('--check', metavar='FILE', help="load a data file and build all indexes")
+    args = parser.parse_args()
+    return export_tables(args.export) if args.export else check_tables(args.check)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
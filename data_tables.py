@@ -0,0 +1,212 @@
+"""
+Таблицы данных (цвета, ряды, коды E96) с перезагрузкой без перезапуска бота.
+
+Встроенные таблицы берутся из resistor_data. Если задан BOT_DATA_FILE, таблицы из этого
+JSON файла (с целым полем version) заменяют встроенные; отсутствующие в файле таблицы
+остаются встроенными. Файл проверяется раз в BOT_DATA_RELOAD_INTERVAL секунд: новая
+версия читается и все производные индексы строятся в фоновом потоке, затем подменяется
+одна ссылка на снимок и сбрасываются LRU кэши результатов.
+
+Читатели получают снимок через current() без блокировок. Подмена выполняется в потоке
+цикла событий, поэтому синхронный расчёт внутри обработчика всегда видит таблицы одной
+версии, а кэши не могут получить результат, посчитанный по старым таблицам.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from types import MappingProxyType
+
+import metrics
+import resistor_data
+
+DATA_FILE = os.getenv('BOT_DATA_FILE')
+DATA_RELOAD_INTERVAL = float(os.getenv('BOT_DATA_RELOAD_INTERVAL', '5'))
+
+# Таблицы: имя в файле данных (в resistor_data - то же имя в верхнем регистре) -> тип
+TABLE_TYPES = {
+    'color_codes': dict,
+    'multipliers': dict,
+    'tolerance': dict,
+    'en_to_ru_colors': dict,
+    'ru_to_en_colors': dict,
+    'input_normalization': dict,
+    'color_abbreviations': dict,
+    'color_modifiers': set,
+    'e24_series': list,
+    'e96_series': list,
+    'series_tolerances': dict,
+    'e96_codes': dict,
+    'e96_multipliers': dict,
+}
+
+# Производные индексы: имя -> функция построения по снимку таблиц
+BUILDERS = {}
+
+
+def freeze(name, value):
+    """Неизменяемая копия таблицы: словарь только для чтения, кортеж или frozenset"""
+    kind = TABLE_TYPES[name]
+    if kind is dict:
+        if not isinstance(value, dict):
+            raise ValueError(f"Table {name} must be an object")
+        return MappingProxyType(dict(value))
+    if not isinstance(value, (list, tuple, set, frozenset)):
+        raise ValueError(f"Table {name} must be a list")
+    return frozenset(value) if kind is set else tuple(value)
+
+
+class DataTables:
+    """Неизменяемый снимок таблиц данных и построенных по ним индексов"""
+
+    def __init__(self, tables, version=0, source='builtin'):
+        for name in TABLE_TYPES:
+            setattr(self, name, freeze(name, tables[name]))
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+        self.indexes = {}
+
+    def index(self, name):
+        """Производный индекс; если он ещё не построен, строится при первом обращении"""
+        try:
+            return self.indexes[name]
+        except KeyError:
+            value = self.indexes[name] = BUILDERS[name](self)
+            return value
+
+    def build_indexes(self):
+        """Строит все зарегистрированные индексы заранее (до подмены снимка)"""
+        for name in BUILDERS:
+            self.index(name)
+        return self
+
+
+def derived(name):
+    """Декоратор функции построения производного индекса: func(tables) -> индекс"""
+    def decorator(func):
+        # Повторная регистрация заменяет прежнюю: resistor_code_bot, запущенный скриптом,
+        # импортируется ещё раз под своим именем (worker_pool)
+        BUILDERS[name] = func
+        return func
+    return decorator
+
+
+def builtin_tables():
+    """Таблицы из resistor_data"""
+    return {name: getattr(resistor_data, name.upper()) for name in TABLE_TYPES}
+
+
+def read_tables(path):
+    """Снимок по файлу данных: таблицы файла поверх встроенных"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get('version'), int):
+        raise ValueError("Data file must be an object with an integer 'version'")
+    unknown = set(data) - set(TABLE_TYPES) - {'version'}
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+    tables = builtin_tables()
+    tables.update((name, value) for name, value in data.items() if name != 'version')
+    return DataTables(tables, data['version'], path)
+
+
+def load_tables(path):
+    """Чтение файла и построение всех индексов; выполняется в фоновом потоке"""
+    return read_tables(path).build_indexes()
+
+
+def file_stamp(path):
+    """Время изменения и размер файла; None, если файла нет"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def initial_tables(path=DATA_FILE):
+    """Снимок при запуске: файл данных, если он задан и корректен, иначе встроенные таблицы"""
+    if path:
+        try:
+            tables = read_tables(path)
+            logging.info(f"📚 Data tables version {tables.version} loaded from {path}")
+            return tables
+        except (OSError, ValueError) as e:
+            logging.error(f"❌ Cannot load data file {path}, using built-in tables: {e}")
+    return DataTables(builtin_tables())
+
+
+_current = initial_tables()
+
+
+def current():
+    """Действующий снимок таблиц"""
+    return _current
+
+
+def swap(tables):
+    """Делает снимок действующим и сбрасывает кэши, посчитанные по прежним таблицам"""
+    global _current
+    previous, _current = _current, tables
+    metrics.clear_caches()
+    logging.info(f"📚 Data tables switched from version {previous.version} to {tables.version} ({tables.source})")
+    return previous
+
+
+class DataWatcher:
+    """Фоновая проверка файла данных и подмена таблиц при выходе новой версии"""
+
+    def __init__(self, path, interval=DATA_RELOAD_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.stamp = file_stamp(path)
+        self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    async def check(self):
+        """Перечитывает файл, если он изменился; True, если таблицы подменены"""
+        stamp = file_stamp(self.path)
+        if stamp is None or stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        loop = asyncio.get_running_loop()
+        try:
+            tables = await loop.run_in_executor(None, load_tables, self.path)
+        except Exception as e:
+            # Некорректный файл (в том числе таблицы, по которым не строятся индексы)
+            # не должен останавливать бота - остаются прежние таблицы
+            metrics.count_data_reload('rejected')
+            logging.error(f"❌ Data file {self.path} rejected, keeping version {current().version}: {e}")
+            return False
+        if tables.version == current().version:
+            # Изменения публикуются увеличением version; промежуточные сохранения пропускаются
+            logging.info(f"📚 Data file {self.path} changed but version {tables.version} is unchanged")
+            return False
+        swap(tables)
+        metrics.count_data_reload('applied')
+        return True
+
+
+async def start_watcher(application):
+    """post_init: строит индексы действующего снимка и запускает проверку BOT_DATA_FILE в фоне"""
+    # Индексы строятся до приёма обновлений, а не при первом запросе пользователя
+    current().build_indexes()
+    if not DATA_FILE or DATA_RELOAD_INTERVAL <= 0:
+        return
+    watcher = DataWatcher(DATA_FILE)
+    watcher.task = asyncio.create_task(watcher.run())
+    application.bot_data['data_watcher'] = watcher
+
+
+async def stop_watcher(application):
+    """post_stop: останавливает фоновую проверку"""
+    watcher = application.bot_data.pop('data_watcher', None)
+    if watcher is not None:
+        watcher.task.cancel()
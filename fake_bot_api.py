@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Локальная замена Telegram Bot API для нагрузочного тестирования.
+
+Реализует getMe, getUpdates, setWebhook/deleteWebhook/getWebhookInfo, sendMessage и
+editMessageText (остальные методы отвечают успехом) с настраиваемой задержкой и внедрением
+ошибок 5xx и 429. Бот подключается к серверу через BOT_API_BASE_URL.
+
+    python fake_bot_api.py --port 8081 --latency 0.02 --error-rate 0.01 --rate-limit-rate 0.01
+    BOT_API_BASE_URL=http://127.0.0.1:8081/bot python resistor_code_bot.py
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+
+try:
+    from aiohttp import ClientSession, ClientTimeout, web
+except ImportError:
+    raise SystemExit("❌ aiohttp is required: pip install aiohttp")
+
+from stub_request import STUB_BOT_USER
+
+# Методы, к которым применяются внедряемые ошибки (как у настоящего API - отправка сообщений)
+FAULT_METHODS = {'sendMessage', 'editMessageText', 'editMessageReplyMarkup', 'sendDocument',
+                 'answerCallbackQuery'}
+
+
+class FakeBotAPI:
+    """Состояние фиктивного сервера Bot API"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1, on_send=None, on_fault=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        # on_send(chat_id, api_method, params) - уведомление генератора нагрузки об ответе бота
+        self.on_send = on_send
+        # on_fault(chat_id, api_method, status) - вызов бота получил внедрённую ошибку
+        self.on_fault = on_fault
+
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.pending = []
+        self.new_updates = asyncio.Event()
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.session = None
+        self.calls = Counter()
+        self.faults = Counter()
+        # callback_query_id -> пользователь: у answerCallbackQuery нет chat_id
+        self.callback_users = {}
+        # Срабатывает, когда бот начал получать обновления (getUpdates или setWebhook)
+        self.bot_ready = asyncio.Event()
+
+    # --- Генерация входящих обновлений ---
+
+    async def push_update(self, update):
+        """Доставляет обновление боту: через вебхук или очередь getUpdates"""
+        update['update_id'] = next(self.update_ids)
+        if self.webhook_url:
+            headers = {}
+            if self.webhook_secret:
+                headers['X-Telegram-Bot-Api-Secret-Token'] = self.webhook_secret
+            async with self.session.post(self.webhook_url, json=update, headers=headers) as response:
+                if response.status != 200:
+                    self.faults['webhook_http_%d' % response.status] += 1
+        else:
+            self.pending.append(update)
+            self.new_updates.set()
+
+    def make_message_update(self, user_id, text, language_code='ru'):
+        """Обновление с текстовым сообщением от пользователя"""
+        message = {
+            'message_id': next(self.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}',
+                     'language_code': language_code},
+            'text': text,
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        return {'message': message}
+
+    def make_callback_update(self, user_id, data, language_code='ru', message_id=1):
+        """Обновление с нажатием inline-кнопки под сообщением бота"""
+        user = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}',
+                'language_code': language_code}
+        callback_id = str(next(self.message_ids))
+        self.callback_users[callback_id] = user_id
+        return {'callback_query': {
+            'id': callback_id,
+            'from': user,
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': dict(STUB_BOT_USER),
+                'text': '🏠',
+            },
+        }}
+
+    # --- Методы Bot API ---
+
+    async def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        self.bot_ready.set()
+
+        # Подтверждённые обновления (id < offset) удаляются
+        if offset:
+            self.pending = [u for u in self.pending if u['update_id'] >= offset]
+        if not self.pending and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.pending[:limit]
+
+    async def set_webhook(self, params):
+        self.webhook_url = params.get('url') or None
+        self.webhook_secret = params.get('secret_token') or None
+        if self.webhook_url:
+            self.bot_ready.set()
+        return True
+
+    async def send_message(self, api_method, params):
+        chat_id = int(params.get('chat_id') or 0)
+        if self.on_send is not None:
+            self.on_send(chat_id, api_method, params)
+        return {
+            'message_id': int(params.get('message_id') or next(self.message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': params.get('text', ''),
+        }
+
+    def fault(self, api_method, params, status):
+        self.faults[str(status)] += 1
+        if self.on_fault is not None:
+            chat_id = params.get('chat_id') or self.callback_users.pop(params.get('callback_query_id'), None)
+            self.on_fault(int(chat_id or 0), api_method, status)
+
+    async def dispatch(self, api_method, params):
+        """Выполнение метода; возвращает (HTTP код, тело ответа)"""
+        self.calls[api_method] += 1
+
+        if api_method != 'getUpdates' and (self.latency or self.jitter):
+            await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+        if api_method in FAULT_METHODS:
+            roll = random.random()
+            if roll < self.rate_limit_rate:
+                self.fault(api_method, params, 429)
+                return 429, {'ok': False, 'error_code': 429,
+                             'description': f'Too Many Requests: retry after {self.retry_after}',
+                             'parameters': {'retry_after': self.retry_after}}
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.fault(api_method, params, 500)
+                return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+
+        if api_method == 'getMe':
+            result = STUB_BOT_USER
+        elif api_method == 'getUpdates':
+            result = await self.get_updates(params)
+        elif api_method == 'setWebhook':
+            result = await self.set_webhook(params)
+        elif api_method == 'deleteWebhook':
+            result = await self.set_webhook({})
+        elif api_method == 'getWebhookInfo':
+            result = {'url': self.webhook_url or '', 'has_custom_certificate': False,
+                      'pending_update_count': len(self.pending)}
+        elif api_method.startswith('send') or api_method.startswith('edit'):
+            result = await self.send_message(api_method, params)
+        elif api_method == 'answerCallbackQuery':
+            self.callback_users.pop(params.get('callback_query_id'), None)
+            result = True
+        else:
+            result = True
+        return 200, {'ok': True, 'result': result}
+
+    # --- HTTP ---
+
+    async def handle(self, request):
+        params = dict(request.query)
+        if request.method == 'POST':
+            if request.content_type == 'application/json':
+                params.update(await request.json())
+            else:
+                # PTB передаёт параметры формой; не строковые значения закодированы в JSON
+                for key, value in (await request.post()).items():
+                    if isinstance(value, str) and value[:1] in '{[':
+                        try:
+                            value = json.loads(value)
+                        except ValueError:
+                            pass
+                    params[key] = value
+        status, body = await self.dispatch(request.match_info['method'], params)
+        return web.json_response(body, status=status)
+
+    async def start(self, host='127.0.0.1', port=8081):
+        """Запуск HTTP сервера; возвращает runner для остановки"""
+        self.session = ClientSession(timeout=ClientTimeout(total=30))
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    async def stop(self, runner):
+        await self.session.close()
+        await runner.cleanup()
+
+
+def build_arg_parser():
+    """Параметры фиктивного сервера (используются и в load_test.py)"""
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help="mean API latency, seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="latency std deviation, seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of 500 responses")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument('--retry-after', type=int, default=1, help="retry_after for 429 responses")
+    return parser
+
+
+async def serve_forever(args):
+    server = FakeBotAPI(args.latency, args.jitter, args.error_rate, args.rate_limit_rate,
+                        args.retry_after)
+    runner = await server.start(args.host, args.port)
+    print(f"🧪 Fake Bot API: BOT_API_BASE_URL=http://{args.host}:{args.port}/bot")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop(runner)
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(serve_forever(build_arg_parser().parse_args()))
+    except KeyboardInterrupt:
+        pass
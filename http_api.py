@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+HTTP JSON API к тем же функциям расчёта, что и у бота (общие таблицы и кэши).
+
+Запускается в процессе бота, если задан BOT_HTTP_API_PORT, или отдельно без Telegram:
+
+    python http_api.py --port 8080
+    curl 'http://127.0.0.1:8080/v1/colors?q=yellow+violet+red+gold'
+    curl -X POST --data-binary @values.ndjson -H 'Content-Type: application/x-ndjson' \\
+        http://127.0.0.1:8080/v1/batch/value
+
+Одиночные запросы: GET /v1/{colors,smd,value,fit}?q=...&lang=en|ru.
+Пакетные: POST /v1/batch/{вид} с JSON массивом строк (ответ - JSON массив) или потоком
+NDJSON (по строке JSON на запрос, ответ - NDJSON). Ответы на пакеты отправляются
+по мере расчёта, поэтому большой пакет не собирается в памяти целиком.
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+
+from aiohttp import web
+
+import admission
+import metrics
+import resistor_code_bot as bot
+from color_matcher import match_colors
+from smd_decoder import resistance_to_smd, smd_to_resistance
+from tolerance_index import bands_to_nominal, check_bands, fitting_values, split_measurement
+
+HTTP_API_PORT = os.getenv('BOT_HTTP_API_PORT')
+HTTP_API_HOST = os.getenv('BOT_HTTP_API_HOST', '127.0.0.1')
+# Максимальный размер тела одиночного JSON запроса и потока NDJSON, байт
+HTTP_API_MAX_BODY = int(os.getenv('BOT_HTTP_API_MAX_BODY', str(1024 * 1024)))
+HTTP_API_MAX_STREAM = int(os.getenv('BOT_HTTP_API_MAX_STREAM', str(64 * 1024 * 1024)))
+# Максимальное число запросов в одном пакете
+HTTP_API_MAX_BATCH = int(os.getenv('BOT_HTTP_API_MAX_BATCH', '100000'))
+# Сколько секунд держать простаивающее keep-alive соединение
+HTTP_API_KEEPALIVE = float(os.getenv('BOT_HTTP_API_KEEPALIVE', '75'))
+
+NDJSON = 'application/x-ndjson'
+dumps = functools.partial(json.dumps, ensure_ascii=False)
+# Через сколько элементов пакета отдавать управление циклу событий
+YIELD_EVERY = 64
+
+
+def decode_colors(text, language):
+    """Цвета полос -> номинал"""
+    match = match_colors(text)
+    result = {'input': text, 'colors': bot.convert_colors_to_target_language(match.colors, language),
+              'confidence': round(match.confidence, 3)}
+    if match.corrections:
+        result['corrections'] = [[word, color] for word, color in match.corrections]
+    if match.unknown or not match.colors:
+        result['error'] = f"Unknown color: {match.unknown[0]}" if match.unknown else "No colors"
+        return result
+    resistance, tolerance = bot.colors_to_resistance(list(match.colors))
+    if not resistance:
+        result['error'] = tolerance
+        return result
+    result['resistance'] = resistance
+    result['tolerance'] = tolerance
+    marking = bands_to_nominal(text)
+    if marking is not None:
+        result['ohms'] = marking[0]
+    return result
+
+
+def decode_smd(text, language):
+    """SMD код -> номинал"""
+    decoded = smd_to_resistance(text)
+    if not decoded:
+        return {'input': text, 'error': "Could not decode SMD code"}
+    (resistance, code_type), others = decoded[0], decoded[1:]
+    result = {'input': text, 'resistance': resistance, 'type': code_type}
+    if others:
+        # Другие прочтения неоднозначного кода
+        result['ambiguous'] = [{'resistance': value, 'type': name} for value, name in others]
+    return result
+
+
+def encode_value(text, language):
+    """Номинал -> цветовая маркировка и SMD коды"""
+    colors_4, colors_5, error = bot.resistance_to_colors(text)
+    if error:
+        return {'input': text, 'error': error}
+    result = {
+        'input': text,
+        'colors_4': bot.convert_colors_to_target_language(colors_4, language) if colors_4 else None,
+        'colors_5': bot.convert_colors_to_target_language(colors_5, language) if colors_5 else None,
+        'smd': [],
+    }
+    smd_result = resistance_to_smd(text)
+    if isinstance(smd_result, tuple):
+        result['resistance'], codes, series = smd_result
+        result['smd'] = [{'code': code, 'series': name} for code, name in zip(codes, series)]
+    return result
+
+
+def fit_value(text, language):
+    """Измеренное значение [цвета полос] -> подходящие стандартные номиналы или проверка маркировки"""
+    measured, bands = split_measurement(text)
+    if not measured:
+        return {'input': text, 'error': "Could not parse measured value"}
+    result = {'input': text, 'ohms': measured}
+    if bands:
+        check = check_bands(measured, bands)
+        if check is None:
+            result['error'] = f"Could not recognize band colors: {bands}"
+        else:
+            result['check'] = check._asdict()
+        return result
+    result['fits'] = [fit._asdict() for fit in fitting_values(measured)]
+    return result
+
+
+# Вид запроса -> функция (текст, язык) -> словарь ответа
+DECODERS = {
+    'colors': decode_colors,
+    'smd': decode_smd,
+    'value': encode_value,
+    'fit': fit_value,
+}
+
+
+def run_decoder(kind, text, language):
+    """Один запрос; ошибки расчёта возвращаются в поле error, а не обрывают пакет"""
+    if not isinstance(text, str):
+        return {'input': text, 'error': "Query must be a string"}
+    try:
+        return DECODERS[kind](text.strip(), language)
+    except Exception as e:
+        logging.exception(f"❌ HTTP API {kind} failed for {text!r}")
+        return {'input': text, 'error': f"Internal error: {e}"}
+
+
+def request_kind(request):
+    kind = request.match_info['kind']
+    if kind not in DECODERS:
+        raise web.HTTPNotFound(text=json.dumps({'error': f"Unknown kind: {kind}"}),
+                               content_type='application/json')
+    return kind
+
+
+def request_language(request):
+    return 'ru' if request.query.get('lang') == 'ru' else 'en'
+
+
+@metrics.timed('handler')
+async def api_decode(request):
+    """GET /v1/{вид}?q=..."""
+    kind = request_kind(request)
+    text = request.query.get('q')
+    if text is None:
+        return web.json_response({'error': "Missing query parameter q"}, status=400)
+    result = run_decoder(kind, text, request_language(request))
+    return web.json_response(result, status=422 if 'error' in result else 200, dumps=dumps)
+
+
+@metrics.timed('handler')
+async def api_batch(request):
+    """POST /v1/batch/{вид}: JSON массив или поток NDJSON"""
+    kind = request_kind(request)
+    language = request_language(request)
+    reason = admission.overloaded()
+    if reason is not None:
+        # Пакеты - самая дорогая работа: при перегрузке отклоняются первыми, одиночные запросы идут
+        metrics.count_shed('http_batch')
+        return web.json_response({'error': f"Server is busy ({reason}), retry later"}, status=503,
+                                 headers={'Retry-After': '5'})
+    if request.content_type == NDJSON:
+        return await stream_ndjson(request, kind, language)
+
+    try:
+        # Тело больше client_max_size (BOT_HTTP_API_MAX_BODY) отклоняется с 413 при чтении
+        items = await request.json()
+    except ValueError:
+        return web.json_response({'error': "Body must be a JSON array"}, status=400)
+    if not isinstance(items, list):
+        return web.json_response({'error': "Body must be a JSON array"}, status=400)
+    if len(items) > HTTP_API_MAX_BATCH:
+        return web.json_response({'error': f"Batch is limited to {HTTP_API_MAX_BATCH} items"}, status=413)
+
+    response = web.StreamResponse(headers={'Content-Type': 'application/json'})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    await response.write(b'[')
+    for i, item in enumerate(items):
+        chunk = dumps(run_decoder(kind, item, language))
+        await response.write(((',' if i else '') + chunk).encode('utf-8'))
+        if i % YIELD_EVERY == YIELD_EVERY - 1:
+            await asyncio.sleep(0)
+    await response.write(b']')
+    await response.write_eof()
+    return response
+
+
+async def stream_ndjson(request, kind, language):
+    """Поток NDJSON: каждая строка - JSON строка с запросом; ответ - строка на запрос"""
+    response = web.StreamResponse(headers={'Content-Type': NDJSON})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    received = 0
+    count = 0
+    while True:
+        line = await request.content.readline()
+        if not line:
+            break
+        received += len(line)
+        if received > HTTP_API_MAX_STREAM or count >= HTTP_API_MAX_BATCH:
+            # Заголовки уже отправлены - сообщаем об ошибке последней строкой
+            await response.write(json.dumps({'error': "Batch size limit exceeded"}).encode('utf-8') + b'\n')
+            break
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            result = {'input': line.decode('utf-8', 'replace'), 'error': "Invalid JSON line"}
+        else:
+            result = run_decoder(kind, item, language)
+        await response.write(dumps(result).encode('utf-8') + b'\n')
+        count += 1
+        if count % YIELD_EVERY == 0:
+            await asyncio.sleep(0)
+    await response.write_eof()
+    return response
+
+
+async def health(request):
+    return web.json_response({'status': 'ok'})
+
+
+def build_app():
+    """aiohttp приложение API"""
+    app = web.Application(client_max_size=HTTP_API_MAX_BODY)
+    app.router.add_get('/healthz', health)
+    app.router.add_get('/v1/{kind}', api_decode)
+    app.router.add_post('/v1/batch/{kind}', api_batch)
+    return app
+
+
+async def start_server(host=HTTP_API_HOST, port=None):
+    """Запускает API в текущем цикле событий; возвращает runner для остановки"""
+    port = int(port or HTTP_API_PORT)
+    runner = web.AppRunner(build_app(), access_log=None, keepalive_timeout=HTTP_API_KEEPALIVE)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"🌐 HTTP API: http://{host}:{port}/v1/")
+    return runner
+
+
+def register_http_api(application, host=HTTP_API_HOST, port=None):
+    """Запускает API вместе с приложением бота (в его цикле событий)"""
+    previous_init = application.post_init
+    previous_stop = application.post_stop
+
+    async def post_init(app):
+        if previous_init is not None:
+            await previous_init(app)
+        app.bot_data['http_api'] = await start_server(host, port)
+
+    async def post_stop(app):
+        runner = app.bot_data.pop('http_api', None)
+        if runner is not None:
+            await runner.cleanup()
+        if previous_stop is not None:
+            await previous_stop(app)
+
+    application.post_init = post_init
+    application.post_stop = post_stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resistor codec HTTP JSON API without Telegram")
+    parser.add_argument('--host', default=HTTP_API_HOST)
+    parser.add_argument('--port', type=int, default=int(HTTP_API_PORT or 8080))
+    args = parser.parse_args()
+    app = build_app()
+
+    async def start_lag_monitor(app):
+        admission.monitor.start()
+
+    app.on_startup.append(start_lag_monitor)
+    web.run_app(app, host=args.host, port=args.port, access_log=None, keepalive_timeout=HTTP_API_KEEPALIVE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Сквозной нагрузочный тест: настоящий бот (resistor_code_bot.py) в отдельном процессе
+подключается к локальному fake_bot_api.py, а виртуальные пользователи отправляют
+запросы, переключают режимы и языки.
+
+    python load_test.py --users 2000 --messages 20
+    python load_test.py --mode webhook --users 2000 --latency 0.03 --rate-limit-rate 0.01
+"""
+
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from fake_bot_api import FakeBotAPI, build_arg_parser
+
+# callback_data inline-кнопок режимов, меню языка и выбора языка
+MODE_BUTTONS = {'throughhole': 't', 'smd': 's', 'main': 'm'}
+LANGUAGE_BUTTON = 'l'
+
+# Типичные запросы по режимам
+COLOR_QUERIES = {
+    'ru': ["красный красный красный золотой", "коричневый чёрный оранжевый золотой",
+           "жёлтый фиолетовый красный серебряный", "коричневый чёрный чёрный красный коричневый"],
+    'en': ["red red red gold", "brown black orange gold", "yellow violet red silver",
+           "brown black black red brown"],
+}
+VALUE_QUERIES = ["1k", "4.7k", "470 Ohm", "2.2M", "10k", "330", "1.5k", "68k", "4.62k"]
+SMD_QUERIES = ["103", "4R7", "01C", "R047", "472", "68X", "220"]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class LoadGenerator:
+    """Виртуальные пользователи: одно ожидающее сообщение на пользователя"""
+
+    def __init__(self, server, timeout):
+        self.server = server
+        self.timeout = timeout
+        self.waiting = {}
+        self.latencies = []
+        self.results = Counter()
+
+    def on_send(self, chat_id, api_method, params):
+        # /start сначала убирает старую постоянную клавиатуру; ответ - следующее сообщение с меню
+        if 'remove_keyboard' in (params.get('reply_markup') or {}):
+            return
+        future = self.waiting.pop(chat_id, None)
+        if future is not None and not future.done():
+            future.set_result((time.perf_counter(), None))
+        else:
+            self.results['late_or_unsolicited'] += 1
+
+    def on_fault(self, chat_id, api_method, status):
+        # Бот не повторяет вызов после 429/5xx: ответ потерян, и ждать таймаута незачем
+        future = self.waiting.pop(chat_id, None)
+        if future is not None and not future.done():
+            future.set_result((time.perf_counter(), status))
+
+    async def request(self, user_id, text, language):
+        await self.deliver(user_id, self.server.make_message_update(user_id, text, language))
+
+    async def press(self, user_id, data, language):
+        await self.deliver(user_id, self.server.make_callback_update(user_id, data, language))
+
+    async def deliver(self, user_id, update):
+        """Отправляет обновление и ждёт ответа бота в тот же чат"""
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[user_id] = future
+        start = time.perf_counter()
+        await self.server.push_update(update)
+        try:
+            finished, fault = await asyncio.wait_for(future, self.timeout)
+            if fault is None:
+                self.latencies.append(finished - start)
+                self.results['ok'] += 1
+            else:
+                # Внедрённые ошибки считаются отдельно и не искажают задержки и таймауты
+                self.results[f'lost_to_{fault}'] += 1
+        except asyncio.TimeoutError:
+            self.waiting.pop(user_id, None)
+            self.results['timeout'] += 1
+
+    async def virtual_user(self, user_id, messages, think_time, ramp):
+        await asyncio.sleep(random.uniform(0, ramp))
+        language = 'ru'
+        mode = 'main'
+        await self.request(user_id, '/start', language)
+        for _ in range(messages):
+            roll = random.random()
+            if roll < 0.10:
+                mode = random.choice(['throughhole', 'smd', 'main'])
+                await self.press(user_id, MODE_BUTTONS[mode], language)
+            elif roll < 0.13:
+                await self.press(user_id, LANGUAGE_BUTTON, language)
+                language = 'en' if language == 'ru' else 'ru'
+                await self.press(user_id, language, language)
+                mode = 'main'
+            elif mode == 'throughhole' or (mode == 'main' and roll < 0.4):
+                text = random.choice(COLOR_QUERIES[language] + VALUE_QUERIES)
+                await self.request(user_id, text, language)
+            else:
+                await self.request(user_id, random.choice(SMD_QUERIES + VALUE_QUERIES), language)
+            if think_time:
+                await asyncio.sleep(random.expovariate(1 / think_time))
+
+
+def start_bot(args):
+    """Запуск настоящего бота, направленного на фиктивный сервер"""
+    env = dict(os.environ)
+    env['BOT_TOKEN'] = '123456789:load-test'
+    env['BOT_API_BASE_URL'] = f"http://{args.host}:{args.port}/bot"
+    env.setdefault('BOT_LOG_LEVEL', 'WARNING')
+    # Виртуальные пользователи не ждут между сообщениями - ограничение частоты им не нужно
+    env.setdefault('BOT_RATE_CHEAP', '0')
+    env.setdefault('BOT_RATE_EXPENSIVE', '0')
+    if args.mode == 'webhook':
+        env['BOT_WEBHOOK_URL'] = f"http://127.0.0.1:{args.webhook_port}/webhook"
+        env['BOT_WEBHOOK_LISTEN'] = '127.0.0.1'
+        env['BOT_WEBHOOK_PORT'] = str(args.webhook_port)
+    else:
+        env.pop('BOT_WEBHOOK_URL', None)
+    return subprocess.Popen([sys.executable, 'resistor_code_bot.py'], env=env,
+                            stdout=subprocess.DEVNULL,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+async def run(args):
+    server = FakeBotAPI(args.latency, args.jitter, args.error_rate, args.rate_limit_rate,
+                        args.retry_after)
+    generator = LoadGenerator(server, args.timeout)
+    server.on_send = generator.on_send
+    server.on_fault = generator.on_fault
+    runner = await server.start(args.host, args.port)
+
+    bot = start_bot(args)
+    try:
+        await asyncio.wait_for(server.bot_ready.wait(), 60)
+        # В режиме вебхука даём боту открыть порт после setWebhook
+        await asyncio.sleep(1 if args.mode == 'webhook' else 0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            generator.virtual_user(100000 + i, args.messages, args.think_time, args.ramp)
+            for i in range(args.users)
+        ))
+        elapsed = time.perf_counter() - started
+    finally:
+        # Ожидание завершения бота не должно блокировать цикл событий фиктивного сервера
+        bot.send_signal(signal.SIGINT)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, bot.wait, 10)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        await server.stop(runner)
+
+    latencies = sorted(generator.latencies)
+    return {
+        'mode': args.mode,
+        'users': args.users,
+        'elapsed_s': elapsed,
+        'replies_per_sec': generator.results['ok'] / elapsed if elapsed else 0.0,
+        'results': dict(generator.results),
+        'latency_ms': {
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'p999': percentile(latencies, 0.999) * 1000,
+            'max': (latencies[-1] if latencies else 0.0) * 1000,
+        },
+        'injected_faults': dict(server.faults),
+        'api_calls': dict(server.calls),
+    }
+
+
+def main():
+    parser = build_arg_parser()
+    parser.description = "End-to-end load test against the fake Bot API"
+    parser.add_argument('--mode', choices=['polling', 'webhook'], default='polling')
+    parser.add_argument('--webhook-port', type=int, default=8443)
+    parser.add_argument('--users', type=int, default=1000, help="number of virtual users")
+    parser.add_argument('--messages', type=int, default=10, help="messages per user after /start")
+    parser.add_argument('--think-time', type=float, default=0.5, help="mean pause between messages, s")
+    parser.add_argument('--ramp', type=float, default=5.0, help="user start spread, s")
+    parser.add_argument('--timeout', type=float, default=30.0, help="reply timeout, s")
+    parser.add_argument('--save', help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    print("=" * 50)
+    print(f"🧪 Mode: {report['mode']}, users: {report['users']}, {report['elapsed_s']:.1f} s")
+    print(f"🚀 Throughput: {report['replies_per_sec']:.1f} replies/s")
+    print("⏱  Latency: " + ", ".join(f"{k}={v:.1f} ms" for k, v in report['latency_ms'].items()))
+    print("📋 Results: " + ", ".join(f"{k}={v}" for k, v in sorted(report['results'].items())))
+    if report['injected_faults']:
+        print("💥 Injected: " + ", ".join(f"{k}={v}" for k, v in sorted(report['injected_faults'].items())))
+    print("=" * 50)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+"""
+Метрики производительности бота (задержки, счётчики запросов и ошибок)
+в формате Prometheus
+"""
+
+import asyncio
+import bisect
+import collections
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Метрики включаются переменной BOT_METRICS_ENABLED=1 или заданием порта BOT_METRICS_PORT.
+# Если они выключены, декораторы возвращают исходные функции без обёрток.
+METRICS_PORT = os.getenv('BOT_METRICS_PORT')
+METRICS_HOST = os.getenv('BOT_METRICS_HOST', '127.0.0.1')
+METRICS_ENABLED = os.getenv('BOT_METRICS_ENABLED', '0') == '1' or bool(METRICS_PORT)
+
+# Границы корзин гистограмм задержек (в секундах)
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Размер LRU кэшей результатов функций расчёта
+CACHE_SIZE = int(os.getenv('BOT_CACHE_SIZE', '1024'))
+
+START_TIME = time.time()
+
+# Общее число полученных обновлений (для /stats, считается всегда)
+updates_seen = 0
+
+# Зарегистрированные кэши: имя -> функция с lru_cache
+CACHES = {}
+
+
+class Counter:
+    """Счётчик с метками"""
+
+    def __init__(self, name, documentation, label_name):
+        self.name = name
+        self.documentation = documentation
+        self.label_name = label_name
+        self.values = {}
+
+    def inc(self, label, amount=1):
+        self.values[label] = self.values.get(label, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label, value in sorted(list(self.values.items())):
+            lines.append(f'{self.name}{{{self.label_name}="{label}"}} {value}')
+        return lines
+
+
+class Histogram:
+    """Гистограмма задержек одной серии (без меток)"""
+
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Оценка квантиля линейной интерполяцией внутри корзины"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bucket_count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if bucket_count and seen + bucket_count >= rank:
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = upper
+        return self.buckets[-1]
+
+
+class HistogramFamily:
+    """Набор гистограмм, различающихся значением одной метки"""
+
+    def __init__(self, name, documentation, label_name, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_name = label_name
+        self.buckets = buckets
+        self.children = {}
+
+    def labels(self, label):
+        child = self.children.get(label)
+        if child is None:
+            child = self.children[label] = Histogram(self.buckets)
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label, child in sorted(list(self.children.items())):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, child.counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{self.label_name}="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{self.label_name}="{label}",le="+Inf"}} {child.count}')
+            lines.append(f'{self.name}_sum{{{self.label_name}="{label}"}} {child.total}')
+            lines.append(f'{self.name}_count{{{self.label_name}="{label}"}} {child.count}')
+        return lines
+
+
+HANDLER_LATENCY = HistogramFamily(
+    'bot_handler_seconds', 'Handler latency including outbound API calls', 'handler')
+CODEC_LATENCY = HistogramFamily(
+    'bot_codec_seconds', 'Local codec compute time', 'function')
+API_LATENCY = HistogramFamily(
+    'bot_api_seconds', 'Outbound Telegram Bot API call latency', 'method')
+API_POOL_WAIT = HistogramFamily(
+    'bot_api_pool_wait_seconds', 'Time Bot API calls wait for a free pooled connection', 'client')
+ROUTE_LATENCY = HistogramFamily(
+    'bot_route_seconds', 'Latency of routed menu actions and request handlers', 'route')
+LOOP_LAG = HistogramFamily(
+    'bot_loop_lag_seconds', 'Event loop lag seen by a periodic probe task', 'process')
+REQUESTS = Counter('bot_requests_total', 'Incoming requests by detected type', 'type')
+ERRORS = Counter('bot_errors_total', 'Unhandled exceptions by handler or function', 'where')
+DEDUP = Counter('bot_dedup_updates_total', 'Updates checked against the dedup window by result', 'result')
+DATA_RELOADS = Counter('bot_data_reloads_total', 'Data file reloads by result', 'result')
+SHED = Counter('bot_shed_total', 'Expensive requests rejected under load by kind', 'kind')
+THROTTLED = Counter('bot_throttled_total', 'Requests over the per-user rate limit by budget', 'kind')
+
+REGISTRY = [HANDLER_LATENCY, CODEC_LATENCY, API_LATENCY, API_POOL_WAIT, ROUTE_LATENCY, LOOP_LAG, REQUESTS,
+            ERRORS, DEDUP, DATA_RELOADS, SHED, THROTTLED]
+
+
+def timed(kind='codec', name=None):
+    """Декоратор замера времени: kind='handler' для async обработчиков, 'codec' для функций расчёта,
+    'route' для маршрутов router.Router; name - метка вместо имени функции"""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        label = name or func.__name__
+        family = {'handler': HANDLER_LATENCY, 'route': ROUTE_LATENCY}.get(kind, CODEC_LATENCY)
+        histogram = family.labels(label)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    ERRORS.inc(label)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                ERRORS.inc(label)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+
+    return decorator
+
+
+def count_request(request_type):
+    """Учёт входящего запроса по определённому типу (colors, smd, value, menu)"""
+    if METRICS_ENABLED:
+        REQUESTS.inc(request_type)
+
+
+def count_dedup(result):
+    """Учёт проверки обновления на повтор (new или duplicate)"""
+    if METRICS_ENABLED:
+        DEDUP.inc(result)
+
+
+def count_data_reload(result):
+    """Учёт перезагрузки файла данных (applied или rejected)"""
+    if METRICS_ENABLED:
+        DATA_RELOADS.inc(result)
+
+
+def observe_loop_lag(process, lag):
+    """Учёт задержки цикла событий процесса (main или worker-N)"""
+    if METRICS_ENABLED:
+        LOOP_LAG.labels(process).observe(lag)
+
+
+def count_shed(kind):
+    """Учёт отказа в дорогом запросе из-за перегрузки (fit, http_batch)"""
+    if METRICS_ENABLED:
+        SHED.inc(kind)
+
+
+def count_throttled(kind):
+    """Учёт запроса сверх ограничения частоты пользователя (cheap или expensive)"""
+    if METRICS_ENABLED:
+        THROTTLED.inc(kind)
+
+
+def cached(maxsize=None):
+    """Декоратор LRU кэша с регистрацией для статистики попаданий.
+
+    Аргументы промахов (последние maxsize) сохраняются в recent_keys функции: по ним
+    кэш прогревается после перезапуска (state_snapshot)
+    """
+    def decorator(func):
+        size = maxsize or CACHE_SIZE
+        recent_keys = collections.deque(maxlen=size)
+
+        # Функция под кэшем вызывается только при промахе - запись не замедляет попадания
+        @functools.wraps(func)
+        def record_miss(*args):
+            recent_keys.append(args)
+            return func(*args)
+
+        cached_func = functools.lru_cache(maxsize=size)(record_miss)
+        cached_func.recent_keys = recent_keys
+        CACHES[func.__name__] = cached_func
+        return cached_func
+    return decorator
+
+
+def cache_stats():
+    """Статистика кэшей: имя -> (попадания, промахи, размер, максимум)"""
+    stats = {}
+    for name, func in CACHES.items():
+        info = func.cache_info()
+        stats[name] = (info.hits, info.misses, info.currsize, info.maxsize)
+    return stats
+
+
+def clear_caches():
+    """Сбрасывает все зарегистрированные кэши (после замены таблиц данных)"""
+    for func in CACHES.values():
+        func.cache_clear()
+
+
+def count_update():
+    """Учёт полученного обновления"""
+    global updates_seen
+    updates_seen += 1
+
+
+def render():
+    """Текст всех метрик в формате Prometheus"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    stats = cache_stats()
+    lines.append("# HELP bot_cache_hits_total Codec cache hits")
+    lines.append("# TYPE bot_cache_hits_total counter")
+    for name, (hits, misses, size, maxsize) in sorted(stats.items()):
+        lines.append(f'bot_cache_hits_total{{cache="{name}"}} {hits}')
+    lines.append("# HELP bot_cache_misses_total Codec cache misses")
+    lines.append("# TYPE bot_cache_misses_total counter")
+    for name, (hits, misses, size, maxsize) in sorted(stats.items()):
+        lines.append(f'bot_cache_misses_total{{cache="{name}"}} {misses}')
+    lines.append("# HELP bot_updates_total Updates received")
+    lines.append("# TYPE bot_updates_total counter")
+    lines.append(f"bot_updates_total {updates_seen}")
+    lines.append("# HELP bot_uptime_seconds Seconds since process start")
+    lines.append("# TYPE bot_uptime_seconds gauge")
+    lines.append(f"bot_uptime_seconds {time.time() - START_TIME}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """HTTP обработчик для /metrics"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Не засоряем лог бота запросами сборщика метрик
+        pass
+
+
+def start_http_server(port=None, host=None):
+    """Запускает HTTP сервер метрик в фоновом потоке"""
+    port = int(port or METRICS_PORT)
+    host = host or METRICS_HOST
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    logging.info(f"📈 Metrics endpoint: http://{host}:{port}/metrics")
+    return server
+
+
+def instrumented_request(client='sender', **kwargs):
+    """Создаёт HTTPXRequest, измеряющий задержку вызовов Bot API по методам
+    и ожидание соединения пула (метка client)"""
+    import httpx
+    from telegram.request import HTTPXRequest
+
+    pool_wait = API_POOL_WAIT.labels(client)
+
+    async def trace_pool_wait(request):
+        # Ожидание пула - от передачи запроса транспорту до его первого события:
+        # установки нового соединения или отправки заголовков по готовому
+        start = time.perf_counter()
+        waiting = True
+
+        async def trace(event_name, info):
+            nonlocal waiting
+            if waiting and event_name.endswith('.started'):
+                waiting = False
+                pool_wait.observe(time.perf_counter() - start)
+
+        request.extensions['trace'] = trace
+
+    class InstrumentedRequest(HTTPXRequest):
+        def _build_client(self):
+            return httpx.AsyncClient(**self._client_kwargs, event_hooks={'request': [trace_pool_wait]})
+
+        async def do_request(self, url, method, *args, **kw):
+            histogram = API_LATENCY.labels(url.rsplit('/', 1)[-1])
+            start = time.perf_counter()
+            try:
+                return await super().do_request(url, method, *args, **kw)
+            except Exception:
+                ERRORS.inc('bot_api')
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+    return InstrumentedRequest(**kwargs)
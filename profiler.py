@@ -0,0 +1,183 @@
+"""
+Профилирование работающего процесса по команде администратора (/profile).
+
+Режим stacks (по умолчанию): раз в BOT_PROFILE_INTERVAL секунд процессорного времени
+(таймер SIGPROF, только Unix) снимается стек потока цикла событий, одинаковые стеки
+считаются. Результат - файл в формате collapsed stacks ("функция;...;функция число"),
+из которого flamegraph.pl, inferno или speedscope строят flame graph. Накладные расходы
+не зависят от числа вызовов функций.
+
+Режим cprofile: cProfile в потоке цикла событий (там работают обработчики бота) - точное
+число вызовов и время каждой функции, файл pstats (python -m pstats, snakeviz).
+Замедляет горячий код в разы, поэтому подходит для коротких замеров.
+
+Одновременно выполняется не больше одного профилирования, длительность ограничена
+BOT_PROFILE_MAX_SECONDS.
+"""
+
+import asyncio
+import collections
+import cProfile
+import io
+import marshal
+import math
+import os
+import pstats
+import signal
+import tempfile
+import threading
+import time
+
+PROFILE_INTERVAL = float(os.getenv('BOT_PROFILE_INTERVAL', '0.005'))
+PROFILE_MAX_SECONDS = float(os.getenv('BOT_PROFILE_MAX_SECONDS', '60'))
+# Меньшие длительности округляются вверх: за меньшее время сэмплов почти нет
+PROFILE_MIN_SECONDS = 0.1
+# Каталог, куда сохраняются файлы профилей
+PROFILE_DIR = os.getenv('BOT_PROFILE_DIR') or tempfile.gettempdir()
+
+MODES = ('stacks', 'cprofile')
+
+# Результат: путь к файлу профиля и текстовая сводка для сообщения
+Profile = collections.namedtuple('Profile', 'path summary')
+
+# Описание выполняющегося профилирования (None - профилирование не идёт)
+_active = None
+# Событие досрочного завершения выполняющегося профилирования
+_finish = None
+
+
+def frame_label(code):
+    """Подпись кадра в collapsed stacks (без ';' - он разделяет кадры)"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+class StackSampler:
+    """Выборки стека потока цикла событий по таймеру процессорного времени (SIGPROF).
+
+    Обработчик сигнала выполняется в главном потоке между инструкциями байт-кода и видит
+    тот кадр, который исполняется на самом деле; время ожидания в select не расходует
+    процессорное время и в выборки почти не попадает
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.previous = None
+
+    def sample(self, signum, frame):
+        # Подписи строятся при выгрузке: здесь только объекты кода, от листа к корню
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        self.stacks[tuple(codes)] += 1
+        self.samples += 1
+
+    def start(self):
+        if not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+            raise RuntimeError("Stack sampling needs SIGPROF in the main thread, use cprofile mode")
+        self.previous = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self.previous or signal.SIG_DFL)
+
+    def collapsed(self):
+        """Строки collapsed stacks: от корня к листу, через ';', в конце число выборок"""
+        lines = collections.Counter()
+        for codes, count in self.stacks.items():
+            lines[';'.join(frame_label(code) for code in reversed(codes))] += count
+        return [f"{stack} {count}" for stack, count in sorted(lines.items())]
+
+    def top_functions(self, limit):
+        """Функции по доле выборок, в которых они исполнялись сами (не их вызовы)"""
+        leaves = collections.Counter()
+        for codes, count in self.stacks.items():
+            if codes:
+                leaves[frame_label(codes[0])] += count
+        return leaves.most_common(limit)
+
+
+async def wait_finish(seconds):
+    """Ждёт seconds секунд или досрочного завершения (finish)"""
+    try:
+        await asyncio.wait_for(_finish.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def sample_stacks(seconds, path, top):
+    sampler = StackSampler()
+    sampler.start()
+    try:
+        await wait_finish(seconds)
+    finally:
+        sampler.stop()
+    lines = sampler.collapsed()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    summary = [f"{sampler.samples} samples every {sampler.interval * 1000:g} ms of CPU time "
+               f"({sampler.samples * sampler.interval:.2f} s), {len(lines)} unique stacks",
+               "Self time:"]
+    for label, count in sampler.top_functions(top):
+        summary.append(f"{count / max(sampler.samples, 1) * 100:5.1f}%  {label}")
+    return summary
+
+
+async def profile_loop(seconds, path, top):
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        await wait_finish(seconds)
+    finally:
+        profile.disable()
+    profile.create_stats()
+    # Тот же формат, что у pstats.Stats.dump_stats
+    with open(path, 'wb') as f:
+        marshal.dump(profile.stats, f)
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    summary = [f"{stats.total_calls} calls in {stats.total_tt:.3f} s in the event loop thread",
+               "By cumulative time:"]
+    stats.sort_stats('cumulative')
+    for func in stats.fcn_list[:top]:
+        _, calls, own, cumulative, _ = stats.stats[func]
+        filename, line, name = func
+        summary.append(f"{cumulative:7.3f} s {own:7.3f} s {calls:>7}  {name} ({os.path.basename(filename)}:{line})")
+    return summary
+
+
+def running():
+    """Описание выполняющегося профилирования или None"""
+    return _active
+
+
+def finish():
+    """Досрочно завершает профилирование (при остановке бота); профиль всё равно отправляется"""
+    if _finish is not None:
+        _finish.set()
+
+
+async def run_profile(seconds, mode='stacks', top=10):
+    """Профилирует процесс seconds секунд (не больше BOT_PROFILE_MAX_SECONDS); возвращает Profile"""
+    global _active, _finish
+    if _active is not None:
+        raise RuntimeError(f"Profiling is already running: {_active}")
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+    if not math.isfinite(seconds):
+        raise ValueError(f"Profile duration must be finite: {seconds}")
+    seconds = min(max(seconds, PROFILE_MIN_SECONDS), PROFILE_MAX_SECONDS)
+    started = time.strftime('%Y%m%d-%H%M%S')
+    extension = 'collapsed.txt' if mode == 'stacks' else 'pstats'
+    path = os.path.join(PROFILE_DIR, f"profile-{os.getpid()}-{started}.{extension}")
+    _active = f"{mode} for {seconds:g} s since {time.strftime('%H:%M:%S')}"
+    _finish = asyncio.Event()
+    try:
+        run = sample_stacks if mode == 'stacks' else profile_loop
+        summary = await run(seconds, path, top)
+    finally:
+        _active = _finish = None
+    return Profile(path, [f"{mode}, {seconds:g} s, pid {os.getpid()}"] + summary)
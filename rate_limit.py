@@ -0,0 +1,113 @@
+"""
+Ограничение частоты запросов одного пользователя (token bucket).
+
+У каждого пользователя два бюджета: дешёвые запросы (текст, меню, /start, /help) и дорогие
+(/fit). Бюджет пополняется на BOT_RATE_<ВИД> запросов в секунду и копит не больше
+BOT_RATE_<ВИД>_BURST; скорость 0 отключает ограничение этого вида. Запрос сверх бюджета
+не обрабатывается, а ответ "слишком много запросов" пользователь получает не чаще раза
+в BOT_RATE_NOTICE_WINDOW секунд, поэтому флуд не превращается в такой же поток ответов.
+
+Состояние - ограниченный словарь (BOT_RATE_USERS записей) с вытеснением давно не
+писавших пользователей: их бюджет к этому времени всё равно полон.
+"""
+
+import functools
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+import metrics
+
+# Вид -> (запросов в секунду, запас); вид со скоростью 0 не ограничивается
+RATE_LIMITS = {
+    kind: (float(os.getenv(f'BOT_RATE_{kind.upper()}', rate)),
+           float(os.getenv(f'BOT_RATE_{kind.upper()}_BURST', burst)))
+    for kind, rate, burst in (('cheap', '2', '20'), ('expensive', '0.2', '5'))
+}
+RATE_USERS = int(os.getenv('BOT_RATE_USERS', '100000'))
+RATE_NOTICE_WINDOW = float(os.getenv('BOT_RATE_NOTICE_WINDOW', '60'))
+
+THROTTLED_TEXT = {
+    'ru': "🐢 Слишком много запросов. Подождите немного и повторите.",
+    'en': "🐢 Too many requests. Please wait a little and try again.",
+}
+
+
+class RateLimiter:
+    """Token bucket на пользователя и вид запроса с LRU вытеснением"""
+
+    def __init__(self, limits=RATE_LIMITS, max_entries=RATE_USERS, notice_window=RATE_NOTICE_WINDOW):
+        self.limits = {kind: limit for kind, limit in limits.items() if limit[0] > 0}
+        self.max_entries = max_entries
+        self.notice_window = notice_window
+        # (пользователь, вид) -> [токены, время пополнения, время последнего предупреждения]
+        self.buckets = OrderedDict()
+        self.allowed = 0
+        self.throttled = 0
+
+    def check(self, user_id, kind, now=None):
+        """(разрешён ли запрос, нужно ли предупредить пользователя)"""
+        limit = self.limits.get(kind)
+        if limit is None:
+            return True, False
+        rate, burst = limit
+        now = time.monotonic() if now is None else now
+        key = (user_id, kind)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [burst, now, float('-inf')]
+            if len(self.buckets) > self.max_entries:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return True, False
+        self.throttled += 1
+        if now - bucket[2] >= self.notice_window:
+            bucket[2] = now
+            return False, True
+        return False, False
+
+
+def rate_limited(kind):
+    """Декоратор обработчика: запрос сверх бюджета пользователя не обрабатывается"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            limiter = context.bot_data.get('rate_limiter')
+            user = update.effective_user
+            if limiter is None or user is None:
+                return await func(update, context)
+            allowed, notify = limiter.check(user.id, kind)
+            if allowed:
+                return await func(update, context)
+            metrics.count_throttled(kind)
+            text = None
+            if notify:
+                logging.info(f"🐢 Throttling {kind} requests from {user.id}")
+                session = await context.bot_data['sessions'].get(user.id)
+                text = THROTTLED_TEXT.get(session['language'], THROTTLED_TEXT['en'])
+            if update.callback_query is not None:
+                # Нажатие кнопки нужно подтвердить в любом случае, иначе клиент ждёт ответа
+                await update.callback_query.answer(text)
+            elif text is not None:
+                await update.effective_message.reply_text(text)
+        return wrapper
+    return decorator
+
+
+def register_rate_limit(application, limits=RATE_LIMITS):
+    """Подключает ограничение частоты (None или пустые limits - без ограничения)"""
+    limiter = RateLimiter(limits or {})
+    if not limiter.limits:
+        return False
+    application.bot_data['rate_limiter'] = limiter
+    return True
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Воспроизведение записанного трафика (BOT_CAPTURE_DIR) через обработчики бота без сети.
+
+Примеры:
+    python replay_traffic.py captures/*.jsonl.gz
+    python replay_traffic.py captures/*.jsonl.gz --speed 10 --save run.json
+    python replay_traffic.py captures/*.jsonl.gz --compare run.json
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import sys
+import time
+
+from telegram import Update
+
+import resistor_code_bot
+from stub_request import StubRequest
+from traffic_capture import read_capture
+
+# Токен не используется: все вызовы Bot API обслуживает заглушка
+REPLAY_TOKEN = '123456789:replay'
+
+
+def percentile(sorted_values, q):
+    """Квантиль по отсортированному списку"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+def classify(update):
+    """Тип запроса для отчёта"""
+    if update.callback_query is not None:
+        return 'menu'
+    message = update.message
+    if message is None or message.text is None:
+        return 'other'
+    if message.text.startswith('/'):
+        return 'command'
+    return resistor_code_bot.detect_request_type(message.text.strip())
+
+
+async def replay(records, speed):
+    """Прогоняет записи через обработчики и возвращает список (тип, задержка)"""
+    request = StubRequest()
+    # Запись уже прошла отбрасывание повторов; повторно её не записываем. Ускоренное
+    # воспроизведение не должно упираться в ограничение частоты пользователей
+    application = resistor_code_bot.build_application(
+        REPLAY_TOKEN, request=request, capture_dir=None, dedup_window=0, rate_limits=None)
+    await application.initialize()
+
+    timings = []
+
+    async def process(update):
+        request_type = classify(update)
+        start = time.perf_counter()
+        await application.process_update(update)
+        timings.append((request_type, time.perf_counter() - start))
+
+    started = time.perf_counter()
+    if speed > 0:
+        # Сохраняем исходные интервалы между обновлениями (ускоренные в speed раз)
+        tasks = []
+        first_ts = None
+        for record in records:
+            first_ts = record['ts'] if first_ts is None else first_ts
+            delay = (record['ts'] - first_ts) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            update = Update.de_json(record['update'], application.bot)
+            tasks.append(asyncio.create_task(process(update)))
+        await asyncio.gather(*tasks)
+    else:
+        for record in records:
+            await process(Update.de_json(record['update'], application.bot))
+    elapsed = time.perf_counter() - started
+
+    await application.shutdown()
+    return timings, elapsed, dict(request.calls)
+
+
+def build_report(timings, elapsed, api_calls):
+    """Сводка: пропускная способность, распределение задержек и стоимость по типам"""
+    latencies = sorted(latency for _, latency in timings)
+    total_time = sum(latencies) or 1e-12
+    report = {
+        'messages': len(timings),
+        'elapsed_s': elapsed,
+        'msgs_per_sec': len(timings) / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p90': percentile(latencies, 0.90) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'max': (latencies[-1] if latencies else 0.0) * 1000,
+        },
+        'by_type': {},
+        'api_calls': api_calls,
+    }
+    for request_type in sorted({t for t, _ in timings}):
+        values = sorted(latency for t, latency in timings if t == request_type)
+        report['by_type'][request_type] = {
+            'count': len(values),
+            'mean_ms': sum(values) / len(values) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'share_of_time': sum(values) / total_time,
+        }
+    return report
+
+
+def print_report(report, baseline=None):
+    """Печать отчёта (и сравнения с базовым прогоном)"""
+    def delta(current, previous):
+        if not previous:
+            return ""
+        return f"  ({(current - previous) / previous * 100:+.1f}%)"
+
+    base_latency = baseline['latency_ms'] if baseline else {}
+    print("=" * 50)
+    print(f"📨 Messages: {report['messages']} in {report['elapsed_s']:.2f} s")
+    print(f"🚀 Throughput: {report['msgs_per_sec']:.1f} msgs/s"
+          f"{delta(report['msgs_per_sec'], baseline and baseline['msgs_per_sec'])}")
+    for name, value in report['latency_ms'].items():
+        print(f"⏱  {name}: {value:.3f} ms{delta(value, base_latency.get(name))}")
+    print("-" * 50)
+    print(f"{'type':<10}{'count':>8}{'mean ms':>10}{'p95 ms':>10}{'time %':>9}")
+    for request_type, stats in report['by_type'].items():
+        print(f"{request_type:<10}{stats['count']:>8}{stats['mean_ms']:>10.3f}"
+              f"{stats['p95_ms']:>10.3f}{stats['share_of_time'] * 100:>8.1f}%")
+    print("-" * 50)
+    print("API calls: " + ", ".join(f"{k}={v}" for k, v in sorted(report['api_calls'].items())))
+    print("=" * 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured Telegram updates offline")
+    parser.add_argument('paths', nargs='+', help="capture files (.jsonl.gz / .jsonl), globs allowed")
+    parser.add_argument('--speed', type=float, default=0,
+                        help="replay with original timing sped up N times (0 = as fast as possible)")
+    parser.add_argument('--limit', type=int, default=0, help="replay at most N updates")
+    parser.add_argument('--save', help="write the JSON report to this file")
+    parser.add_argument('--compare', help="compare with a previously saved JSON report")
+    args = parser.parse_args()
+
+    paths = sorted(p for pattern in args.paths for p in glob.glob(pattern))
+    if not paths:
+        print("❌ No capture files found")
+        return 1
+
+    records = list(read_capture(paths))
+    if args.limit:
+        records = records[:args.limit]
+
+    timings, elapsed, api_calls = asyncio.run(replay(records, args.speed))
+    report = build_report(timings, elapsed, api_calls)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,66 +1,109 @@
+import asyncio
 import logging
 import re
 import os
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+import signal
+from urllib.parse import urlparse
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardRemove
+from telegram.error import BadRequest
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters, ContextTypes
 from dotenv import load_dotenv
 
+import data_tables
+import metrics
+import profiler
+from admission import expensive, monitor as lag_monitor
+from router import Router
+from color_matcher import is_color_sequence, match_colors
+from tolerance_index import check_bands, fitting_values, split_measurement
+from admin_commands import register_admin_handlers
+from traffic_capture import CAPTURE_DIR, register_capture
+from update_dedup import DEDUP_FILE, DEDUP_WINDOW, register_dedup
+from rate_limit import RATE_LIMITS, rate_limited, register_rate_limit
+from session_store import SESSION_NAMESPACE, create_session_store
+from bot_request import create_request, log_settings
+from bot_logging import current as current_update_record, register_update_log, setup_logging
+from state_snapshot import SHUTDOWN_TIMEOUT, STATE_FILE, restore_state, save_state
+
 # Загрузка переменных окружения
 load_dotenv()
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=os.getenv('BOT_LOG_LEVEL', 'INFO')
-)
+# Настройка логирования: запись в фоновом потоке, обработчики только ставят записи в очередь
+setup_logging()
 
-# Проверка обязательных переменных
+# Токен проверяется в main(): модуль импортируется и без него (HTTP API, бенчмарки)
 BOT_TOKEN = os.getenv('BOT_TOKEN')
-if not BOT_TOKEN:
-    logging.error("❌ BOT_TOKEN not found in environment variables!")
-    exit(1)
+# Несколько ботов в одном процессе (вместо BOT_TOKEN): "имя=токен,имя=токен".
+# У каждого бота свои сессии, таблицы, кэши и пул соединений Bot API - общие
+BOT_TOKENS = os.getenv('BOT_TOKENS')
+
+# Адрес Bot API (например, локальный fake_bot_api.py для нагрузочных тестов)
+BOT_API_BASE_URL = os.getenv('BOT_API_BASE_URL')
+
+# Режим вебхука: если задан BOT_WEBHOOK_URL, вместо getUpdates используется вебхук
+BOT_WEBHOOK_URL = os.getenv('BOT_WEBHOOK_URL')
+BOT_WEBHOOK_LISTEN = os.getenv('BOT_WEBHOOK_LISTEN', '0.0.0.0')
+BOT_WEBHOOK_PORT = int(os.getenv('BOT_WEBHOOK_PORT', '8443'))
+BOT_WEBHOOK_SECRET = os.getenv('BOT_WEBHOOK_SECRET')
+
+# Число процессов-обработчиков (0 - всё в одном процессе)
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '0'))
+
+# Сколько после срока остановки ждать обработчик, выполнявшийся в этот момент, секунд
+SHUTDOWN_GRACE = 2
 
 # Импортируем данные и функции из наших модулей
 try:
-    from resistor_data import COLOR_CODES, MULTIPLIERS, TOLERANCE, EN_TO_RU_COLORS, INPUT_NORMALIZATION, RU_TO_EN_COLORS
-    from smd_decoder import smd_to_resistance, resistance_to_smd, validate_smd_code
+    from smd_decoder import smd_to_resistance, resistance_to_smd, validate_smd_code, format_resistance, PLAIN_NUMBER
 except ImportError as e:
     logging.error(f"❌ Error importing modules: {e}")
     # Создаем заглушки для тестирования
-    COLOR_CODES, MULTIPLIERS, TOLERANCE, EN_TO_RU_COLORS, INPUT_NORMALIZATION, RU_TO_EN_COLORS = {}, {}, {}, {}, {}, {}
     def smd_to_resistance(code):
         return None
     def resistance_to_smd(value):
         return "SMD module not available"
     def validate_smd_code(code):
         return False
+    def format_resistance(value):
+        return f"{value} Ohm"
+    PLAIN_NUMBER = "plain number"
 
-# Контекст пользователя для хранения текущего режима и языка
-user_context = {}
+# Маршруты меню и режимов. Действия меню доступны по короткой callback_data inline-кнопки
+# и по тексту кнопки постоянной клавиатуры прежних версий (она остаётся у пользователей
+# до её удаления клиентом)
+router = Router()
 
-# Создаем постоянную клавиатуру
+# Inline-клавиатура меню под сообщением
 def get_main_keyboard(language='ru'):
     """Возвращает основную клавиатуру"""
     if language == 'en':
         keyboard = [
-            [KeyboardButton("🎨 Cylindrical"), KeyboardButton("🔤 SMD Resistors")],
-            [KeyboardButton("🌐 Language"), KeyboardButton("ℹ️ Help"), KeyboardButton("🏠 Main Menu")]
+            [InlineKeyboardButton("🎨 Cylindrical", callback_data='t'),
+             InlineKeyboardButton("🔤 SMD Resistors", callback_data='s')],
+            [InlineKeyboardButton("🌐 Language", callback_data='l'),
+             InlineKeyboardButton("ℹ️ Help", callback_data='h'),
+             InlineKeyboardButton("🏠 Main Menu", callback_data='m')]
         ]
     else:
         keyboard = [
-            [KeyboardButton("🎨 Цилиндрические"), KeyboardButton("🔤 SMD резисторы")],
-            [KeyboardButton("🌐 Язык"), KeyboardButton("ℹ️ Помощь"), KeyboardButton("🏠 Главное меню")]
+            [InlineKeyboardButton("🎨 Цилиндрические", callback_data='t'),
+             InlineKeyboardButton("🔤 SMD резисторы", callback_data='s')],
+            [InlineKeyboardButton("🌐 Язык", callback_data='l'),
+             InlineKeyboardButton("ℹ️ Помощь", callback_data='h'),
+             InlineKeyboardButton("🏠 Главное меню", callback_data='m')]
         ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    return InlineKeyboardMarkup(keyboard)
 
 def get_language_keyboard():
     """Клавиатура выбора языка"""
     keyboard = [
-        [KeyboardButton("🇷🇺 Русский"), KeyboardButton("🇺🇸 English")],
-        [KeyboardButton("🔙 Back")]
+        [InlineKeyboardButton("🇷🇺 Русский", callback_data='ru'),
+         InlineKeyboardButton("🇺🇸 English", callback_data='en')],
+        [InlineKeyboardButton("🔙 Back", callback_data='b')]
     ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    return InlineKeyboardMarkup(keyboard)
 
+@metrics.timed()
 def normalize_color_input(color):
     """Нормализует ввод цвета, приводя к стандартному виду"""
     # Приводим к нижнему регистру и убираем пробелы
@@ -70,40 +113,36 @@ def normalize_color_input(color):
     color_lower = color_lower.replace('ё', 'е')
     
     # Приводим к стандартному варианту написания
-    normalized = INPUT_NORMALIZATION.get(color_lower, color_lower)
+    normalized = data_tables.current().input_normalization.get(color_lower, color_lower)
     
     # Также заменяем 'ё' на 'е' в нормализованном результате
     normalized = normalized.replace('ё', 'е')
     
     return normalized
 
+@metrics.timed()
 def convert_colors_to_target_language(colors, target_language='ru'):
     """Преобразует названия цветов на указанный язык"""
+    tables = data_tables.current()
     converted_colors = []
     for color in colors:
         color_lower = color.lower()
-        if target_language == 'en' and color_lower in RU_TO_EN_COLORS:
-            converted_colors.append(RU_TO_EN_COLORS[color_lower])
-        elif target_language == 'ru' and color_lower in EN_TO_RU_COLORS:
-            converted_colors.append(EN_TO_RU_COLORS[color_lower])
+        if target_language == 'en' and color_lower in tables.ru_to_en_colors:
+            converted_colors.append(tables.ru_to_en_colors[color_lower])
+        elif target_language == 'ru' and color_lower in tables.en_to_ru_colors:
+            converted_colors.append(tables.en_to_ru_colors[color_lower])
         else:
             # Если цвет уже на нужном языке, оставляем как есть
             converted_colors.append(color)
     return converted_colors
 
-def get_user_language(user_id):
-    """Получает язык пользователя"""
-    return user_context.get(user_id, {}).get('language', 'ru')
-
+@rate_limited('cheap')
+@metrics.timed('handler')
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     user_id = update.effective_user.id
-    if user_id not in user_context:
-        user_context[user_id] = {'mode': 'main', 'language': 'ru'}
-    else:
-        user_context[user_id]['mode'] = 'main'
-    
-    language = get_user_language(user_id)
+    session = await context.bot_data['sessions'].update(user_id, mode='main')
+    language = session['language']
     
     if language == 'en':
         welcome_text = """
@@ -124,9 +163,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Band colors (4 or 5 colors) - e.g.: `yellow violet red gold`
 • Resistor value (1k, 470 Ohm, 2.2M)
 • SMD code (103, 4R7, 01C)
-
-*Use buttons below for navigation:*
         """
+        menu_text = "*Use buttons below for navigation:*"
     else:
         welcome_text = """
 🤖 *Resistor Code Bot* - универсальный помощник по резисторам
@@ -146,23 +184,24 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Цвета полос (4 или 5 цветов) - например: `жёлтый фиолетовый красный золотой`
 • Номинал резистора (1к, 470 Ом, 2.2М)
 • SMD код (103, 4R7, 01C)
-
-*Используйте кнопки ниже для навигации:*
         """
+        menu_text = "*Используйте кнопки ниже для навигации:*"
     
+    # Приветствие убирает постоянную клавиатуру прежних версий; у сообщения одна
+    # клавиатура, поэтому inline-меню приходит следующим сообщением
     await update.message.reply_text(
         welcome_text, 
         parse_mode='Markdown', 
+        reply_markup=ReplyKeyboardRemove()
+    )
+    await update.message.reply_text(
+        menu_text,
+        parse_mode='Markdown',
         reply_markup=get_main_keyboard(language)
     )
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик команды /help"""
-    user_id = update.effective_user.id
-    user_context[user_id]['mode'] = 'main'
-    
-    language = get_user_language(user_id)
-    
+def get_help_text(language='ru'):
+    """Текст справки"""
     if language == 'en':
         help_text = """
 📖 *Usage Help*
@@ -170,6 +209,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 *Basic commands:*
 `/start` - start working
 `/help` - show this help
+`/fit 4.62k [colors]` - standard values for a measured value
 
 *Request examples:*
 
@@ -194,6 +234,7 @@ Value → SMD code: `10k`, `4.7 Ohm`
 *Основные команды:*
 `/start` - начать работу
 `/help` - показать эту справку
+`/fit 4.62к [цвета]` - стандартные номиналы для измеренного значения
 
 *Примеры запросов:*
 
@@ -211,19 +252,70 @@ SMD код → Номинал: `103`, `4R7`
 • Поддерживаются русские и английские названия цветов
 • Для номиналов показываются обе маркировки: 4-полосная и 5-полосная
         """
-    await update.message.reply_text(help_text, parse_mode='Markdown', 
-                                  reply_markup=get_main_keyboard(language))
+    return help_text
 
-async def handle_menu_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик нажатий кнопок меню"""
+@rate_limited('cheap')
+@metrics.timed('handler')
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /help"""
     user_id = update.effective_user.id
-    text = update.message.text
-    language = get_user_language(user_id)
+    session = await context.bot_data['sessions'].update(user_id, mode='main')
+    language = session['language']
+    await update.message.reply_text(get_help_text(language), parse_mode='Markdown', 
+                                  reply_markup=get_main_keyboard(language))
+
+def format_fit(text, language='ru'):
+    """Ответ /fit: подходящие стандартные номиналы или проверка по маркировке цветами"""
+    measured, bands = split_measurement(text)
+    if not measured:
+        if language == 'en':
+            return ("Usage: `/fit <measured value> [band colors]`\n"
+                    "Examples: `/fit 4.62k`, `/fit 4.62k yellow violet red gold`")
+        return ("Использование: `/fit <измеренное значение> [цвета полос]`\n"
+                "Примеры: `/fit 4.62к`, `/fit 4.62к жёлтый фиолетовый красный золотой`")
     
-    if text in ["🎨 Цилиндрические", "🎨 Cylindrical"]:
-        user_context[user_id]['mode'] = 'throughhole'
+    value_text = format_resistance(measured)
+    # Цвета полос после значения - проверка по маркировке
+    if bands:
+        check = check_bands(measured, bands)
+        if check is None:
+            if language == 'en':
+                return f"❌ Could not recognize band colors: `{bands}`"
+            return f"❌ Не удалось распознать цвета полос: `{bands}`"
+        marking = f"{format_resistance(check.nominal)} ±{check.tolerance:.2%}".replace('.00%', '%')
         if language == 'en':
-            help_text = """
+            verdict = "✅ Within tolerance" if check.ok else "❌ Out of tolerance"
+            return (f"📏 *Measured:* {value_text}\n🎨 *Marking:* {marking}\n"
+                    f"{verdict} (deviation {check.deviation:+.2%})")
+        verdict = "✅ В пределах допуска" if check.ok else "❌ Вне допуска"
+        return (f"📏 *Измерено:* {value_text}\n🎨 *Маркировка:* {marking}\n"
+                f"{verdict} (отклонение {check.deviation:+.2%})")
+    
+    fits = fitting_values(measured)
+    lines = [f"• {fit.series} ±{fit.tolerance:.0%}: {format_resistance(fit.nominal)} ({fit.deviation:+.2%})"
+             for fit in fits]
+    if language == 'en':
+        header = f"📏 *Measured:* {value_text}\n*Standard values that fit:*"
+        return "\n".join([header] + lines) if lines else f"{header}\n❌ None"
+    header = f"📏 *Измерено:* {value_text}\n*Подходящие стандартные номиналы:*"
+    return "\n".join([header] + lines) if lines else f"{header}\n❌ Нет"
+
+@rate_limited('expensive')
+@metrics.timed('handler')
+@expensive('fit')
+async def fit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /fit: какие стандартные номиналы могут измеряться как данное значение"""
+    session = await context.bot_data['sessions'].get(update.effective_user.id)
+    await update.message.reply_text(format_fit(' '.join(context.args), session['language']),
+                                    parse_mode='Markdown')
+
+@router.action('throughhole', callbacks=('t',), buttons=("🎨 Цилиндрические", "🎨 Cylindrical"))
+async def throughhole_screen(sessions, user_id, session):
+    """Экран режима цилиндрических резисторов"""
+    language = session['language']
+    await sessions.update(user_id, session, mode='throughhole')
+    if language == 'en':
+        help_text = """
 🎨 *Mode: Cylindrical Resistors*
 
 Now send:
@@ -242,9 +334,9 @@ Now send:
 *Bot will show both markings:*
 • 4-band (2 digits, multiplier, tolerance)
 • 5-band (3 digits, multiplier, tolerance)
-            """
-        else:
-            help_text = """
+        """
+    else:
+        help_text = """
 🎨 *Режим: Цилиндрические резисторы*
 
 Теперь отправьте:
@@ -263,14 +355,16 @@ Now send:
 *Бот покажет обе маркировки:*
 • 4-полосная (2 цифры, множитель, допуск)
 • 5-полосная (3 цифры, множитель, допуск)
-            """
-        await update.message.reply_text(help_text, parse_mode='Markdown', 
-                                      reply_markup=get_main_keyboard(language))
-        
-    elif text in ["🔤 SMD резисторы", "🔤 SMD Resistors"]:
-        user_context[user_id]['mode'] = 'smd'
-        if language == 'en':
-            help_text = """
+        """
+    return help_text, get_main_keyboard(language)
+
+@router.action('smd', callbacks=('s',), buttons=("🔤 SMD резисторы", "🔤 SMD Resistors"))
+async def smd_screen(sessions, user_id, session):
+    """Экран режима SMD резисторов"""
+    language = session['language']
+    await sessions.update(user_id, session, mode='smd')
+    if language == 'en':
+        help_text = """
 🔤 *Mode: SMD Resistors*
 
 Now send:
@@ -282,17 +376,20 @@ Now send:
 `4R7` = 4.7 Ohm  
 `01C` = 10 kOhm (E96)
 `R047` = 0.047 Ohm
+`1002` = 10 kOhm
 
 *Value examples:*
 `10k`, `4.7 Ohm`, `100k`, `0.47`
 
 *Supported formats:*
 • 3-digit code (E24 series)
-• 4-digit code (E96 series)  
+• 4-digit code (1% tolerance)
+• EIA-96 code: 2 digits and a letter (E96 series)
 • R-codes (less than 100 Ohm)
-            """
-        else:
-            help_text = """
+• Underlined E24 code: `_472`
+        """
+    else:
+        help_text = """
 🔤 *Режим: SMD резисторы*
 
 Теперь отправьте:
@@ -304,25 +401,34 @@ Now send:
 `4R7` = 4.7 Ом  
 `01C` = 10 кОм (E96)
 `R047` = 0.047 Ом
+`1002` = 10 кОм
 
 *Примеры номиналов:*
 `10к`, `4.7 Ом`, `100к`, `0.47`
 
 *Поддерживаемые форматы:*
 • 3-значный код (E24 серия)
-• 4-значный код (E96 серия)  
+• 4-значный код (допуск 1%)
+• Код EIA-96: 2 цифры и буква (E96 серия)
 • Коды с R (меньше 100 Ом)
-            """
-        await update.message.reply_text(help_text, parse_mode='Markdown', 
-                                      reply_markup=get_main_keyboard(language))
-        
-    elif text in ["ℹ️ Помощь", "ℹ️ Help"]:
-        await help_command(update, context)
-        
-    elif text in ["🏠 Главное меню", "🏠 Main Menu"]:
-        user_context[user_id]['mode'] = 'main'
-        if language == 'en':
-            welcome_text = """
+• Подчёркнутый код E24: `_472`
+        """
+    return help_text, get_main_keyboard(language)
+
+@router.action('help', callbacks=('h',), buttons=("ℹ️ Помощь", "ℹ️ Help"))
+async def help_screen(sessions, user_id, session):
+    """Экран справки"""
+    language = session['language']
+    await sessions.update(user_id, session, mode='main')
+    return get_help_text(language), get_main_keyboard(language)
+
+@router.action('main', callbacks=('m', 'b'), buttons=("🏠 Главное меню", "🏠 Main Menu", "🔙 Back"))
+async def main_menu_screen(sessions, user_id, session):
+    """Экран главного меню"""
+    language = session['language']
+    await sessions.update(user_id, session, mode='main')
+    if language == 'en':
+        welcome_text = """
 🏠 *Main Menu*
 
 Select operation mode or just send a request:
@@ -335,9 +441,9 @@ Select operation mode or just send a request:
 Bot automatically detects your request type!
 
 *Both Russian and English color names are supported*
-            """
-        else:
-            welcome_text = """
+        """
+    else:
+        welcome_text = """
 🏠 *Главное меню*
 
 Выберите режим работы или просто отправьте запрос:
@@ -350,56 +456,91 @@ Bot automatically detects your request type!
 Бот автоматически определит тип вашего запроса!
 
 *Поддерживаются русские и английские названия цветов*
-            """
-        await update.message.reply_text(welcome_text, parse_mode='Markdown', 
-                                      reply_markup=get_main_keyboard(language))
-    
-    elif text in ["🌐 Язык", "🌐 Language"]:
-        user_context[user_id]['mode'] = 'language'
-        if language == 'en':
-            text = "🌐 *Select Language*"
-        else:
-            text = "🌐 *Выберите язык*"
-        await update.message.reply_text(text, parse_mode='Markdown', 
-                                      reply_markup=get_language_keyboard())
-    
-    elif text == "🇷🇺 Русский":
-        user_context[user_id]['language'] = 'ru'
-        user_context[user_id]['mode'] = 'main'
-        await update.message.reply_text("✅ Язык изменен на Русский", 
-                                      reply_markup=get_main_keyboard('ru'))
-    
-    elif text == "🇺🇸 English":
-        user_context[user_id]['language'] = 'en'
-        user_context[user_id]['mode'] = 'main'
-        await update.message.reply_text("✅ Language changed to English", 
-                                      reply_markup=get_main_keyboard('en'))
-    
-    elif text == "🔙 Back":
-        user_context[user_id]['mode'] = 'main'
-        await update.message.reply_text("🏠", 
-                                      reply_markup=get_main_keyboard(language))
+        """
+    return welcome_text, get_main_keyboard(language)
 
+@router.action('language', callbacks=('l',), buttons=("🌐 Язык", "🌐 Language"))
+async def language_screen(sessions, user_id, session):
+    """Экран выбора языка"""
+    language = session['language']
+    await sessions.update(user_id, session, mode='language')
+    if language == 'en':
+        text = "🌐 *Select Language*"
+    else:
+        text = "🌐 *Выберите язык*"
+    return text, get_language_keyboard()
+
+@router.action('ru', callbacks=('ru',), buttons=("🇷🇺 Русский",))
+async def select_russian(sessions, user_id, session):
+    """Переключение на русский язык"""
+    await sessions.update(user_id, session, language='ru', mode='main')
+    return "✅ Язык изменен на Русский", get_main_keyboard('ru')
+
+@router.action('en', callbacks=('en',), buttons=("🇺🇸 English",))
+async def select_english(sessions, user_id, session):
+    """Переключение на английский язык"""
+    await sessions.update(user_id, session, language='en', mode='main')
+    return "✅ Language changed to English", get_main_keyboard('en')
+
+
+@metrics.timed('handler')
+async def handle_menu_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE, session=None):
+    """Обработчик текстовых кнопок постоянной клавиатуры прежних версий"""
+    user_id = update.effective_user.id
+    sessions = context.bot_data['sessions']
+    if session is None:
+        session = await sessions.get(user_id)
+    route = router.button_route(update.message.text.strip())
+    text, keyboard = await route(sessions, user_id, session)
+    await update.message.reply_text(text, parse_mode='Markdown', reply_markup=keyboard)
+
+@rate_limited('cheap')
+@metrics.timed('handler')
+async def handle_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик inline-кнопок меню: новый экран заменяет текст того же сообщения"""
+    query = update.callback_query
+    route = router.callback_route(query.data)
+    metrics.count_request('menu')
+    if route is None:
+        await query.answer()
+        return
+    
+    user_id = query.from_user.id
+    sessions = context.bot_data['sessions']
+    text, keyboard = await route(sessions, user_id, await sessions.get(user_id))
+    await query.answer()
+    try:
+        await query.edit_message_text(text, parse_mode='Markdown', reply_markup=keyboard)
+    except BadRequest as e:
+        # Повторное нажатие кнопки текущего экрана - менять нечего
+        if 'not modified' in str(e):
+            return
+        # Старое сообщение изменить уже нельзя - отправляем экран новым сообщением
+        await context.bot.send_message(query.from_user.id, text, parse_mode='Markdown', reply_markup=keyboard)
+
+@metrics.timed()
 def colors_to_resistance(colors):
     """Преобразование цветов в номинал резистора"""
     try:
         # Нормализуем ввод цветов
         normalized_colors = [normalize_color_input(color) for color in colors]
+        tables = data_tables.current()
+        color_codes, multipliers = tables.color_codes, tables.multipliers
         
         if len(normalized_colors) == 4:  # 4-полосная маркировка
-            digit1 = COLOR_CODES[normalized_colors[0]]
-            digit2 = COLOR_CODES[normalized_colors[1]]
-            multiplier = MULTIPLIERS[normalized_colors[2]]
-            tolerance = TOLERANCE.get(normalized_colors[3], '±20%')
+            digit1 = color_codes[normalized_colors[0]]
+            digit2 = color_codes[normalized_colors[1]]
+            multiplier = multipliers[normalized_colors[2]]
+            tolerance = tables.tolerance.get(normalized_colors[3], '±20%')
             
             resistance = (digit1 * 10 + digit2) * multiplier
             
         elif len(normalized_colors) == 5:  # 5-полосная маркировка
-            digit1 = COLOR_CODES[normalized_colors[0]]
-            digit2 = COLOR_CODES[normalized_colors[1]]
-            digit3 = COLOR_CODES[normalized_colors[2]]
-            multiplier = MULTIPLIERS[normalized_colors[3]]
-            tolerance = TOLERANCE.get(normalized_colors[4], '±20%')
+            digit1 = color_codes[normalized_colors[0]]
+            digit2 = color_codes[normalized_colors[1]]
+            digit3 = color_codes[normalized_colors[2]]
+            multiplier = multipliers[normalized_colors[3]]
+            tolerance = tables.tolerance.get(normalized_colors[4], '±20%')
             
             resistance = (digit1 * 100 + digit2 * 10 + digit3) * multiplier
             
@@ -419,6 +560,15 @@ def colors_to_resistance(colors):
     except Exception as e:
         return None, f"Error: {str(e)}. Check color input correctness."
 
+@data_tables.derived('reverse_colors')
+def build_reverse_colors(tables):
+    """Обратные словари: цифра -> цвет и множитель -> цвет"""
+    reverse_color_map = {v: k for k, v in tables.color_codes.items() if v >= 0}
+    reverse_multiplier_map = {v: k for k, v in tables.multipliers.items()}
+    return reverse_color_map, reverse_multiplier_map
+
+@metrics.timed()
+@metrics.cached()
 def resistance_to_colors(resistance_str):
     """Преобразование номинала в цветовую маркировку для 4 и 5 полос"""
     try:
@@ -438,9 +588,8 @@ def resistance_to_colors(resistance_str):
         
         resistance = value
         
-        # Создаем обратные словари для преобразования
-        reverse_color_map = {v: k for k, v in COLOR_CODES.items() if v >= 0}
-        reverse_multiplier_map = {v: k for k, v in MULTIPLIERS.items()}
+        # Обратные словари строятся один раз для снимка таблиц
+        reverse_color_map, reverse_multiplier_map = data_tables.current().index('reverse_colors')
         
         # Маркировка для 4 полос
         colors_4 = calculate_4_band_colors(resistance, reverse_color_map, reverse_multiplier_map)
@@ -453,6 +602,7 @@ def resistance_to_colors(resistance_str):
     except Exception as e:
         return None, None, f"Error: {str(e)}"
 
+@metrics.timed()
 def calculate_4_band_colors(resistance, reverse_color_map, reverse_multiplier_map):
     """Вычисляет цвета для 4-полосной маркировки"""
     try:
@@ -494,6 +644,7 @@ def calculate_4_band_colors(resistance, reverse_color_map, reverse_multiplier_ma
     except Exception:
         return None
 
+@metrics.timed()
 def calculate_5_band_colors(resistance, reverse_color_map, reverse_multiplier_map):
     """Вычисляет цвета для 5-полосной маркировки"""
     try:
@@ -537,220 +688,486 @@ def calculate_5_band_colors(resistance, reverse_color_map, reverse_multiplier_ma
     except Exception:
         return None
 
-async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик текстовых сообщений"""
-    user_id = update.effective_user.id
-    text = update.message.text.strip()
-    language = get_user_language(user_id)
-    
-    # Если пользователь еще не инициализирован
-    if user_id not in user_context:
-        user_context[user_id] = {'mode': 'main', 'language': 'ru'}
-    
-    # Сначала проверяем, не является ли сообщение нажатием кнопки меню
-    menu_buttons = ["🎨 Цилиндрические", "🔤 SMD резисторы", "ℹ️ Помощь", "🏠 Главное меню",
-                   "🎨 Cylindrical", "🔤 SMD Resistors", "ℹ️ Help", "🏠 Main Menu",
-                   "🌐 Язык", "🌐 Language", "🇷🇺 Русский", "🇺🇸 English", "🔙 Back"]
-    
-    if text in menu_buttons:
-        await handle_menu_buttons(update, context)
-        return
+def detect_request_type(text):
+    """Определяет тип текстового запроса: menu, colors, smd или value"""
+    if router.is_menu(text):
+        return 'menu'
     
-    # Получаем текущий контекст пользователя
-    current_mode = user_context[user_id].get('mode', 'main')
+    # Цвета распознаются с опечатками и сокращениями ("voilet", "orng", "кор", "lt blue")
+    if is_color_sequence(match_colors(text)):
+        return 'colors'
     
-    # Определяем тип запроса на основе контекста и содержимого
-    words = text.split()
+    if validate_smd_code(text):
+        return 'smd'
     
-    # Нормализуем слова для проверки цветов
-    normalized_words = [normalize_color_input(word) for word in words]
+    return 'value'
+
+def format_color_coding(colors_4, colors_5, language):
+    """Ответ с 4- и 5-полосной цветовой маркировкой"""
+    if language == 'en':
+        response = "🎨 *Color coding:*\n\n"
+    else:
+        response = "🎨 *Цветовые маркировки:*\n\n"
     
-    # Если явно указаны цвета - обрабатываем как цвета независимо от контекста
-    if normalized_words and all(word.lower() in COLOR_CODES for word in normalized_words):
-        # Запрос с цветами - цилиндрический резистор
-        resistance, tolerance = colors_to_resistance(words)
-        if resistance:
-            if language == 'en':
-                response = f"🎯 *Resistor value:* {resistance}\n📊 *Tolerance:* {tolerance}"
-            else:
-                response = f"🎯 *Номинал резистора:* {resistance}\n📊 *Допуск:* {tolerance}"
+    if colors_4:
+        target_colors_4 = convert_colors_to_target_language(colors_4, language)
+        colors_str_4 = ' → '.join(target_colors_4)
+        if language == 'en':
+            response += f"*4-band:*\n`{colors_str_4}`\n\n"
         else:
-            response = tolerance
-            
-    # Если явно указан SMD код - обрабатываем как SMD независимо от контекста
-    elif validate_smd_code(text):
-        # SMD код
-        result = smd_to_resistance(text)
-        if result:
-            value, code_type = result
-            if language == 'en':
-                response = f"🔤 *SMD code:* `{text.upper()}`\n💎 *Value:* {value}\n📋 *Type:* {code_type}"
-            else:
-                response = f"🔤 *SMD код:* `{text.upper()}`\n💎 *Номинал:* {value}\n📋 *Тип:* {code_type}"
+            response += f"*4-полосная:*\n`{colors_str_4}`\n\n"
+    else:
+        if language == 'en':
+            response += "*4-band:* not available for this value\n\n"
         else:
-            if language == 'en':
-                response = f"❌ Could not decode SMD code: `{text}`"
-            else:
-                response = f"❌ Не удалось расшифровать SMD код: `{text}`"
+            response += "*4-полосная:* не доступна для данного номинала\n\n"
             
-    # Если контекст явно указан - используем его
-    elif current_mode == 'throughhole':
-        # В контексте цилиндрических резисторов - пробуем как номинал для цветовой маркировки
-        colors_4, colors_5, error = resistance_to_colors(text)
-        if error:
-            response = error
-        elif colors_4 or colors_5:
-            if language == 'en':
-                response = "🎨 *Color coding:*\n\n"
-            else:
-                response = "🎨 *Цветовые маркировки:*\n\n"
-            
-            if colors_4:
-                target_colors_4 = convert_colors_to_target_language(colors_4, language)
-                colors_str_4 = ' → '.join(target_colors_4)
-                if language == 'en':
-                    response += f"*4-band:*\n`{colors_str_4}`\n\n"
-                else:
-                    response += f"*4-полосная:*\n`{colors_str_4}`\n\n"
-            else:
-                if language == 'en':
-                    response += "*4-band:* not available for this value\n\n"
-                else:
-                    response += "*4-полосная:* не доступна для данного номинала\n\n"
-                    
-            if colors_5:
-                target_colors_5 = convert_colors_to_target_language(colors_5, language)
-                colors_str_5 = ' → '.join(target_colors_5)
-                if language == 'en':
-                    response += f"*5-band:*\n`{colors_str_5}`"
-                else:
-                    response += f"*5-полосная:*\n`{colors_str_5}`"
-            else:
-                if language == 'en':
-                    response += "*5-band:* not available for this value"
-                else:
-                    response += "*5-полосная:* не доступна для данного номинала"
+    if colors_5:
+        target_colors_5 = convert_colors_to_target_language(colors_5, language)
+        colors_str_5 = ' → '.join(target_colors_5)
+        if language == 'en':
+            response += f"*5-band:*\n`{colors_str_5}`"
         else:
+            response += f"*5-полосная:*\n`{colors_str_5}`"
+    else:
+        if language == 'en':
+            response += "*5-band:* not available for this value"
+        else:
+            response += "*5-полосная:* не доступна для данного номинала"
+    return response
+
+def format_smd_codes(smd_result, language):
+    """Ответ со списком SMD кодов; None, если код подобрать не удалось"""
+    if not smd_result or "Could not" in smd_result or "Error" in smd_result or "Не удалось" in smd_result or "Ошибка" in smd_result:
+        return None
+    if isinstance(smd_result, tuple) and len(smd_result) == 3:
+        value, codes, series = smd_result
+        codes_str = "\n".join([f"• `{code}` ({s})" for code, s in zip(codes, series)])
+        if language == 'en':
+            return f"💎 *Value:* {value}\n🔤 *SMD codes:*\n{codes_str}"
+        return f"💎 *Номинал:* {value}\n🔤 *SMD коды:*\n{codes_str}"
+    return f"💎 {smd_result}"
+
+def smd_reading_note(text, language):
+    """Прочтение номинала из 4 цифр как SMD маркировки ("1002" = 10 кОм); пустая строка, если его нет"""
+    readings = [reading for reading in smd_to_resistance(text) or () if reading[1] != PLAIN_NUMBER]
+    if not readings:
+        return ""
+    marking = ", ".join(f"{value} ({code_type})" for value, code_type in readings)
+    if language == 'en':
+        return f"\n\n⚠️ *As an SMD code* `{text.strip()}`: {marking}"
+    return f"\n\n⚠️ *Как SMD код* `{text.strip()}`: {marking}"
+
+# Обработчики запросов: (текст, язык) -> (ответ, клавиатура или None)
+
+@router.request('colors')
+def colors_reply(text, language):
+    """Цвета полос -> номинал (в любом режиме)"""
+    match = match_colors(text)
+    resistance, tolerance = colors_to_resistance(list(match.colors))
+    if not resistance:
+        return tolerance, None
+    
+    if language == 'en':
+        response = f"🎯 *Resistor value:* {resistance}\n📊 *Tolerance:* {tolerance}"
+    else:
+        response = f"🎯 *Номинал резистора:* {resistance}\n📊 *Допуск:* {tolerance}"
+    if match.corrections:
+        # Показываем, как были поняты слова с опечатками
+        recognized = ' '.join(convert_colors_to_target_language(match.colors, language))
+        if language == 'en':
+            response += f"\n🔎 *Recognized as:* `{recognized}` ({match.confidence:.0%})"
+        else:
+            response += f"\n🔎 *Распознано как:* `{recognized}` ({match.confidence:.0%})"
+    return response, None
+
+@router.request('smd')
+def smd_code_reply(text, language):
+    """SMD код -> номинал (в любом режиме)"""
+    result = smd_to_resistance(text)
+    if result:
+        (value, code_type), others = result[0], result[1:]
+        if language == 'en':
+            response = f"🔤 *SMD code:* `{text.upper()}`\n💎 *Value:* {value}\n📋 *Type:* {code_type}"
+        else:
+            response = f"🔤 *SMD код:* `{text.upper()}`\n💎 *Номинал:* {value}\n📋 *Тип:* {code_type}"
+        if others:
+            # Один код читается по-разному в разных схемах маркировки (47R, 4 цифры)
+            readings = ", ".join(f"{other_value} ({other_type})" for other_value, other_type in others)
             if language == 'en':
-                response = ("❌ Could not recognize value for color coding.\n\n"
-                          "Examples:\n"
-                          "• `1k` → 1000 Ohm\n"
-                          "• `470 Ohm` → 470 Ohm\n"
-                          "• `2.2M` → 2.2 MOhm")
+                response += f"\n⚠️ *Can also be read as:* {readings}"
             else:
-                response = ("❌ Не удалось распознать номинал для цветовой маркировки.\n\n"
-                          "Примеры:\n"
-                          "• `1к` → 1000 Ом\n"
-                          "• `470 Ом` → 470 Ом\n"
-                          "• `2.2М` → 2.2 МОм")
-            
-    elif current_mode == 'smd':
-        # В контексте SMD резисторов - пробуем как номинал для SMD кода
-        smd_result = resistance_to_smd(text)
-        if smd_result and "Could not" not in smd_result and "Error" not in smd_result and "Не удалось" not in smd_result and "Ошибка" not in smd_result:
-            if isinstance(smd_result, tuple) and len(smd_result) == 3:
-                value, codes, series = smd_result
-                codes_str = "\n".join([f"• `{code}` ({s})" for code, s in zip(codes, series)])
-                if language == 'en':
-                    response = f"💎 *Value:* {value}\n🔤 *SMD codes:*\n{codes_str}"
-                else:
-                    response = f"💎 *Номинал:* {value}\n🔤 *SMD коды:*\n{codes_str}"
-            else:
-                response = f"💎 {smd_result}"
-        else:
+                response += f"\n⚠️ *Также читается как:* {readings}"
+        if any(other_type == PLAIN_NUMBER for _, other_type in others):
             if language == 'en':
-                response = ("❌ Could not generate SMD code.\n\n"
-                          "Examples:\n"
-                          "• `10k` → 103, 01C\n"
-                          "• `4.7 Ohm` → 4R7\n"
-                          "• `100k` → 104, 01D")
+                response += f"\n💡 Send `{text.strip()} Ohm` for the codes of this value"
             else:
-                response = ("❌ Не удалось сгенерировать SMD код.\n\n"
-                          "Примеры:\n"
-                          "• `10к` → 103, 01C\n"
-                          "• `4.7 Ом` → 4R7\n"
-                          "• `100к` → 104, 01D")
+                response += f"\n💡 Отправьте `{text.strip()} Ом`, чтобы получить коды этого номинала"
+        return response, None
+    if language == 'en':
+        return f"❌ Could not decode SMD code: `{text}`", None
+    return f"❌ Не удалось расшифровать SMD код: `{text}`", None
+
+@router.mode('throughhole')
+def throughhole_value_reply(text, language):
+    """Номинал -> цветовая маркировка"""
+    colors_4, colors_5, error = resistance_to_colors(text)
+    if error:
+        return error, None
+    if colors_4 or colors_5:
+        return format_color_coding(colors_4, colors_5, language), None
+    if language == 'en':
+        return ("❌ Could not recognize value for color coding.\n\n"
+                "Examples:\n"
+                "• `1k` → 1000 Ohm\n"
+                "• `470 Ohm` → 470 Ohm\n"
+                "• `2.2M` → 2.2 MOhm"), None
+    return ("❌ Не удалось распознать номинал для цветовой маркировки.\n\n"
+            "Примеры:\n"
+            "• `1к` → 1000 Ом\n"
+            "• `470 Ом` → 470 Ом\n"
+            "• `2.2М` → 2.2 МОм"), None
+
+@router.mode('smd')
+def smd_value_reply(text, language):
+    """Номинал -> SMD коды; 4 цифры без букв - прежде всего 4-значная маркировка"""
+    if smd_to_resistance(text):
+        # "1002" в режиме SMD - код 10 кОм; номинал 1002 Ом предлагается как другое прочтение
+        return smd_code_reply(text, language)
+    response = format_smd_codes(resistance_to_smd(text), language)
+    if response:
+        return response, None
+    if language == 'en':
+        return ("❌ Could not generate SMD code.\n\n"
+                "Examples:\n"
+                "• `10k` → 103, 01C\n"
+                "• `4.7 Ohm` → 4R7\n"
+                "• `100k` → 104, 01D"), None
+    return ("❌ Не удалось сгенерировать SMD код.\n\n"
+            "Примеры:\n"
+            "• `10к` → 103, 01C\n"
+            "• `4.7 Ом` → 4R7\n"
+            "• `100к` → 104, 01D"), None
+
+@router.mode('main')
+def auto_value_reply(text, language):
+    """Главное меню: сначала SMD код по номиналу, затем цветовая маркировка"""
+    response = format_smd_codes(resistance_to_smd(text), language)
+    if response:
+        return response + smd_reading_note(text, language), None
+    
+    colors_4, colors_5, error = resistance_to_colors(text)
+    if error:
+        return error, None
+    if colors_4 or colors_5:
+        return format_color_coding(colors_4, colors_5, language), None
     
+    # Меню прикладывается только к подсказке о нераспознанном запросе
+    if language == 'en':
+        response = ("❌ Could not recognize request.\n\n"
+                    "Possible options:\n"
+                    "• Band colors: `red violet yellow gold`\n"
+                    "• Value: `1k`, `470 Ohm`\n"
+                    "• SMD code: `103`, `4R7`\n\n"
+                    "Use buttons to select mode:")
     else:
-        # Автоматическое определение в главном меню
-        # Сначала пробуем как SMD
-        smd_result = resistance_to_smd(text)
-        if smd_result and "Could not" not in smd_result and "Error" not in smd_result and "Не удалось" not in smd_result and "Ошибка" not in smd_result:
-            if isinstance(smd_result, tuple) and len(smd_result) == 3:
-                value, codes, series = smd_result
-                codes_str = "\n".join([f"• `{code}` ({s})" for code, s in zip(codes, series)])
-                if language == 'en':
-                    response = f"💎 *Value:* {value}\n🔤 *SMD codes:*\n{codes_str}"
-                else:
-                    response = f"💎 *Номинал:* {value}\n🔤 *SMD коды:*\n{codes_str}"
-            else:
-                response = f"💎 {smd_result}"
-        else:
-            # Пробуем как цилиндрический
-            colors_4, colors_5, error = resistance_to_colors(text)
-            if error:
-                response = error
-            elif colors_4 or colors_5:
-                if language == 'en':
-                    response = "🎨 *Color coding:*\n\n"
-                else:
-                    response = "🎨 *Цветовые маркировки:*\n\n"
-                
-                if colors_4:
-                    target_colors_4 = convert_colors_to_target_language(colors_4, language)
-                    colors_str_4 = ' → '.join(target_colors_4)
-                    if language == 'en':
-                        response += f"*4-band:*\n`{colors_str_4}`\n\n"
-                    else:
-                        response += f"*4-полосная:*\n`{colors_str_4}`\n\n"
-                else:
-                    if language == 'en':
-                        response += "*4-band:* not available for this value\n\n"
-                    else:
-                        response += "*4-полосная:* не доступна для данного номинала\n\n"
-                        
-                if colors_5:
-                    target_colors_5 = convert_colors_to_target_language(colors_5, language)
-                    colors_str_5 = ' → '.join(target_colors_5)
-                    if language == 'en':
-                        response += f"*5-band:*\n`{colors_str_5}`"
-                    else:
-                        response += f"*5-полосная:*\n`{colors_str_5}`"
-                else:
-                    if language == 'en':
-                        response += "*5-band:* not available for this value"
-                    else:
-                        response += "*5-полосная:* не доступна для данного номинала"
-            else:
-                if language == 'en':
-                    response = ("❌ Could not recognize request.\n\n"
-                              "Possible options:\n"
-                              "• Band colors: `red violet yellow gold`\n"
-                              "• Value: `1k`, `470 Ohm`\n"
-                              "• SMD code: `103`, `4R7`\n\n"
-                              "Use buttons to select mode:")
-                else:
-                    response = ("❌ Не удалось распознать запрос.\n\n"
-                              "Возможные варианты:\n"
-                              "• Цвета полос: `красный фиолетовый жёлтый золотой`\n"
-                              "• Номинал: `1к`, `470 Ом`\n"
-                              "• SMD код: `103`, `4R7`\n\n"
-                              "Используйте кнопки для выбора режима:")
-    
-    await update.message.reply_text(response, parse_mode='Markdown', 
-                                  reply_markup=get_main_keyboard(language))
+        response = ("❌ Не удалось распознать запрос.\n\n"
+                    "Возможные варианты:\n"
+                    "• Цвета полос: `красный фиолетовый жёлтый золотой`\n"
+                    "• Номинал: `1к`, `470 Ом`\n"
+                    "• SMD код: `103`, `4R7`\n\n"
+                    "Используйте кнопки для выбора режима:")
+    return response, get_main_keyboard(language)
+
+@rate_limited('cheap')
+@metrics.timed('handler')
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик текстовых сообщений"""
+    user_id = update.effective_user.id
+    text = update.message.text.strip()
+    
+    # Текущий контекст пользователя (для нового пользователя - значения по умолчанию)
+    session = await context.bot_data['sessions'].get(user_id)
+    
+    # Определяем тип запроса по содержимому
+    request_type = detect_request_type(text)
+    metrics.count_request(request_type)
+    record = current_update_record()
+    record.set(type=request_type)
+    
+    # Кнопки постоянной клавиатуры прежних версий
+    if request_type == 'menu':
+        await handle_menu_buttons(update, context, session)
+        return
+    
+    # Цвета и SMD коды обрабатываются независимо от режима, номиналы - по режиму пользователя
+    route = router.text_route(request_type, session['mode'])
+    with record.codec():
+        response, reply_markup = route(text, session['language'])
+    with record.send():
+        await update.message.reply_text(response, parse_mode='Markdown', reply_markup=reply_markup)
+
+async def close_sessions(application):
+    """Закрывает хранилище сессий при остановке приложения"""
+    await application.bot_data['sessions'].close()
+
+def build_application(token, request=None, base_url=BOT_API_BASE_URL, sessions=None,
+                      capture_dir=CAPTURE_DIR, dedup_window=DEDUP_WINDOW, dedup_file=DEDUP_FILE,
+                      updates_request=None, state_file=STATE_FILE, rate_limits=RATE_LIMITS):
+    """Создаёт приложение бота со всеми обработчиками.
+    
+    request - собственная реализация BaseRequest (например, заглушка для воспроизведения трафика)
+    base_url - адрес Bot API вместо https://api.telegram.org/bot
+    sessions - хранилище сессий (по умолчанию создаётся по BOT_SESSION_BACKEND)
+    capture_dir - каталог записи трафика (None - не записывать)
+    dedup_window - размер окна отбрасывания повторов (0 - отключить)
+    dedup_file - файл сохранения окна повторов между перезапусками
+    updates_request - отдельный BaseRequest для getUpdates (по умолчанию request)
+    state_file - снимок сессий и кэшей при остановке для тёплого запуска (None - не сохранять)
+    rate_limits - бюджеты запросов пользователя по видам (None - без ограничения)
+    """
+    # Проверка файла данных (BOT_DATA_FILE) работает, пока приложение запущено
+    builder = (Application.builder().token(token)
+               .post_init(data_tables.start_watcher)
+               .post_stop(data_tables.stop_watcher)
+               .post_shutdown(close_sessions))
+    if base_url:
+        builder = builder.base_url(base_url)
+    if request is not None:
+        builder = builder.request(request).get_updates_request(updates_request or request)
+    else:
+        # Пулы и таймауты отправки и getUpdates настраиваются в .env (bot_request)
+        builder = builder.request(create_request('sender'))
+        builder = builder.get_updates_request(create_request('updater'))
+    application = builder.build()
+    application.bot_data['sessions'] = sessions or create_session_store()
+    application.bot_data['router'] = router
+    application.bot_data['state_file'] = state_file
+    router.freeze()
+    
+    # Повторно доставленные обновления отбрасываются до всех остальных обработчиков
+    register_dedup(application, dedup_window, dedup_file)
+    
+    # Запись входящих обновлений для последующего воспроизведения
+    if capture_dir:
+        register_capture(application, capture_dir)
+    
+    # Ограничение частоты запросов одного пользователя (обработчики с @rate_limited)
+    register_rate_limit(application, rate_limits)
+    
+    # Структурированные записи об обработке обновлений (BOT_LOG_UPDATES_SAMPLE, BOT_LOG_UPDATES_SLOW_MS)
+    register_update_log(application)
+    
+    # Обработчики команд
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("fit", fit_command))
+    
+    # Inline-кнопки меню
+    application.add_handler(CallbackQueryHandler(handle_menu_callback))
+    
+    # Счётчик обновлений и административные команды (/stats, /memsnap, /profile) для BOT_ADMIN_ID
+    register_admin_handlers(application)
+    
+    # Обработчик текстовых сообщений (включая кнопки меню)
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    
+    return application
+
+def start_updater(application):
+    """Приём обновлений: вебхук (BOT_WEBHOOK_URL) или опрос getUpdates"""
+    if BOT_WEBHOOK_URL:
+        return application.updater.start_webhook(
+            listen=BOT_WEBHOOK_LISTEN,
+            port=BOT_WEBHOOK_PORT,
+            url_path=urlparse(BOT_WEBHOOK_URL).path.lstrip('/'),
+            webhook_url=BOT_WEBHOOK_URL,
+            secret_token=BOT_WEBHOOK_SECRET,
+        )
+    return application.updater.start_polling()
+
+def parse_bot_tokens(value):
+    """[(имя, токен)] из BOT_TOKENS; без имени ботом называется id из токена"""
+    bots = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, token = item.rpartition('=')
+        bots.append((name.strip() or token.split(':', 1)[0], token.strip()))
+    names = [name for name, _ in bots]
+    if len(set(names)) != len(names):
+        raise ValueError("BOT_TOKENS names must be unique")
+    return bots
+
+def build_applications(bots):
+    """Приложения нескольких ботов: у каждого свои сессии, запись трафика и окно повторов,
+    пул соединений исходящих вызовов Bot API - один на все"""
+    request = create_request('sender')
+    applications = []
+    for name, token in bots:
+        application = build_application(
+            token, request=request,
+            # Долгий getUpdates держит соединение - у каждого бота своё
+            updates_request=create_request('updater'),
+            sessions=create_session_store(f"{SESSION_NAMESPACE}:{name}"),
+            capture_dir=os.path.join(CAPTURE_DIR, name) if CAPTURE_DIR else None,
+            dedup_file=f"{DEDUP_FILE}.{name}" if DEDUP_FILE else None,
+            state_file=f"{STATE_FILE}.{name}" if STATE_FILE else None)
+        application.bot_data['name'] = name
+        applications.append(application)
+    return applications
+
+def drop_queued_updates(application):
+    """Отбрасывает обновления, ожидающие в очереди перед сигналом остановки; возвращает их число"""
+    queue = application.update_queue
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+        queue.task_done()
+    if not items:
+        return 0
+    # Последний элемент - сигнал остановки, поставленный Application.stop(): получив его,
+    # цикл обработки завершится после текущего обработчика
+    queue.put_nowait(items[-1])
+    return len(items) - 1
+
+async def drain_applications(applications, timeout):
+    """Останавливает приём обновлений и ждёт обработки уже принятых не дольше timeout секунд"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    # Профиль /profile отправляется сразу, а не по истечении заданного времени
+    profiler.finish()
+    for application in applications:
+        # Срок для post_stop (процессы-обработчики дорабатывают очереди и отправляют ответы)
+        application.bot_data['shutdown_deadline'] = deadline
+        if application.updater.running:
+            await application.updater.stop()
+    
+    # Application.stop() обрабатывает обновления, оставшиеся в очереди, и задачи create_task
+    stopping = [asyncio.create_task(application.stop()) for application in applications if application.running]
+    if stopping:
+        _, pending = await asyncio.wait(stopping, timeout=timeout)
+        if pending:
+            dropped = sum(drop_queued_updates(application) for application in applications)
+            logging.warning(f"⚠️ Shutdown deadline of {timeout:g} s reached, {dropped} queued updates dropped")
+            # Текущий обработчик дорабатывает (его запись в сессию должна попасть в снимок);
+            # зависший отменяется - post_stop, снимок и shutdown() не выполняются параллельно с ним
+            _, pending = await asyncio.wait(pending, timeout=SHUTDOWN_GRACE)
+            if pending:
+                logging.warning(f"⚠️ Update handling still running after {SHUTDOWN_GRACE:g} s grace, cancelling")
+                await cancel_update_handling(applications, pending)
+
+def update_fetchers(applications):
+    """Задачи, в которых приложения обрабатывают обновления (PTB называет их по id бота)"""
+    names = {f"Application:{application.bot.id}:update_fetcher" for application in applications}
+    return [task for task in asyncio.all_tasks() if task.get_name() in names]
+
+async def cancel_update_handling(applications, stopping):
+    """Прерывает выполняющиеся обработчики и ждёт завершения задач stop().
+
+    Обработчик выполняется в задаче выборки обновлений, а не в stop(): отмена stop()
+    его не прерывает. Прерванное обновление не отмечается в очереди обработанным,
+    поэтому stop(), ожидающий очередь, тоже отменяется
+    """
+    fetchers = update_fetchers(applications)
+    for task in fetchers:
+        task.cancel()
+    # Получив отмену, задача выборки берёт из очереди сигнал остановки и завершается
+    await asyncio.wait(fetchers, timeout=SHUTDOWN_GRACE)
+    for task in stopping:
+        task.cancel()
+    await asyncio.gather(*stopping, return_exceptions=True)
+
+def save_application_state(application):
+    """Снимок сессий и ключей кэшей приложения в BOT_STATE_FILE"""
+    path = application.bot_data.get('state_file')
+    if not path or 'sessions' not in application.bot_data:
+        return
+    try:
+        save_state(path, application.bot_data['sessions'])
+    except OSError as e:
+        logging.error(f"❌ Cannot save state to {path}: {e}")
+
+async def serve_applications(applications, shutdown_timeout=SHUTDOWN_TIMEOUT):
+    """Запускает приложения в одном цикле событий и работает до SIGINT/SIGTERM.
+    
+    Остановка: приём обновлений прекращается, принятые обрабатываются (не дольше
+    shutdown_timeout секунд), затем сохраняется снимок состояния и приложения закрываются
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C прерывает asyncio.run
+    
+    initialized = []
+    try:
+        for application in applications:
+            await application.initialize()
+            initialized.append(application)
+            state_file = application.bot_data.get('state_file')
+            if state_file and 'sessions' in application.bot_data:
+                restore_state([state_file], application.bot_data['sessions'])
+            if application.post_init:
+                await application.post_init(application)
+            await start_updater(application)
+            await application.start()
+            name = application.bot_data.get('name')
+            logging.info(f"🤖 Bot {name + ' ' if name else ''}(@{application.bot.username}) started")
+        lag_monitor.start()
+        await stop.wait()
+    finally:
+        lag_monitor.stop()
+        logging.info("🛑 Shutting down: draining accepted updates")
+        await drain_applications(initialized, shutdown_timeout)
+        for application in initialized:
+            if application.post_stop:
+                await application.post_stop(application)
+            save_application_state(application)
+        # Закрываются после остановки всех: общий пул соединений нескольких ботов
+        # закрывается вместе с первым
+        for application in initialized:
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+
+def run_applications(applications):
+    """Запускает приложения в одном процессе (вебхук - только для одного приложения)"""
+    asyncio.run(serve_applications(applications))
 
 def main():
     """Основная функция"""
+    if not BOT_TOKEN and not BOT_TOKENS:
+        logging.error("❌ BOT_TOKEN not found in environment variables!")
+        exit(1)
+    
     try:
-        application = Application.builder().token(BOT_TOKEN).build()
+        applications = None
+        if BOT_TOKENS:
+            if BOT_WEBHOOK_URL or BOT_WORKERS > 0:
+                raise ValueError("BOT_TOKENS works with getUpdates polling in a single process only "
+                                 "(unset BOT_WEBHOOK_URL and BOT_WORKERS)")
+            applications = build_applications(parse_bot_tokens(BOT_TOKENS))
+            application = applications[0]
+        elif BOT_WORKERS > 0:
+            # Один процесс принимает обновления, обработка - в BOT_WORKERS процессах
+            from worker_pool import build_ingress_application
+            application = build_ingress_application(BOT_TOKEN, BOT_WORKERS)
+        else:
+            application = build_application(BOT_TOKEN)
         
-        # Обработчики команд
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("help", help_command))
+        log_settings()
+        if metrics.METRICS_PORT:
+            metrics.start_http_server()
         
-        # Обработчик текстовых сообщений (включая кнопки меню)
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+        if os.getenv('BOT_HTTP_API_PORT'):
+            # HTTP API в том же процессе и цикле событий: общие таблицы и кэши
+            # (при нескольких ботах запускается вместе с первым)
+            from http_api import register_http_api
+            register_http_api(application)
         
         # Запуск бота
         logging.info("🤖 Bot started with multilingual support!")
@@ -762,7 +1179,7 @@ def main():
         print("🔧 Press Ctrl+C to stop")
         print("=" * 50)
         
-        application.run_polling()
+        run_applications(applications or [application])
         
     except Exception as e:
         logging.error(f"❌ Critical error: {e}")
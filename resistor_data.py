@@ -118,6 +118,43 @@ INPUT_NORMALIZATION = {
 }
 
 
+# Сокращения названий цветов (коды IEC 60757, принятые в схемах, и русские сокращения)
+COLOR_ABBREVIATIONS = {
+    # Английские
+    'bk': 'black', 'blk': 'black',
+    'bn': 'brown', 'brn': 'brown',
+    'rd': 'red',
+    'og': 'orange', 'org': 'orange', 'orn': 'orange',
+    'ye': 'yellow', 'yel': 'yellow', 'yl': 'yellow',
+    'gn': 'green', 'grn': 'green',
+    'bu': 'blue', 'blu': 'blue',
+    'vt': 'violet', 'vio': 'violet', 'pu': 'violet', 'pur': 'violet',
+    'gy': 'gray', 'gry': 'gray',
+    'wh': 'white', 'wht': 'white',
+    'gd': 'gold', 'gld': 'gold', 'au': 'gold',
+    'sr': 'silver', 'slv': 'silver', 'ag': 'silver',
+    
+    # Русские
+    'чер': 'черный', 'черн': 'черный',
+    'кор': 'коричневый', 'корич': 'коричневый',
+    'кр': 'красный', 'крас': 'красный',
+    'ор': 'оранжевый', 'оранж': 'оранжевый',
+    'жел': 'желтый', 'желт': 'желтый',
+    'зел': 'зеленый',
+    'син': 'синий', 'голубой': 'синий',
+    'фиол': 'фиолетовый', 'пурпурный': 'фиолетовый',
+    'сер': 'серый',
+    'бел': 'белый',
+    'зол': 'золотой',
+    'серебр': 'серебряный',
+}
+
+# Слова-оттенки, которые не меняют цвет полосы ("lt blue", "светло-синий")
+COLOR_MODIFIERS = {
+    'lt', 'light', 'dk', 'dark', 'bright', 'pale',
+    'светло', 'темно', 'ярко', 'бледно', 'св', 'тм',
+}
+
 # Стандартные ряды резисторов
 E24_SERIES = [
     1.0, 1.1, 1.2, 1.3, 1.5, 1.6, 1.8, 2.0, 2.2, 2.4, 2.7, 3.0,
@@ -135,6 +172,37 @@ E96_SERIES = [
     7.50, 7.68, 7.87, 8.06, 8.25, 8.45, 8.66, 8.87, 9.09, 9.31, 9.53, 9.76
 ]
 
+# Допуск каждого ряда (доля от номинала)
+SERIES_TOLERANCES = {
+    'E6': 0.20, 'E12': 0.10, 'E24': 0.05, 'E48': 0.02, 'E96': 0.01,
+}
+
+# E96 multiplier codes (letters); R, S and H are alternatives for Y, X and B
+E96_MULTIPLIERS = {
+    'Z': 0.001, 'Y': 0.01, 'X': 0.1, 'A': 1, 'B': 10, 'C': 100,
+    'D': 1000, 'E': 10000, 'F': 100000, 'R': 0.01, 'S': 0.1, 'H': 10
+}
+
+# E96 value codes (2-digit + letter)
+E96_CODES = {
+    '01': 100, '02': 102, '03': 105, '04': 107, '05': 110, '06': 113,
+    '07': 115, '08': 118, '09': 121, '10': 124, '11': 127, '12': 130,
+    '13': 133, '14': 137, '15': 140, '16': 143, '17': 147, '18': 150,
+    '19': 154, '20': 158, '21': 162, '22': 165, '23': 169, '24': 174,
+    '25': 178, '26': 182, '27': 187, '28': 191, '29': 196, '30': 200,
+    '31': 205, '32': 210, '33': 215, '34': 221, '35': 226, '36': 232,
+    '37': 237, '38': 243, '39': 249, '40': 255, '41': 261, '42': 267,
+    '43': 274, '44': 280, '45': 287, '46': 294, '47': 301, '48': 309,
+    '49': 316, '50': 324, '51': 332, '52': 340, '53': 348, '54': 357,
+    '55': 365, '56': 374, '57': 383, '58': 392, '59': 402, '60': 412,
+    '61': 422, '62': 432, '63': 442, '64': 453, '65': 464, '66': 475,
+    '67': 487, '68': 499, '69': 511, '70': 523, '71': 536, '72': 549,
+    '73': 562, '74': 576, '75': 590, '76': 604, '77': 619, '78': 634,
+    '79': 649, '80': 665, '81': 681, '82': 698, '83': 715, '84': 732,
+    '85': 750, '86': 768, '87': 787, '88': 806, '89': 825, '90': 845,
+    '91': 866, '92': 887, '93': 909, '94': 931, '95': 953, '96': 976
+}
+
 # Допустимые единицы измерения и их множители (русские и английские)
 UNIT_MULTIPLIERS = {
     # Русские
@@ -0,0 +1,113 @@
+"""
+Табличная маршрутизация: кнопки меню и режимы пользователя -> обработчики.
+
+Таблицы заполняются регистрацией при импорте модулей и замораживаются при сборке
+приложения, поэтому выбор обработчика - один поиск в словаре независимо от числа
+кнопок и режимов. Каждый маршрут считает свои вызовы, а при включённых метриках
+его задержка попадает в bot_route_seconds.
+"""
+
+from types import MappingProxyType
+
+import metrics
+
+
+class Route:
+    """Зарегистрированный обработчик с именем и счётчиком вызовов"""
+
+    __slots__ = ('name', 'handler', 'calls')
+
+    def __init__(self, name, handler):
+        self.name = name
+        self.handler = metrics.timed('route', name)(handler)
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.handler(*args, **kwargs)
+
+
+class Router:
+    """Таблицы маршрутов меню (callback_data inline-кнопок и тексты кнопок постоянной
+    клавиатуры прежних версий), типов запросов и режимов"""
+
+    def __init__(self, default_mode='main'):
+        self.default_mode = default_mode
+        self.callbacks = {}
+        self.buttons = {}
+        self.requests = {}
+        self.modes = {}
+        self.frozen = False
+
+    def _register(self, table, keys, route):
+        if self.frozen:
+            raise RuntimeError(f"Router is frozen, cannot register {route.name}")
+        for key in keys:
+            if key in table:
+                raise ValueError(f"Duplicate route key {key!r} for {route.name}")
+            table[key] = route
+
+    def action(self, name, callbacks=(), buttons=()):
+        """Декоратор действия меню для callback_data из callbacks и текстов кнопок из buttons.
+
+        Таблицы раздельные: короткие callback_data ("s", "en") не должны совпадать
+        с обычным текстом сообщения, а текст сообщения - запускать действие по callback_data.
+        """
+        def decorator(func):
+            route = Route(f'menu:{name}', func)
+            self._register(self.callbacks, callbacks, route)
+            self._register(self.buttons, buttons, route)
+            return func
+        return decorator
+
+    def request(self, request_type):
+        """Декоратор обработчика запроса определённого типа (не зависит от режима)"""
+        def decorator(func):
+            self._register(self.requests, (request_type,), Route(f'request:{request_type}', func))
+            return func
+        return decorator
+
+    def mode(self, name):
+        """Декоратор обработчика запросов в режиме name"""
+        def decorator(func):
+            self._register(self.modes, (name,), Route(f'mode:{name}', func))
+            return func
+        return decorator
+
+    def freeze(self):
+        """Запрещает дальнейшую регистрацию; повторный вызов ничего не делает"""
+        if not self.frozen:
+            if self.default_mode not in self.modes:
+                raise ValueError(f"No handler for default mode {self.default_mode!r}")
+            self.callbacks = MappingProxyType(self.callbacks)
+            self.buttons = MappingProxyType(self.buttons)
+            self.requests = MappingProxyType(self.requests)
+            self.modes = MappingProxyType(self.modes)
+            self.frozen = True
+
+    def is_menu(self, text):
+        """Текст сообщения - кнопка постоянной клавиатуры прежних версий"""
+        return text in self.buttons
+
+    def button_route(self, text):
+        """Маршрут кнопки постоянной клавиатуры по её тексту или None"""
+        return self.buttons.get(text)
+
+    def callback_route(self, data):
+        """Маршрут inline-кнопки по callback_data или None"""
+        return self.callbacks.get(data)
+
+    def text_route(self, request_type, mode):
+        """Маршрут текстового запроса: по типу запроса, иначе по режиму пользователя"""
+        route = self.requests.get(request_type)
+        if route is None:
+            route = self.modes.get(mode) or self.modes[self.default_mode]
+        return route
+
+    def routes(self):
+        """Все маршруты без повторов (для статистики)"""
+        unique = {}
+        for table in (self.callbacks, self.buttons, self.requests, self.modes):
+            for route in table.values():
+                unique[route.name] = route
+        return unique
@@ -0,0 +1,239 @@
+"""
+Хранилище пользовательских сессий (режим и язык).
+
+MemorySessionStore - сессии в памяти процесса (один экземпляр бота).
+RedisSessionStore - общий Redis для нескольких экземпляров за балансировщиком,
+с небольшим локальным кэшем чтения и оптимистичным версионированием изменений.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+
+# Сессия нового пользователя
+DEFAULT_SESSION = {'mode': 'main', 'language': 'ru', 'version': 0}
+
+SESSION_BACKEND = os.getenv('BOT_SESSION_BACKEND', 'memory')
+REDIS_URL = os.getenv('BOT_REDIS_URL', 'redis://localhost:6379/0')
+SESSION_NAMESPACE = os.getenv('BOT_SESSION_NAMESPACE', 'resistor_bot')
+# Время жизни локального кэша сессий на узле (секунды) и его размер
+SESSION_CACHE_TTL = float(os.getenv('BOT_SESSION_CACHE_TTL', '2'))
+SESSION_CACHE_SIZE = int(os.getenv('BOT_SESSION_CACHE_SIZE', '10000'))
+# Время жизни сессии в Redis без активности (секунды)
+SESSION_TTL = int(os.getenv('BOT_SESSION_TTL', str(30 * 24 * 3600)))
+
+# Сколько раз повторять изменение при конфликте версий и начальная пауза перед повтором (секунды):
+# пауза случайная и удваивается с каждой попыткой, чтобы одновременные изменения разошлись
+MAX_UPDATE_ATTEMPTS = 8
+UPDATE_BACKOFF = 0.002
+
+
+class SessionConflict(Exception):
+    """Сессия изменена другим узлом между чтением и записью"""
+
+
+class SessionStore:
+    """Базовый интерфейс хранилища сессий"""
+
+    async def get(self, user_id):
+        """Сессия пользователя (копия); для нового пользователя - сессия по умолчанию"""
+        raise NotImplementedError
+
+    async def get_many(self, user_ids):
+        """Сессии нескольких пользователей: {user_id: session}"""
+        return {user_id: await self.get(user_id) for user_id in user_ids}
+
+    async def compare_and_set(self, user_id, expected_version, **fields):
+        """Изменяет поля, если версия сессии равна expected_version; иначе SessionConflict"""
+        raise NotImplementedError
+
+    async def update(self, user_id, session=None, **fields):
+        """Изменяет поля сессии с оптимистичной проверкой версии и повтором при конфликте"""
+        for attempt in range(MAX_UPDATE_ATTEMPTS):
+            if session is None:
+                session = await self.get(user_id)
+            try:
+                return await self.compare_and_set(user_id, session['version'], **fields)
+            except SessionConflict:
+                session = None
+                await asyncio.sleep(random.uniform(0, UPDATE_BACKOFF * 2 ** attempt))
+        raise SessionConflict(f"Too many concurrent updates for user {user_id}")
+
+    async def size(self):
+        """Число сохранённых сессий"""
+        raise NotImplementedError
+
+    def snapshot(self):
+        """Сессии для снимка при остановке {user_id: session}; None, если хранилище их сохраняет само"""
+        return None
+
+    def restore(self, sessions):
+        """Восстанавливает сессии из снимка; возвращает число восстановленных"""
+        return 0
+
+    async def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Сессии в словаре процесса"""
+
+    def __init__(self):
+        self.sessions = {}
+
+    async def get(self, user_id):
+        return dict(self.sessions.get(user_id, DEFAULT_SESSION))
+
+    async def compare_and_set(self, user_id, expected_version, **fields):
+        current = self.sessions.get(user_id, DEFAULT_SESSION)
+        if current['version'] != expected_version:
+            raise SessionConflict(f"user {user_id}: version {current['version']} != {expected_version}")
+        session = dict(current, **fields)
+        session['version'] = expected_version + 1
+        self.sessions[user_id] = session
+        return dict(session)
+
+    async def size(self):
+        return len(self.sessions)
+
+    def snapshot(self):
+        return dict(self.sessions)
+
+    def restore(self, sessions):
+        # Сессии, изменённые после запуска, новее снимка
+        for user_id, session in sessions.items():
+            if user_id not in self.sessions:
+                self.sessions[user_id] = dict(DEFAULT_SESSION, **session)
+        return len(sessions)
+
+
+class RedisSessionStore(SessionStore):
+    """Сессии в Redis: хэш на пользователя, локальный кэш чтения с коротким TTL"""
+
+    def __init__(self, client, namespace=SESSION_NAMESPACE, cache_ttl=SESSION_CACHE_TTL,
+                 cache_size=SESSION_CACHE_SIZE, session_ttl=SESSION_TTL):
+        self.client = client
+        self.namespace = namespace
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.session_ttl = session_ttl
+        self.cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Пользователи с сессиями, оценка - время истечения сессии (для size без SCAN)
+        self.members_key = f"{namespace}:session_expiry"
+
+    def key(self, user_id):
+        return f"{self.namespace}:session:{user_id}"
+
+    @staticmethod
+    def decode(raw):
+        if not raw:
+            return dict(DEFAULT_SESSION)
+        raw = {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+               for k, v in raw.items()}
+        return {
+            'mode': raw.get('mode', DEFAULT_SESSION['mode']),
+            'language': raw.get('language', DEFAULT_SESSION['language']),
+            'version': int(raw.get('version', 0)),
+        }
+
+    def cache_put(self, user_id, session):
+        self.cache[user_id] = (time.monotonic() + self.cache_ttl, session)
+        self.cache.move_to_end(user_id)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def cache_get(self, user_id):
+        entry = self.cache.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self.cache_hits += 1
+            return dict(entry[1])
+        self.cache_misses += 1
+        return None
+
+    async def get(self, user_id):
+        session = self.cache_get(user_id)
+        if session is None:
+            session = self.decode(await self.client.hgetall(self.key(user_id)))
+            self.cache_put(user_id, session)
+        return dict(session)
+
+    async def get_many(self, user_ids):
+        result = {}
+        missing = []
+        for user_id in user_ids:
+            session = self.cache_get(user_id)
+            if session is None:
+                missing.append(user_id)
+            else:
+                result[user_id] = session
+        if missing:
+            # Один круг обмена с Redis на все промахи кэша
+            async with self.client.pipeline(transaction=False) as pipe:
+                for user_id in missing:
+                    pipe.hgetall(self.key(user_id))
+                for user_id, raw in zip(missing, await pipe.execute()):
+                    session = self.decode(raw)
+                    self.cache_put(user_id, session)
+                    result[user_id] = dict(session)
+        return result
+
+    async def compare_and_set(self, user_id, expected_version, **fields):
+        from redis.exceptions import WatchError
+
+        key = self.key(user_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                current = self.decode(await pipe.hgetall(key))
+                if current['version'] != expected_version:
+                    self.cache_put(user_id, current)
+                    raise SessionConflict(
+                        f"user {user_id}: version {current['version']} != {expected_version}")
+                session = dict(current, **fields)
+                session['version'] = expected_version + 1
+                pipe.multi()
+                pipe.hset(key, mapping={k: str(v) for k, v in session.items()})
+                pipe.expire(key, self.session_ttl)
+                pipe.zadd(self.members_key, {user_id: time.time() + self.session_ttl})
+                await pipe.execute()
+            except WatchError:
+                self.cache.pop(user_id, None)
+                raise SessionConflict(f"user {user_id}: concurrent update")
+        self.cache_put(user_id, session)
+        return dict(session)
+
+    async def size(self):
+        # Сессии, истёкшие по TTL, удаляются из множества при подсчёте
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.members_key, '-inf', time.time())
+            pipe.zcard(self.members_key)
+            _, count = await pipe.execute()
+        return count
+
+    async def close(self):
+        # В redis-py 5+ метод называется aclose, в старых версиях - close
+        close = getattr(self.client, 'aclose', None) or self.client.close
+        await close()
+
+
+def create_session_store(namespace=SESSION_NAMESPACE):
+    """Создаёт хранилище по BOT_SESSION_BACKEND: memory, redis или fakeredis (локальные тесты)"""
+    if SESSION_BACKEND == 'memory':
+        return MemorySessionStore()
+
+    if SESSION_BACKEND == 'fakeredis':
+        import fakeredis
+        client = fakeredis.FakeAsyncRedis()
+    elif SESSION_BACKEND == 'redis':
+        import redis.asyncio
+        client = redis.asyncio.from_url(REDIS_URL)
+    else:
+        raise ValueError(f"Unknown BOT_SESSION_BACKEND: {SESSION_BACKEND}")
+
+    logging.info(f"🗄 Session store: {SESSION_BACKEND} (namespace '{namespace}')")
+    return RedisSessionStore(client, namespace=namespace)
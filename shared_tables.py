@@ -0,0 +1,199 @@
+"""
+Таблицы поиска в бинарном файле с фиксированной разметкой, общие для всех процессов.
+
+Числовые массивы индексов (интервалы рядов E6...E96, коды EIA-96, индекс SMD кодов) один раз
+записываются в файл, а каждый процесс отображает его в память только для чтения
+(mmap) и читает без копирования через memoryview (или numpy.frombuffer). Страницы
+файла разделяются процессами через кэш страниц ОС, поэтому процессы-обработчики
+не держат свои копии массивов и не пересчитывают их при запуске.
+
+Имя файла содержит отпечаток таблиц данных и разметки: изменённые таблицы (перезагрузка
+файла данных) получают новый файл, а процессы с одинаковыми таблицами - один и тот же.
+Отпечаток считается по открытым данным и не защищает содержимое, поэтому каталог по
+умолчанию - личный (0700) каталог пользователя процесса во временном каталоге системы, а
+каталог и файл, принадлежащие другому пользователю или доступные ему на запись, не
+используются. В Windows (нет uid) каталога по умолчанию нет: таблицы строятся в памяти
+процесса, если BOT_SHARED_TABLES_DIR не задан явно.
+
+Разметка (little-endian):
+  заголовок   magic b'RCBT', версия разметки (uint32), число секций (uint32), отпечаток (32 байта)
+  каталог     на каждую секцию: имя (32 байта), код типа array/struct (8 байт),
+              смещение (uint64), число элементов (uint64)
+  данные      секции подряд, каждая выровнена по 8 байт
+"""
+
+import array
+import hashlib
+import json
+import logging
+import mmap
+import os
+import stat
+import struct
+import sys
+import tempfile
+
+import data_tables
+
+# Каталог файлов таблиц; пустая строка отключает общие таблицы (массивы строятся в памяти процесса),
+# без переменной используется default_dir()
+SHARED_TABLES_DIR = os.getenv('BOT_SHARED_TABLES_DIR')
+
+MAGIC = b'RCBT'
+LAYOUT_VERSION = 1
+HEADER = struct.Struct('<4sII32s')
+ENTRY = struct.Struct('<32s8sQQ')
+ALIGNMENT = 8
+
+# Генераторы секций: группа -> func(tables) -> {имя секции: (код типа, значения)}
+GENERATORS = {}
+
+
+def sections(group):
+    """Декоратор генератора секций группы; секции доступны через arrays(tables, group)"""
+    def decorator(func):
+        GENERATORS[group] = func
+        return func
+    return decorator
+
+
+def fingerprint(tables):
+    """sha256 таблиц данных, версии разметки и набора групп"""
+    payload = {'layout': LAYOUT_VERSION, 'groups': sorted(GENERATORS)}
+    for name, kind in data_tables.TABLE_TYPES.items():
+        value = getattr(tables, name)
+        payload[name] = sorted(value) if kind is set else dict(value) if kind is dict else list(value)
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).digest()
+
+
+def generate(tables):
+    """Все секции всех групп: {"группа.секция": array}"""
+    generated = {}
+    for group, func in GENERATORS.items():
+        for name, (typecode, values) in func(tables).items():
+            generated[f'{group}.{name}'] = array.array(typecode, values)
+    return generated
+
+
+def default_dir():
+    """Личный каталог пользователя во временном каталоге системы; None там, где нет
+    uid (Windows) - тогда общие таблицы включаются только явным BOT_SHARED_TABLES_DIR"""
+    if not hasattr(os, 'getuid'):
+        return None
+    return os.path.join(tempfile.gettempdir(), f'resistor_code_bot-{os.getuid()}')
+
+
+def check_private(st, path, directory=False):
+    """Каталог или файл должен принадлежать пользователю процесса и не быть доступен
+    на запись другим (каталог - вообще недоступен другим); без uid проверяется только тип"""
+    if not (stat.S_ISDIR if directory else stat.S_ISREG)(st.st_mode):
+        raise ValueError(f"{path} is not a {'directory' if directory else 'regular file'}")
+    if not hasattr(os, 'geteuid'):
+        return
+    if st.st_uid != os.geteuid():
+        raise ValueError(f"{path} is owned by another user")
+    if stat.S_IMODE(st.st_mode) & (0o077 if directory else 0o022):
+        raise ValueError(f"{path} is accessible to other users (mode {stat.S_IMODE(st.st_mode):o})")
+
+
+def private_dir(path):
+    """Создаёт каталог с правами 0700 или проверяет существующий"""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    check_private(os.lstat(path), path, directory=True)
+
+
+def write_file(path, digest, arrays):
+    """Записывает секции в файл (через новый временный файл с O_EXCL и os.replace)"""
+    offset = HEADER.size + ENTRY.size * len(arrays)
+    entries = []
+    for name, values in arrays.items():
+        offset += -offset % ALIGNMENT
+        entries.append((name, values, offset))
+        offset += values.itemsize * len(values)
+
+    # mkstemp создаёт файл с O_EXCL и правами 0600: чужой файл с тем же именем не подменит данные
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=os.path.dirname(path))
+    with open(fd, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, LAYOUT_VERSION, len(arrays), digest))
+        for name, values, offset in entries:
+            f.write(ENTRY.pack(name.encode('ascii'), values.typecode.encode('ascii'), offset, len(values)))
+        for name, values, offset in entries:
+            f.write(b'\0' * (offset - f.tell()))
+            if sys.byteorder != 'little':
+                values = array.array(values.typecode, values)
+                values.byteswap()
+            f.write(values.tobytes())
+    os.chmod(tmp_path, 0o644)
+    # Процессы, одновременно создающие один файл, пишут одинаковое содержимое
+    os.replace(tmp_path, path)
+
+
+class SharedTables:
+    """Отображённый в память файл таблиц; секции читаются без копирования"""
+
+    def __init__(self, path, digest):
+        self.path = path
+        with open(path, 'rb') as f:
+            # Проверяется открытый файл, а не путь: между проверкой и открытием его не подменить
+            check_private(os.fstat(f.fileno()), path)
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, layout, count, file_digest = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or layout != LAYOUT_VERSION or file_digest != digest:
+            raise ValueError(f"{path} does not match the current tables")
+        self.sections = {}
+        for i in range(count):
+            name, typecode, offset, length = ENTRY.unpack_from(self.buffer, HEADER.size + ENTRY.size * i)
+            self.sections[name.rstrip(b'\0').decode('ascii')] = (typecode.rstrip(b'\0').decode('ascii'),
+                                                                 offset, length)
+
+    def view(self, name):
+        """memoryview секции с элементами её типа"""
+        typecode, offset, length = self.sections[name]
+        size = array.array(typecode).itemsize * length
+        return memoryview(self.buffer)[offset:offset + size].cast(typecode)
+
+    def array(self, name):
+        """Секция как массив numpy без копирования (нужен numpy)"""
+        import numpy
+        typecode, offset, length = self.sections[name]
+        return numpy.frombuffer(self.buffer, dtype=numpy.dtype(typecode).newbyteorder('<'),
+                                count=length, offset=offset)
+
+    def group(self, group):
+        """Все секции группы: {секция: memoryview}"""
+        prefix = f'{group}.'
+        return {name[len(prefix):]: self.view(name) for name in self.sections if name.startswith(prefix)}
+
+
+@data_tables.derived('shared_tables')
+def open_shared_tables(tables):
+    """Файл таблиц для снимка: открывает существующий или создаёт его; None, если отключено"""
+    directory = default_dir() if SHARED_TABLES_DIR is None else SHARED_TABLES_DIR
+    if not directory or sys.byteorder != 'little':
+        return None
+    digest = fingerprint(tables)
+    path = os.path.join(directory, f"tables-{digest.hex()[:16]}.bin")
+    try:
+        private_dir(directory)
+        if not os.path.exists(path):
+            write_file(path, digest, generate(tables))
+            logging.info(f"🗂 Shared lookup tables written to {path}")
+        return SharedTables(path, digest)
+    except (OSError, ValueError) as e:
+        logging.warning(f"⚠️ Shared lookup tables unavailable, using process memory: {e}")
+        return None
+
+
+def arrays(tables, group):
+    """Секции группы: из общего файла, если он доступен, иначе массивы в памяти процесса"""
+    shared = tables.index('shared_tables')
+    if shared is not None:
+        found = shared.group(group)
+        if found:
+            return found
+    return {name: array.array(typecode, values) for name, (typecode, values) in GENERATORS[group](tables).items()}
@@ -1,116 +1,201 @@
 import re
-from resistor_data import E24_SERIES, E96_SERIES
-
-# E96 multiplier codes (letters)
-E96_MULTIPLIERS = {
-    'Z': 0.001, 'Y': 0.01, 'X': 0.1, 'A': 1, 'B': 10, 'C': 100,
-    'D': 1000, 'E': 10000, 'F': 100000
-}
-
-# E96 value codes (2-digit + letter)
-E96_CODES = {
-    '01': 100, '02': 102, '03': 105, '04': 107, '05': 110, '06': 113,
-    '07': 115, '08': 118, '09': 121, '10': 124, '11': 127, '12': 130,
-    '13': 133, '14': 137, '15': 140, '16': 143, '17': 147, '18': 150,
-    '19': 154, '20': 158, '21': 162, '22': 165, '23': 169, '24': 174,
-    '25': 178, '26': 182, '27': 187, '28': 191, '29': 196, '30': 200,
-    '31': 205, '32': 210, '33': 215, '34': 221, '35': 226, '36': 232,
-    '37': 237, '38': 243, '39': 249, '40': 255, '41': 261, '42': 267,
-    '43': 274, '44': 280, '45': 287, '46': 294, '47': 301, '48': 309,
-    '49': 316, '50': 324, '51': 332, '52': 340, '53': 348, '54': 357,
-    '55': 365, '56': 374, '57': 383, '58': 392, '59': 402, '60': 412,
-    '61': 422, '62': 432, '63': 442, '64': 453, '65': 464, '66': 475,
-    '67': 487, '68': 499, '69': 511, '70': 523, '71': 536, '72': 549,
-    '73': 562, '74': 576, '75': 590, '76': 604, '77': 619, '78': 634,
-    '79': 649, '80': 665, '81': 681, '82': 698, '83': 715, '84': 732,
-    '85': 750, '86': 768, '87': 787, '88': 806, '89': 825, '90': 845,
-    '91': 866, '92': 887, '93': 909, '94': 931, '95': 953, '96': 976
-}
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from itertools import product
 
+import data_tables
+import metrics
+import shared_tables
+
+# Прочтение SMD кода: код в том виде, как он нанесён, сопротивление (Ом) и схема маркировки
+Marking = namedtuple('Marking', 'code ohms scheme')
+
+# Ряд в названии схемы - только если номинал из этого ряда (103 Ом - просто "4-digit")
+THREE_DIGIT = "3-digit"
+THREE_DIGIT_E24 = "E24 (3-digit)"
+FOUR_DIGIT = "4-digit"
+FOUR_DIGIT_E96 = "E96 (4-digit)"
+EIA96 = "EIA-96"
+R_FORMAT = "R-format"
+R_FORMAT_4 = "R-format (4-digit)"
+UNDERLINED = "E24 1% (underlined)"
+# Не маркировка: 4 цифры могут быть и просто номиналом в омах ("4700")
+PLAIN_NUMBER = "plain number"
+
+# Схемы в порядке кодов в ответе на номинал; в общем файле схема хранится номером в этом списке
+SCHEMES = (THREE_DIGIT_E24, THREE_DIGIT, FOUR_DIGIT_E96, FOUR_DIGIT, EIA96, R_FORMAT, R_FORMAT_4, UNDERLINED,
+           PLAIN_NUMBER)
+
+# Подчёркивание под символом (U+0332 COMBINING LOW LINE)
+UNDERLINE = '\u0332'
+
+def underline(code):
+    """Код с подчёркиванием под каждым символом"""
+    return ''.join(char + UNDERLINE for char in code)
+
+def normalize_code(code):
+    """Ключ индекса: верхний регистр без пробелов; подчёркнутый код (U+0332 под символами
+    или '_' в начале или конце, если подчёркивание не набрать) получает префикс '_'"""
+    code = code.strip().upper().replace(' ', '')
+    if UNDERLINE in code or code.startswith('_') or code.endswith('_'):
+        return '_' + code.replace(UNDERLINE, '').strip('_')
+    return code
+
+def value_key(ohms):
+    """Номинал, округлённый до 6 значащих цифр: погрешность float (301 * 0.01, разбор ввода)
+    не мешает точному поиску"""
+    return float(f"{ohms:.6g}")
+
+def pack_key(key):
+    """Ключ кода (не длиннее 4 символов ASCII) -> uint32 с тем же порядком сортировки; None для других"""
+    if len(key) > 4 or not key.isascii():
+        return None
+    return int.from_bytes(key.encode('ascii').ljust(4, b'\0'), 'big')
+
+def unpack_key(packed):
+    """uint32 -> код в том виде, как он нанесён (подчёркнутый - с U+0332)"""
+    key = packed.to_bytes(4, 'big').rstrip(b'\0').decode('ascii')
+    return underline(key[1:]) if key.startswith('_') else key
+
+def digit_strings(length):
+    return (''.join(digits) for digits in product('0123456789', repeat=length))
+
+@shared_tables.sections('smd')
+def smd_sections(tables):
+    """Индекс SMD кодов всех схем: отсортированные массивы для двоичного поиска в общем файле.
+
+    key/first/ohms/scheme: ключ кода (pack_key) -> прочтения first[i]...first[i + 1]
+    (первое - наиболее вероятное; несколько - код неоднозначен)
+    value/code/code_scheme: номинал -> коды, которыми он маркируется, в порядке SCHEMES
+    """
+    decode = {}
+    encode = []
+    e24 = {f"{int(round(value * 10)):02d}" for value in tables.e24_series}
+    e96 = {f"{int(round(value * 100)):03d}" for value in tables.e96_series}
+    number = {scheme: i for i, scheme in enumerate(SCHEMES)}
+
+    def add(key, ohms, scheme, canonical=True):
+        ohms = value_key(ohms)
+        decode.setdefault(key, []).append((ohms, number[scheme]))
+        if canonical:
+            encode.append((ohms, number[scheme], pack_key(key)))
+
+    # 3 и 4 цифры: значащие цифры и степень десяти (нули в начале не наносятся, кроме 000 - перемычки)
+    for digits in digit_strings(3):
+        ohms = int(digits[:2]) * 10 ** int(digits[2])
+        canonical = digits[0] != '0' or digits == '000'
+        add(digits, ohms, THREE_DIGIT_E24 if digits[:2] in e24 else THREE_DIGIT, canonical)
+        if digits[:2] in e24 and digits[0] != '0':
+            add('_' + digits, ohms, UNDERLINED)
+    for digits in digit_strings(4):
+        ohms = int(digits[:3]) * 10 ** int(digits[3])
+        scheme = FOUR_DIGIT_E96 if digits[:3] in e96 else FOUR_DIGIT
+        add(digits, ohms, scheme, digits[0] != '0' or digits == '0000')
+
+    # R на месте десятичной точки: R47, 4R7, 47R (3 знака) и R047, 4R70, 10R0 (4 знака)
+    for length in (2, 3, 4):
+        for position in range(length):
+            for digits in digit_strings(length - 1):
+                code = digits[:position] + 'R' + digits[position:]
+                ohms = float(code.replace('R', '.'))
+                # В ответ на номинал: меньше 100 Ом, без нулей в начале и не из 2 знаков
+                canonical = length > 2 and ohms < 100 and not code.startswith('0')
+                add(code, ohms, R_FORMAT if length < 4 else R_FORMAT_4, canonical)
+                if length == 3 and digits in e24 and canonical:
+                    add('_' + code, ohms, UNDERLINED)
+
+    # EIA-96: две цифры - номер значения ряда E96, буква - множитель; из букв-синонимов
+    # (R = Y, S = X, H = B) в ответ на номинал попадает первая
+    primary = {}
+    for letter, multiplier in tables.e96_multipliers.items():
+        primary.setdefault(multiplier, letter)
+    for code_number, significand in tables.e96_codes.items():
+        for letter, multiplier in tables.e96_multipliers.items():
+            add(code_number + letter, significand * multiplier, EIA96, primary[multiplier] == letter)
+
+    # Четыре цифры без букв чаще всего - номинал в омах, набранный без единиц
+    for digits in digit_strings(4):
+        add(digits, int(digits), PLAIN_NUMBER, canonical=False)
+
+    keys = sorted(decode, key=pack_key)
+    readings = [reading for key in keys for reading in decode[key]]
+    first = [0]
+    for key in keys:
+        first.append(first[-1] + len(decode[key]))
+    encode.sort()
+    return {
+        'key': ('I', [pack_key(key) for key in keys]),
+        'first': ('I', first),
+        'ohms': ('d', [ohms for ohms, _ in readings]),
+        'scheme': ('B', [scheme for _, scheme in readings]),
+        'value': ('d', [ohms for ohms, _, _ in encode]),
+        'code_scheme': ('B', [scheme for _, scheme, _ in encode]),
+        'code': ('I', [packed for _, _, packed in encode]),
+    }
+
+@data_tables.derived('smd_index')
+def build_smd_index(tables):
+    """Индекс SMD кодов для снимка таблиц (из общего файла, если он доступен)"""
+    return shared_tables.arrays(tables, 'smd')
+
+def key_position(index, packed):
+    """Номер ключа кода в индексе; None, если такого кода нет"""
+    keys = index['key']
+    i = bisect_left(keys, packed)
+    return i if i < len(keys) and keys[i] == packed else None
+
+def decode_markings(index, key):
+    """Прочтения ключа кода: [Marking, ...]; пустой список, если код не распознан"""
+    packed = pack_key(key)
+    i = None if packed is None else key_position(index, packed)
+    if i is None:
+        return []
+    code = unpack_key(packed)
+    return [Marking(code, index['ohms'][j], SCHEMES[index['scheme'][j]])
+            for j in range(index['first'][i], index['first'][i + 1])]
+
+def encode_markings(index, ohms):
+    """Коды номинала в порядке SCHEMES: [(Marking, другие прочтения кода 'EIA-96 3.01 Ohm, ...' или None), ...]"""
+    ohms = value_key(ohms)
+    values = index['value']
+    first = index['first']
+    start = bisect_left(values, ohms)
+    result = []
+    for i in range(start, bisect_right(values, ohms, start)):
+        packed, scheme = index['code'][i], index['code_scheme'][i]
+        # У кода каждой схемы одно прочтение, поэтому остальные прочтения отличаются схемой
+        position = key_position(index, packed)
+        others = [f"{SCHEMES[index['scheme'][j]]} {format_resistance(index['ohms'][j])}"
+                  for j in range(first[position], first[position + 1])
+                  if index['scheme'][j] != scheme and SCHEMES[index['scheme'][j]] != PLAIN_NUMBER]
+        result.append((Marking(unpack_key(packed), values[i], SCHEMES[scheme]), ', '.join(others) or None))
+    return result
+
+@metrics.timed()
 def validate_smd_code(code):
-    """Проверка валидности SMD кода"""
+    """Проверка валидности SMD кода (4 цифры без букв считаются номиналом: "4700")"""
     if not code or len(code) < 2:
         return False
-    
-    code = code.upper().strip()
-    
-    # 3-digit code (E24)
-    if re.match(r'^[0-9]{3}$', code):
-        return True
-    
-    # 4-digit code (E96)
-    if re.match(r'^[0-9]{2}[A-Z]$', code):
-        return code[:2] in E96_CODES and code[2] in E96_MULTIPLIERS
-    
-    # Codes with R (resistance < 100 Ohm)
-    if re.match(r'^[Rr][0-9\.]+$', code) or re.match(r'^[0-9\.]*[Rr][0-9]*$', code):
-        return True
-    
-    # 4-digit with R (like R047)
-    if re.match(r'^[Rr][0-9]{3}$', code):
-        return True
-    
-    return False
+    index = data_tables.current().index('smd_index')
+    packed = pack_key(normalize_code(code))
+    i = None if packed is None else key_position(index, packed)
+    # Прочтение "номинал" у 4 цифр - последнее
+    return i is not None and SCHEMES[index['scheme'][index['first'][i + 1] - 1]] != PLAIN_NUMBER
 
+@metrics.timed()
+@metrics.cached()
 def smd_to_resistance(code):
-    """Преобразование SMD кода в значение сопротивления"""
-    if not validate_smd_code(code):
+    """SMD код -> прочтения ((номинал, схема), ...): первое - наиболее вероятное,
+    несколько - код неоднозначен; None, если код не распознан"""
+    if not code:
         return None
-    
-    code = code.upper().strip()
-    
-    try:
-        # 3-digit code (E24 series)
-        if re.match(r'^[0-9]{3}$', code):
-            significant = int(code[:2])
-            multiplier = 10 ** int(code[2])
-            resistance = significant * multiplier
-            return format_resistance(resistance), "E24 (3-digit)"
-        
-        # 4-digit code with letter (E96 series)
-        elif re.match(r'^[0-9]{2}[A-Z]$', code):
-            value_code = code[:2]
-            multiplier_code = code[2]
-            
-            if value_code in E96_CODES and multiplier_code in E96_MULTIPLIERS:
-                significant = E96_CODES[value_code] / 100.0  # Convert to actual value
-                multiplier = E96_MULTIPLIERS[multiplier_code]
-                resistance = significant * multiplier
-                return format_resistance(resistance), "E96 (4-digit)"
-        
-        # Codes with R (resistance < 100 Ohm)
-        elif 'R' in code:
-            # Replace R with decimal point and handle different formats
-            if code.startswith('R'):
-                # Format: R047 = 0.047 Ohm
-                number_part = code[1:]
-                if number_part.isdigit():
-                    resistance = float('0.' + number_part)
-                else:
-                    resistance = float('0.' + number_part.replace('.', ''))
-            elif code.endswith('R'):
-                # Format: 47R = 47 Ohm
-                resistance = float(code[:-1])
-            else:
-                # Format: 4R7 = 4.7 Ohm
-                parts = code.split('R')
-                if len(parts) == 2:
-                    resistance = float(parts[0] + '.' + parts[1])
-                else:
-                    return None
-            
-            return format_resistance(resistance), "R-format"
-        
-        # 4-digit with R at start (like R047)
-        elif re.match(r'^R[0-9]{3}$', code):
-            resistance = float('0.' + code[1:])
-            return format_resistance(resistance), "R-format (4-digit)"
-    
-    except (ValueError, IndexError):
+    markings = decode_markings(data_tables.current().index('smd_index'), normalize_code(code))
+    if not markings:
         return None
-    
-    return None
+    return tuple((format_resistance(marking.ohms), marking.scheme) for marking in markings)
 
+@metrics.timed()
+@metrics.cached()
 def resistance_to_smd(resistance_str):
     """Преобразование значения сопротивления в SMD коды"""
     try:
@@ -130,27 +215,22 @@ def resistance_to_smd(resistance_str):
         
         resistance = value
         
-        # Generate codes for different series
+        # Все коды номинала - одно обращение к индексу
+        index = data_tables.current().index('smd_index')
         codes = []
         series_types = []
+        markings = encode_markings(index, resistance)
+        for marking, others in markings:
+            codes.append(marking.code)
+            series_types.append(f"{marking.scheme}; also {others}" if others else marking.scheme)
         
-        # E24 (3-digit) code
-        e24_code = resistance_to_e24(resistance)
-        if e24_code:
-            codes.append(e24_code)
-            series_types.append("E24")
-        
-        # E96 (4-digit) code
-        e96_code = resistance_to_e96(resistance)
-        if e96_code:
-            codes.append(e96_code)
-            series_types.append("E96")
-        
-        # R-format code (for resistances < 100 Ohm)
-        r_code = resistance_to_r_format(resistance)
-        if r_code:
-            codes.append(r_code)
-            series_types.append("R-format")
+        # Номинала нет в ряду E96 - ближайший номинал E96 в пределах 1%
+        if all(marking.scheme != EIA96 for marking, _ in markings):
+            nearest = resistance_to_e96(resistance)
+            if nearest:
+                code, ohms = nearest
+                codes.append(code)
+                series_types.append(f"{EIA96} ≈ {format_resistance(ohms)}")
         
         if codes:
             formatted_value = format_resistance(resistance)
@@ -161,59 +241,48 @@ def resistance_to_smd(resistance_str):
     except Exception as e:
         return f"Conversion error: {str(e)}"
 
-def resistance_to_e24(resistance):
-    """Преобразование в E24 код (3-digit)"""
-    if resistance < 0.1 or resistance > 999000000:
-        return None
-    
-    # Find closest E24 value
-    for e24_val in E24_SERIES:
-        for exp in range(-2, 7):  # From 0.01 to 10M
-            calculated = e24_val * (10 ** exp)
-            if abs(calculated - resistance) / resistance < 0.1:  # 10% tolerance
-                significant = int(e24_val * 10)
-                multiplier = exp - 1
-                if 0 <= multiplier <= 9:
-                    return f"{significant:02d}{multiplier}"
-    
-    return None
-
+@metrics.timed()
 def resistance_to_e96(resistance):
-    """Преобразование в E96 код (4-digit)"""
-    if resistance < 0.001 or resistance > 99900000:
+    """Ближайший номинал E96 в пределах 1%: (код EIA-96, номинал) или None"""
+    if resistance < 0.1 or resistance > 99900000:
         return None
     
-    # Find closest E96 value
-    for e96_val in E96_SERIES:
-        for mult_code, multiplier in E96_MULTIPLIERS.items():
-            calculated = e96_val * multiplier
-            if abs(calculated - resistance) / resistance < 0.01:  # 1% tolerance
-                # Find the 2-digit code for this E96 value
-                for code, val in E96_CODES.items():
-                    if abs(val - e96_val * 100) < 0.1:
-                        return f"{code}{mult_code}"
-    
-    return None
-
-def resistance_to_r_format(resistance):
-    """Преобразование в R-формат код"""
-    if resistance < 0.001:
-        return None
-    elif resistance < 1:
-        # Format: R047 = 0.047 Ohm
-        value_str = f"{resistance:.3f}".split('.')[1]
-        return f"R{value_str}"
-    elif resistance < 10:
-        # Format: 4R7 = 4.7 Ohm
-        int_part = int(resistance)
-        frac_part = int(round((resistance - int_part) * 10))
-        return f"{int_part}R{frac_part}"
-    elif resistance < 100:
-        # Format: 47R = 47 Ohm
-        return f"{int(resistance)}R"
-    else:
+    # Closest E96 value: binary search in the sorted encode table
+    encode = data_tables.current().index('eia96_encode')
+    values = encode['value']
+    position = bisect_left(values, resistance)
+    best = None
+    for i in (position - 1, position):
+        if 0 <= i < len(values) and abs(values[i] - resistance) / resistance < 0.01:  # 1% tolerance
+            if best is None or abs(values[i] - resistance) < abs(values[best] - resistance):
+                best = i
+    if best is None:
         return None
+    return f"{encode['number'][best]:02d}{chr(encode['letter'][best])}", values[best]
+
+@shared_tables.sections('eia96')
+def eia96_sections(tables):
+    """Таблица кодирования EIA-96: все значения (номер x множитель) по возрастанию с их кодами"""
+    primary = {}
+    for letter, multiplier in tables.e96_multipliers.items():
+        primary.setdefault(multiplier, letter)
+    entries = sorted(
+        (val * multiplier, int(code), ord(letter))
+        for code, val in tables.e96_codes.items()
+        for multiplier, letter in primary.items()
+    )
+    return {
+        'value': ('d', [value for value, _, _ in entries]),
+        'number': ('B', [number for _, number, _ in entries]),
+        'letter': ('B', [letter for _, _, letter in entries]),
+    }
+
+@data_tables.derived('eia96_encode')
+def build_eia96_encode(tables):
+    """Таблица кодирования EIA-96 для снимка таблиц (из общего файла, если он доступен)"""
+    return shared_tables.arrays(tables, 'eia96')
 
+@metrics.timed()
 def format_resistance(value):
     """Форматирование значения сопротивления"""
     if value >= 1000000:
@@ -223,4 +292,4 @@ def format_resistance(value):
     elif value < 1:
         return f"{value:.3f} Ohm"
     else:
-        return f"{value:.1f} Ohm".rstrip('0').rstrip('.')
\ No newline at end of file
+        return f"{value:.2f}".rstrip('0').rstrip('.') + " Ohm"
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Снимок состояния при остановке и тёплый запуск.
+
+При остановке (после того как обработаны принятые обновления) в BOT_STATE_FILE пишутся
+сессии пользователей из памяти процесса и аргументы последних промахов LRU кэшей
+функций расчёта. При запуске сессии восстанавливаются, а кэши заполняются повторным
+расчётом по этим аргументам, поэтому после перезапуска частые запросы не попадают
+в пустые кэши. Расчёт идёт по текущим таблицам данных, так что снимок, записанный
+с другой версией таблиц, не даёт устаревших результатов.
+"""
+
+import json
+import logging
+import os
+import time
+
+import metrics
+
+STATE_FILE = os.getenv('BOT_STATE_FILE')
+# Сколько секунд при остановке ждать обработки принятых обновлений и отправки ответов
+SHUTDOWN_TIMEOUT = float(os.getenv('BOT_SHUTDOWN_TIMEOUT', '20'))
+
+# Типы аргументов, которые переносятся через JSON без изменений
+JSON_SCALARS = (str, int, float, bool)
+
+
+def hot_keys():
+    """Аргументы последних промахов каждого кэша: {кэш: [[аргумент, ...], ...]}"""
+    caches = {}
+    for name, func in metrics.CACHES.items():
+        caches[name] = [list(args) for args in func.recent_keys
+                        if all(isinstance(arg, JSON_SCALARS) for arg in args)]
+    return caches
+
+
+def warm_caches(caches):
+    """Заполняет кэши расчётом по сохранённым аргументам; возвращает число вызовов"""
+    warmed = 0
+    for name, keys in caches.items():
+        func = metrics.CACHES.get(name)
+        if func is None:
+            continue
+        for args in keys:
+            try:
+                func(*args)
+            except Exception:
+                # Аргумент, который новая версия кода не принимает, просто пропускается
+                continue
+            warmed += 1
+    return warmed
+
+
+def save_state(path, sessions):
+    """Записывает сессии хранилища и ключи кэшей (через временный файл и os.replace)"""
+    state = {'saved_at': time.time(), 'caches': hot_keys()}
+    snapshot = sessions.snapshot()
+    if snapshot is not None:
+        state['sessions'] = {str(user_id): session for user_id, session in snapshot.items()}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    keys = sum(len(keys) for keys in state['caches'].values())
+    logging.info(f"💾 State saved to {path}: {len(snapshot or ())} sessions, {keys} cache keys")
+
+
+def read_state(path):
+    """Снимок из файла; None, если файла нет или он повреждён"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"⚠️ Cannot load state from {path}: {e}")
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def restore_state(paths, sessions, keep=None):
+    """Восстанавливает сессии и прогревает кэши по снимкам paths.
+
+    keep(user_id) отбирает сессии этого процесса (процессы-обработчики делят пользователей);
+    из нескольких снимков берётся сессия с большей версией
+    """
+    start = time.perf_counter()
+    merged = {}
+    caches = {}
+    for path in paths:
+        state = read_state(path)
+        if state is None:
+            continue
+        for user_id, session in state.get('sessions', {}).items():
+            user_id = int(user_id)
+            if keep is not None and not keep(user_id):
+                continue
+            if user_id not in merged or session.get('version', 0) > merged[user_id].get('version', 0):
+                merged[user_id] = session
+        for name, keys in state.get('caches', {}).items():
+            # Снимки процессов-обработчиков содержат одни и те же частые запросы
+            caches.setdefault(name, {}).update(dict.fromkeys(tuple(args) for args in keys))
+    if not merged and not caches:
+        return
+    restored = sessions.restore(merged)
+    warmed = warm_caches(caches)
+    elapsed = (time.perf_counter() - start) * 1000
+    logging.info(f"♻️ Warm start: {restored} sessions restored, {warmed} cache entries computed in {elapsed:.0f} ms")
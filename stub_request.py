@@ -0,0 +1,71 @@
+"""
+Заглушка сетевого слоя Bot API: отвечает синтетическими ответами без обращения к сети.
+Используется для воспроизведения трафика и нагрузочных прогонов обработчиков.
+"""
+
+import itertools
+import json
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest
+
+# Пользователь бота, возвращаемый на getMe
+STUB_BOT_USER = {
+    'id': 123456789,
+    'is_bot': True,
+    'first_name': 'Resistor Code Bot',
+    'username': 'resistor_code_bot',
+}
+
+# Методы, результатом которых является сообщение
+MESSAGE_METHODS = {
+    'sendMessage', 'editMessageText', 'editMessageReplyMarkup', 'sendDocument', 'sendPhoto',
+}
+
+
+def synthesize_result(api_method, params, message_ids, bot_user=STUB_BOT_USER):
+    """Синтетический результат вызова Bot API; message_ids - счётчик номеров новых сообщений"""
+    if api_method == 'getMe':
+        return bot_user
+    if api_method == 'getUpdates':
+        return []
+    if api_method in MESSAGE_METHODS:
+        chat_id = params.get('chat_id', 0)
+        return {
+            'message_id': params.get('message_id') or next(message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': params.get('text', ''),
+        }
+    return True
+
+
+class StubRequest(BaseRequest):
+    """BaseRequest без сети; on_call(api_method, params) вызывается для каждого запроса"""
+
+    def __init__(self, on_call=None, bot_user=STUB_BOT_USER):
+        self.on_call = on_call
+        self.bot_user = bot_user
+        self.calls = Counter()
+        self.message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[api_method] += 1
+        if self.on_call is not None:
+            self.on_call(api_method, params)
+        result = synthesize_result(api_method, params, self.message_ids, self.bot_user)
+        return 200, json.dumps({'ok': True, 'result': result}).encode('utf-8')
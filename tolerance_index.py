@@ -0,0 +1,183 @@
+"""
+Интервальный индекс стандартных номиналов с допусками.
+
+Все значения рядов E6...E96 из действующих таблиц данных разворачиваются по декадам
+в отсортированные массивы номиналов; при одинаковом допуске внутри ряда нижние и верхние
+границы интервалов тоже отсортированы, поэтому номиналы, в допуск которых попадает
+измеренное значение, находятся двумя бинарными поисками - O(log n) на ряд. Массивы
+хранятся в общем для процессов файле (shared_tables).
+
+Используется как библиотека (fitting_values, check_measurement, check_bands)
+и командой /fit бота.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+import data_tables
+import metrics
+import shared_tables
+from color_matcher import match_colors
+
+# Декады номиналов: от 0.1 Ом до 97.6 МОм
+DECADES = range(-1, 8)
+
+# Подходящий номинал: ряд, номинал в Омах, допуск (доля) и отклонение измерения от номинала
+Fit = namedtuple('Fit', 'series nominal tolerance deviation')
+# Проверка измерения: номинал, допуск, отклонение и попадание в допуск
+Check = namedtuple('Check', 'nominal tolerance deviation ok')
+
+VALUE_PATTERN = re.compile(r'(\d+(?:[.,]\d+)?)\s*([кkKмМmM]?)\s*(?:ом|ohm|ω)?', re.IGNORECASE)
+TOLERANCE_PATTERN = re.compile(r'±?\s*(\d+(?:[.,]\d+)?)\s*%')
+UNIT_FACTORS = {'к': 1e3, 'k': 1e3, 'м': 1e6, 'm': 1e6}
+
+
+def series_intervals(values, tolerance, decades=DECADES):
+    """Отсортированные номиналы ряда во всех декадах и границы их интервалов"""
+    # Округление убирает хвосты вида 4700.000000000001
+    nominals = sorted({round(value * 10 ** exp, 6) for exp in decades for value in values})
+    lows = [nominal * (1 - tolerance) for nominal in nominals]
+    highs = [nominal * (1 + tolerance) for nominal in nominals]
+    return nominals, lows, highs
+
+
+class SeriesIntervals:
+    """Интервалы [номинал·(1-t), номинал·(1+t)] одного ряда во всех декадах.
+
+    nominals, lows, highs - отсортированные последовательности чисел (list, array или
+    memoryview общего файла таблиц)
+    """
+
+    __slots__ = ('name', 'tolerance', 'nominals', 'lows', 'highs')
+
+    def __init__(self, name, tolerance, nominals, lows, highs):
+        self.name = name
+        self.tolerance = tolerance
+        self.nominals = nominals
+        self.lows = lows
+        self.highs = highs
+
+    def containing(self, measured):
+        """Номиналы, в допуск которых попадает measured"""
+        start = bisect_left(self.highs, measured)
+        stop = bisect_right(self.lows, measured)
+        return list(self.nominals[start:stop])
+
+    def nearest(self, measured):
+        """Ближайший к measured номинал ряда"""
+        position = bisect_left(self.nominals, measured)
+        candidates = self.nominals[max(position - 1, 0):position + 1]
+        return min(candidates, key=lambda nominal: abs(nominal - measured))
+
+
+class ToleranceIndex:
+    """Интервальные индексы всех рядов"""
+
+    def __init__(self, series):
+        # series: имя ряда -> SeriesIntervals
+        self.series = series
+
+    def fits(self, measured):
+        """Все стандартные номиналы, которые могут измеряться как measured"""
+        found = []
+        for name, intervals in self.series.items():
+            for nominal in intervals.containing(measured):
+                found.append(Fit(name, nominal, intervals.tolerance, deviation(measured, nominal)))
+        return found
+
+
+def standard_series(tables):
+    """Ряды E6...E96; ряды с меньшим числом значений - каждый второй (четвёртый) элемент более точного"""
+    return {
+        'E6': tables.e24_series[::4], 'E12': tables.e24_series[::2], 'E24': tables.e24_series,
+        'E48': tables.e96_series[::2], 'E96': tables.e96_series,
+    }
+
+
+@shared_tables.sections('tolerance')
+def tolerance_sections(tables):
+    """Массивы номиналов и границ всех рядов для файла общих таблиц"""
+    arrays = {}
+    for name, values in standard_series(tables).items():
+        nominals, lows, highs = series_intervals(values, tables.series_tolerances[name])
+        arrays[f'{name}.nominal'] = ('d', nominals)
+        arrays[f'{name}.low'] = ('d', lows)
+        arrays[f'{name}.high'] = ('d', highs)
+    return arrays
+
+
+@data_tables.derived('tolerance_index')
+def build_tolerance_index(tables):
+    """Интервальные индексы рядов для снимка таблиц"""
+    arrays = shared_tables.arrays(tables, 'tolerance')
+    return ToleranceIndex({
+        name: SeriesIntervals(name, tables.series_tolerances[name], arrays[f'{name}.nominal'],
+                              arrays[f'{name}.low'], arrays[f'{name}.high'])
+        for name in standard_series(tables)
+    })
+
+
+def deviation(measured, nominal):
+    """Относительное отклонение измерения от номинала"""
+    return (measured - nominal) / nominal
+
+
+def fitting_values(measured):
+    """Список Fit для измеренного сопротивления в Омах"""
+    return data_tables.current().index('tolerance_index').fits(measured)
+
+
+def check_measurement(measured, nominal, tolerance):
+    """Попадает ли измерение в допуск номинала (tolerance - доля, 0.05 для ±5%)"""
+    offset = deviation(measured, nominal)
+    # Небольшой запас на погрешность представления float на границе допуска
+    return Check(nominal, tolerance, offset, abs(offset) <= tolerance + 1e-9)
+
+
+def parse_resistance(text):
+    """Сопротивление в Омах из строки ("4.62k", "4,62 кОм", "470"); None, если не разобрано"""
+    match = VALUE_PATTERN.search(text)
+    if not match:
+        return None
+    value, unit = match.groups()
+    return float(value.replace(',', '.')) * UNIT_FACTORS.get(unit.lower(), 1)
+
+
+def split_measurement(text):
+    """(сопротивление в Омах, остаток строки) для "4.62 kOhm red red ..."; (None, text), если не разобрано"""
+    match = VALUE_PATTERN.match(text.strip())
+    if not match:
+        return None, text
+    return parse_resistance(match.group(0)), text.strip()[match.end():].strip()
+
+
+def parse_tolerance(text):
+    """Доля допуска из строки "±5%" или "5%"; None, если не разобрано"""
+    match = TOLERANCE_PATTERN.search(text)
+    if not match:
+        return None
+    return float(match.group(1).replace(',', '.')) / 100
+
+
+@metrics.cached()
+def bands_to_nominal(text):
+    """(номинал в Омах, допуск) по цветам полос; None, если это не 4 или 5 полос"""
+    tables = data_tables.current()
+    colors = match_colors(text).colors
+    if len(colors) not in (4, 5) or any(tables.color_codes[color] < 0 for color in colors[:-2]):
+        return None
+    value = 0
+    for color in colors[:-2]:
+        value = value * 10 + tables.color_codes[color]
+    nominal = float(round(value * tables.multipliers[colors[-2]], 6))
+    tolerance = parse_tolerance(tables.tolerance.get(colors[-1], '±20%'))
+    return nominal, tolerance
+
+
+def check_bands(measured, text):
+    """Check измерения против маркировки цветами; None, если маркировка не разобрана"""
+    marking = bands_to_nominal(text)
+    if marking is None:
+        return None
+    return check_measurement(measured, *marking)
@@ -0,0 +1,99 @@
+"""
+Отбрасывание повторно доставленных обновлений по update_id.
+
+Telegram повторяет доставку при ошибках вебхука и после перезапусков; без этого слоя
+повтор полностью обрабатывается заново и пользователь получает второй ответ.
+Хранится ограниченное окно недавних update_id (очередь + множество) с временем жизни.
+"""
+
+import atexit
+import json
+import logging
+import os
+import time
+from collections import deque
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes, TypeHandler
+
+import metrics
+
+# Сколько последних update_id помнить (0 - отключить) и сколько секунд
+DEDUP_WINDOW = int(os.getenv('BOT_DEDUP_WINDOW', '10000'))
+DEDUP_MAX_AGE = int(os.getenv('BOT_DEDUP_MAX_AGE', '3600'))
+# Файл для сохранения окна между перезапусками; если не задан, окно только в памяти
+DEDUP_FILE = os.getenv('BOT_DEDUP_FILE')
+
+
+class UpdateDeduplicator:
+    """Окно недавно обработанных update_id, ограниченное по размеру и по времени"""
+
+    def __init__(self, window=DEDUP_WINDOW, max_age=DEDUP_MAX_AGE, path=None):
+        self.window = window
+        self.max_age = max_age
+        self.path = path
+        self.recent = deque()  # (update_id, время получения) в порядке получения
+        self.ids = set()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def _expire(self, now):
+        recent = self.recent
+        while recent and (len(recent) > self.window or now - recent[0][1] > self.max_age):
+            self.ids.discard(recent.popleft()[0])
+
+    def seen(self, update_id, now=None):
+        """True, если обновление уже было; иначе запоминает его"""
+        now = time.time() if now is None else now
+        if update_id in self.ids:
+            self.hits += 1
+            return True
+        self.misses += 1
+        self.ids.add(update_id)
+        self.recent.append((update_id, now))
+        self._expire(now)
+        return False
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠️ Cannot load dedup window from {self.path}: {e}")
+            return
+        for update_id, seen_at in entries:
+            if update_id not in self.ids:
+                self.ids.add(update_id)
+                self.recent.append((update_id, seen_at))
+        self._expire(time.time())
+        logging.info(f"🔁 Restored {len(self.recent)} recent update ids from {self.path}")
+
+    def save(self):
+        self._expire(time.time())
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self.recent), f)
+        os.replace(tmp_path, self.path)
+
+
+def register_dedup(application, window=DEDUP_WINDOW, path=DEDUP_FILE):
+    """Добавляет обработчик, останавливающий повторные обновления до остальных обработчиков"""
+    if window <= 0:
+        return None
+    dedup = UpdateDeduplicator(window, path=path)
+    application.bot_data['dedup'] = dedup
+
+    async def drop_duplicate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if dedup.seen(update.update_id):
+            metrics.count_dedup('duplicate')
+            logging.debug(f"🔁 Dropped duplicate update {update.update_id}")
+            raise ApplicationHandlerStop
+        metrics.count_dedup('new')
+
+    application.add_handler(TypeHandler(Update, drop_duplicate), group=-3)
+    return dedup
@@ -0,0 +1,217 @@
+"""
+Режим с одним приёмником обновлений и несколькими процессами-обработчиками.
+
+Telegram допускает только одного потребителя getUpdates, поэтому обновления принимает
+один процесс (ingress) и распределяет их по BOT_WORKERS процессам по user_id: все
+обновления одного пользователя попадают в один процесс и обрабатываются по порядку.
+Процессы-обработчики выполняют обычные обработчики бота, а вызовы Bot API (ответы)
+возвращают в ingress, где их отправляет общий отправитель.
+
+Ограничение: загрузка файлов (multipart) через отправителя не пересылается.
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import warnings
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import Application, ContextTypes, TypeHandler
+from telegram.warnings import PTBDeprecationWarning
+
+import admission
+import data_tables
+from bot_logging import stop_logging
+from bot_request import create_request
+from state_snapshot import SHUTDOWN_TIMEOUT, STATE_FILE, restore_state, save_state
+from traffic_capture import CAPTURE_DIR, register_capture
+from update_dedup import register_dedup
+
+
+# Вызовы приходят от обработчиков готовыми (метод Bot API и параметры) и отправляются через
+# do_api_request; его совет использовать методы Bot (sendMessage) здесь не применим
+warnings.filterwarnings('ignore', message="Please use 'Bot.", category=PTBDeprecationWarning)
+
+
+def partition_for(update, workers):
+    """Номер процесса для обновления: по пользователю, иначе по чату или update_id"""
+    if update.effective_user is not None:
+        key = update.effective_user.id
+    elif update.effective_chat is not None:
+        key = update.effective_chat.id
+    else:
+        key = update.update_id
+    return key % workers
+
+
+class ReplySender:
+    """Отправляет вызовы Bot API от процессов-обработчиков; порядок внутри чата сохраняется"""
+
+    def __init__(self, bot, reply_queue):
+        self.bot = bot
+        self.reply_queue = reply_queue
+        self.chains = {}
+        self.pending = set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await loop.run_in_executor(None, self.reply_queue.get)
+            if item is None:
+                break
+            api_method, params = item
+            # Вызовы без чата (answerCallbackQuery) не упорядочиваются: общая цепочка
+            # задерживала бы ответы на нажатия кнопок всех пользователей
+            chat_id = params.get('chat_id')
+            task = asyncio.create_task(self.send(api_method, params, self.chains.get(chat_id)))
+            if chat_id is not None:
+                self.chains[chat_id] = task
+            self.pending.add(task)
+            task.add_done_callback(self.pending.discard)
+        # Дожидаемся отправки всего, что успели прислать обработчики
+        if self.pending:
+            await asyncio.gather(*self.pending)
+
+    async def send(self, api_method, params, previous):
+        if previous is not None:
+            await previous
+        chat_id = params.get('chat_id')
+        try:
+            await self.bot.do_api_request(api_method, api_kwargs=params)
+        except TelegramError as e:
+            logging.error(f"❌ Failed to send {api_method} to {chat_id}: {e}")
+        finally:
+            if self.chains.get(chat_id) is asyncio.current_task():
+                del self.chains[chat_id]
+
+
+def worker_main(index, workers, token, update_queue, reply_queue, bot_user):
+    """Точка входа процесса-обработчика"""
+    # Ctrl+C получает вся группа процессов; останавливает обработчики ingress через очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asyncio.run(worker_loop(index, workers, token, update_queue, reply_queue, bot_user))
+    finally:
+        # Дочерний процесс multiprocessing не вызывает atexit: дописываем очередь лога сами
+        stop_logging()
+
+
+def worker_state_files():
+    """Снимки всех процессов-обработчиков (их число могло измениться) и однопроцессного режима"""
+    return [STATE_FILE] + sorted(path for path in glob.glob(f"{glob.escape(STATE_FILE)}.worker*")
+                                 if not path.endswith('.tmp'))
+
+
+async def worker_loop(index, workers, token, update_queue, reply_queue, bot_user):
+    """Обрабатывает обновления своего раздела по порядку"""
+    import resistor_code_bot
+    from stub_request import StubRequest
+
+    def forward(api_method, params):
+        if api_method != 'getMe':
+            reply_queue.put((api_method, params))
+
+    def queue_depth():
+        # multiprocessing.Queue.qsize() не реализован в macOS (sem_getvalue)
+        try:
+            return update_queue.qsize()
+        except NotImplementedError:
+            return 0
+
+    # Трафик записывает и повторы отбрасывает только ingress
+    application = resistor_code_bot.build_application(
+        token, request=StubRequest(on_call=forward, bot_user=bot_user),
+        capture_dir=None, dedup_window=0, state_file=None)
+    application.bot_data['queue_depth'] = queue_depth
+    # Номер процесса-обработчика: по нему обработчики узнают, что файлы не пересылаются
+    application.bot_data['worker'] = index
+    await application.initialize()
+    if STATE_FILE:
+        # Пользователи распределены по процессам по user_id (partition_for)
+        restore_state(worker_state_files(), application.bot_data['sessions'],
+                      keep=lambda user_id: user_id % workers == index)
+    # post_init вызывается только при запуске через serve_applications - проверку файла данных запускаем сами
+    await data_tables.start_watcher(application)
+    admission.monitor.start(f'worker-{index}')
+    logging.info(f"👷 Worker {index} ready (pid {os.getpid()})")
+
+    loop = asyncio.get_running_loop()
+    while True:
+        data = await loop.run_in_executor(None, update_queue.get)
+        if data is None:
+            break
+        await application.process_update(Update.de_json(json.loads(data), application.bot))
+
+    admission.monitor.stop()
+    await data_tables.stop_watcher(application)
+    if STATE_FILE:
+        try:
+            save_state(f"{STATE_FILE}.worker{index}", application.bot_data['sessions'])
+        except OSError as e:
+            logging.error(f"❌ Worker {index} cannot save state: {e}")
+    await application.shutdown()
+
+
+def build_ingress_application(token, workers):
+    """Приложение-приёмник: получает обновления и раздаёт их процессам-обработчикам"""
+    from resistor_code_bot import BOT_API_BASE_URL
+
+    context = multiprocessing.get_context('spawn')
+    update_queues = [context.Queue() for _ in range(workers)]
+    reply_queue = context.Queue()
+    processes = []
+    state = {}
+
+    async def start_workers(application):
+        bot_user = application.bot.bot.to_dict()
+        # Файл общих таблиц создаётся до запуска обработчиков - они только отображают его в память
+        data_tables.current().index('shared_tables')
+        for index, queue in enumerate(update_queues):
+            process = context.Process(
+                target=worker_main, args=(index, workers, token, queue, reply_queue, bot_user),
+                name=f'bot-worker-{index}', daemon=True)
+            process.start()
+            processes.append(process)
+        sender = ReplySender(application.bot, reply_queue)
+        state['sender'] = asyncio.create_task(sender.run())
+        logging.info(f"🔀 Ingress started with {workers} worker processes")
+
+    async def stop_workers(application):
+        # Обработчики дорабатывают свои очереди, затем отправитель отправляет остаток ответов;
+        # всё вместе - до срока остановки (BOT_SHUTDOWN_TIMEOUT)
+        loop = asyncio.get_running_loop()
+        deadline = application.bot_data.get('shutdown_deadline', loop.time() + SHUTDOWN_TIMEOUT)
+        for queue in update_queues:
+            queue.put(None)
+        for process in processes:
+            await loop.run_in_executor(None, process.join, max(deadline - loop.time(), 0))
+            if process.is_alive():
+                logging.warning(f"⚠️ {process.name} did not finish before the shutdown deadline")
+                process.terminate()
+        reply_queue.put(None)
+        try:
+            await asyncio.wait_for(state['sender'], max(deadline - loop.time(), 0.1))
+        except asyncio.TimeoutError:
+            logging.warning("⚠️ Shutdown deadline reached with replies still being sent")
+
+    async def dispatch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        partition = partition_for(update, workers)
+        update_queues[partition].put(json.dumps(update.to_dict()))
+
+    builder = (Application.builder().token(token)
+               .post_init(start_workers).post_stop(stop_workers))
+    if BOT_API_BASE_URL:
+        builder = builder.base_url(BOT_API_BASE_URL)
+    builder = builder.request(create_request('sender')).get_updates_request(create_request('updater'))
+    application = builder.build()
+
+    register_dedup(application)
+    if CAPTURE_DIR:
+        register_capture(application, CAPTURE_DIR)
+    application.add_handler(TypeHandler(Update, dispatch))
+    return application